@@ -1,19 +1,43 @@
 from __future__ import annotations
 
-import os
 import time
+
+_BOOT_START = time.perf_counter()  # first thing: startup timings measure from here
+
+import asyncio
+import os
 import logging
 from typing import List
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routes import notes
-from app.store.memory_store import evict_expired
+from app.routes import admin, notes
+from app.store.memory_store import evict_expired, stats_all
+from app.store.snapshot import snapshot_writer
+from app.utils import metrics, profiling
+from app.utils.embeddings import (
+    batcher_stats,
+    embedding_cache_stats,
+    models_ready,
+    query_cache_stats,
+    rerank_cache_stats,
+    warmup,
+    warmup_status,
+)
+from app.utils.executors import executor_stats, run_inference
 from dotenv import load_dotenv
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+_IMPORTS_MS = (time.perf_counter() - _BOOT_START) * 1000
+
+# Load and exercise both models in the background at startup, so the first
+# request doesn't pay for it. /ready reports when that has finished.
+WARMUP_ENABLED = os.getenv("SMARTNOTE_WARMUP", "true").lower() in ("1", "true", "yes")
+_warmup_task: "asyncio.Task | None" = None
+
 # Creates a FastAPI app object
 app = FastAPI(title="SmartNote")
 
@@ -66,14 +90,186 @@ async def session_eviction_middleware(request: Request, call_next):
         _last_evict = now
     return await call_next(request)
 
+
+@app.middleware("http")
+async def request_metrics_middleware(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Route template, not the raw path, to keep label cardinality bounded.
+    # Streaming responses are measured to their first byte.
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.observe(
+        time.perf_counter() - start, endpoint=getattr(route, "path", "unmatched")
+    )
+    return response
+
+
+# Opt-in request profiling (see utils/profiling). The capture covers the
+# whole response, including the body of streaming responses.
+@app.middleware("http")
+async def profiling_middleware(request: Request, call_next):
+    capture = profiling.start_capture(
+        request.method,
+        request.url.path,
+        request.headers.get("x-smartnote-profile"),
+        request.headers.get("x-smartnote-admin-token"),
+    )
+    if capture is None:
+        return await call_next(request)
+
+    start = time.perf_counter()
+    token = profiling.activate(capture)
+    try:
+        response = await call_next(request)
+    finally:
+        profiling.deactivate(token)
+    response.headers["X-SmartNote-Profile-Id"] = capture.id
+    body = response.body_iterator
+
+    async def _finish_after_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            profiling.finish_capture(capture, response.status_code, time.perf_counter() - start)
+
+    response.body_iterator = _finish_after_body()
+    return response
+
 # -----------------------------
-# Health check endpoint
+# Health check endpoint (process is up)
 # -----------------------------
 @app.get("/health")
 def health():
     return {"ok": True}
 
+# -----------------------------
+# Readiness (models loaded; requests won't pay cold-start costs)
+# -----------------------------
+@app.get("/ready")
+def ready():
+    status = warmup_status()
+    # Without warmup, models load lazily on first use: nothing to wait for
+    is_ready = models_ready() or not WARMUP_ENABLED
+    return JSONResponse({"ready": is_ready, "warmup": status}, status_code=200 if is_ready else 503)
+
+# -----------------------------
+# Runtime stats (sessions, executor queue depth, micro-batching)
+# -----------------------------
+@app.get("/stats")
+def stats():
+    return {
+        "sessions": stats_all(),
+        "executors": executor_stats(),
+        "batching": batcher_stats(),
+        "snapshots": snapshot_writer.stats(),
+    }
+
+# -----------------------------
+# Prometheus metrics (stage histograms + runtime gauges/counters)
+# -----------------------------
+def _collect_runtime_metrics():
+    sessions = stats_all()
+    yield "smartnote_sessions", "gauge", "Sessions held by this process", [({}, sessions["sessions"])]
+    yield "smartnote_store_bytes", "gauge", "Estimated memory held by session stores", [({}, sessions["bytes"])]
+    yield (
+        "smartnote_sessions_evicted_for_memory_total", "counter",
+        "Sessions evicted to stay under the memory budget", [({}, sessions["evicted_for_memory"])],
+    )
+
+    caches = {
+        "embedding": embedding_cache_stats(),
+        "query": query_cache_stats(),
+        "rerank": rerank_cache_stats(),
+    }
+    for field, mtype, help in (
+        ("hits", "counter", "Cache hits"),
+        ("misses", "counter", "Cache misses"),
+        ("evictions", "counter", "Cache evictions"),
+        ("entries", "gauge", "Cached entries"),
+        ("bytes", "gauge", "Cached bytes (size-bounded caches)"),
+    ):
+        suffix = "_total" if mtype == "counter" else ""
+        yield (
+            f"smartnote_cache_{field}{suffix}", mtype, help,
+            [({"cache": name}, c[field]) for name, c in caches.items()],
+        )
+
+    executors = executor_stats()
+    for field, mtype, help in (
+        ("queued", "gauge", "Jobs waiting for an executor thread"),
+        ("active", "gauge", "Jobs running on an executor"),
+        ("completed", "counter", "Jobs completed by an executor"),
+    ):
+        suffix = "_total" if mtype == "counter" else ""
+        yield (
+            f"smartnote_executor_{field}{suffix}", mtype, help,
+            [({"executor": name}, e[field]) for name, e in executors.items()],
+        )
+
+    batchers = batcher_stats()
+    yield (
+        "smartnote_microbatch_batches_total", "counter", "Micro-batches run",
+        [({"batcher": name}, b["batches"]) for name, b in batchers.items()],
+    )
+    yield (
+        "smartnote_microbatch_items_total", "counter", "Inputs processed by micro-batches",
+        [({"batcher": name}, b["items"]) for name, b in batchers.items()],
+    )
+
+    snaps = snapshot_writer.stats()
+    yield "smartnote_snapshots_written_total", "counter", "Session snapshots written", [({}, snaps["written"])]
+    yield "smartnote_snapshots_failed_total", "counter", "Session snapshot failures", [({}, snaps["failed"])]
+    yield "smartnote_models_ready", "gauge", "1 once both models are loaded", [({}, int(models_ready()))]
+
+
+metrics.register_collector(_collect_runtime_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# -----------------------------
+# Startup: timing breakdown + background model warmup
+# -----------------------------
+async def _run_warmup() -> None:
+    start = time.perf_counter()
+    try:
+        timings = await run_inference(warmup)
+    except Exception as exc:
+        logger.warning("Model warmup failed (models will load on first use): %s", exc)
+        return
+    logger.info(
+        "Model warmup done in %.0f ms: %s",
+        (time.perf_counter() - start) * 1000,
+        ", ".join(f"{k}={v:.0f}ms" for k, v in timings.items()),
+    )
+
+
+@app.on_event("startup")
+async def log_startup():
+    global _warmup_task
+    logger.info(
+        "Startup: imports %.0f ms, app ready %.0f ms after boot (warmup %s)",
+        _IMPORTS_MS,
+        (time.perf_counter() - _BOOT_START) * 1000,
+        "running in background" if WARMUP_ENABLED else "disabled",
+    )
+    if WARMUP_ENABLED:
+        _warmup_task = asyncio.create_task(_run_warmup())
+    if profiling.PROFILING_ENABLED and not profiling.ADMIN_TOKEN:
+        logger.warning("Profiling is enabled without SMARTNOTE_ADMIN_TOKEN: header triggers and /admin endpoints are refused")
+
+# -----------------------------
+# Shutdown: persist pending session snapshots
+# -----------------------------
+@app.on_event("shutdown")
+def flush_snapshots():
+    snapshot_writer.flush()
+
 # -----------------------------
 # Routes
 # -----------------------------
-app.include_router(notes.router)
\ No newline at end of file
+app.include_router(notes.router)
+app.include_router(admin.router)
\ No newline at end of file
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel
+
+from app.utils import profiling
+
+
+def _require_admin(x_smartnote_admin_token: Optional[str] = Header(default=None)) -> None:
+    # Hidden entirely unless profiling is switched on
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiling.check_token(x_smartnote_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(_require_admin)])
+
+
+class ArmRequest(BaseModel):
+    count: int = 1
+    path_prefix: str = "/notes/"
+    mode: str = "cprofile"  # or "sample"
+
+
+@router.get("/profiles")
+def list_profiles() -> Dict[str, Any]:
+    return {**profiling.status(), "profiles": profiling.list_profiles()}
+
+
+@router.post("/profiles/arm")
+def arm_profiling(payload: ArmRequest) -> Dict[str, Any]:
+    """Profile the next `count` requests whose path starts with path_prefix."""
+    try:
+        return profiling.arm(payload.count, payload.path_prefix, payload.mode)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = "text", limit: int = 60, sort: str = "cumulative"):
+    """
+    format=text       pstats report (cprofile) or heaviest stacks (sample)
+    format=pstats     binary stats file: `python -m pstats` / snakeviz
+    format=collapsed  folded stacks for flamegraph.pl / speedscope
+    """
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired profile")
+
+    if format == "text":
+        try:
+            return PlainTextResponse(profiling.render_text(profile, limit=limit, sort=sort))
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+    if format == "collapsed":
+        return PlainTextResponse(profiling.render_collapsed(profile))
+    if format == "pstats":
+        if profile.capture.mode != "cprofile":
+            raise HTTPException(status_code=400, detail="pstats output needs a cprofile capture")
+        return Response(
+            profiling.render_pstats(profile),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'},
+        )
+    raise HTTPException(status_code=400, detail="format must be text, pstats or collapsed")
+
+
+@router.delete("/profiles")
+def clear_profiles() -> Dict[str, int]:
+    return {"cleared": profiling.clear_profiles()}
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
 from pydantic import BaseModel
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
+import time
 
 from app.services.searcher import search
-from app.services.summarizer import answer_query
+from app.services.summarizer import answer_query_async, answer_query_stream
 from app.services.ingester import ingest_docs
+from app.services.stream_ingester import stream_ingest
 from app.store.memory_store import clear_session, touch_session
+from app.utils.executors import run_inference
+from app.utils.metrics import collect_timings, rounded_timings
 
 router = APIRouter(prefix="/notes", tags=["notes"])
 
@@ -29,37 +35,104 @@ class IngestResponse(BaseModel):
     ingested: int
     skipped_empty: int
     rejected: int
+    reused: int = 0       # chunks whose stored vectors were kept on re-ingest
+    reembedded: int = 0   # chunks that were new or changed and had to be embedded
+    over_quota: int = 0   # docs not stored because the session hit its memory cap
 
 
 class AskRequest(BaseModel):
     session_id: str
     query: str
     top_k: int = 5
+    timings: bool = False  # include per-stage latency (ms) in the response
 
 
 class ClearRequest(BaseModel):
     session_id: str
 
 
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body generator may keep reading the request body.
+
+    Starlette's StreamingResponse listens on receive() for disconnects while
+    streaming, which would swallow request body messages. Here only the
+    generator reads receive(); a disconnect surfaces as ClientDisconnect.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+
+# Handlers are async: model work is offloaded to the dedicated inference
+# executor and the LLM call to the I/O executor (see utils/executors).
+
 @router.get("/search")
-def search_notes(session_id: str, q: str, top_k: int = 5) -> List[Dict[str, Any]]:
+async def search_notes(
+    session_id: str, q: str, top_k: int = 5, timings: bool = False
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Results as a list; with timings=true, {"results": [...], "timings": {...}}
+    where timings holds milliseconds per search stage plus the total.
+    """
     touch_session(session_id)
-    return search(session_id, q, top_k=top_k)
+    if not timings:
+        return await run_inference(search, session_id, q, top_k=top_k)
+
+    start = time.perf_counter()
+    stage_ms: Dict[str, float] = {}
+    with collect_timings(stage_ms):
+        results = await run_inference(search, session_id, q, top_k=top_k)
+    stage_ms["total"] = (time.perf_counter() - start) * 1000
+    return {"results": results, "timings": rounded_timings(stage_ms)}
 
 
 @router.post("/ask")
-def ask_notes(payload: AskRequest) -> Dict[str, Any]:
+async def ask_notes(payload: AskRequest) -> Dict[str, Any]:
     touch_session(payload.session_id)
-    return answer_query(payload.session_id, payload.query, top_k=payload.top_k)
+    return await answer_query_async(
+        payload.session_id, payload.query, top_k=payload.top_k, timings=payload.timings
+    )
+
+
+@router.post("/ask/stream")
+async def ask_notes_stream(payload: AskRequest):
+    """
+    Server-sent events: retrieved chunks first, then answer tokens as the
+    LLM produces them, then a final event with quota metadata.
+    """
+    touch_session(payload.session_id)
+    return StreamingResponse(
+        answer_query_stream(
+            payload.session_id, payload.query, top_k=payload.top_k, timings=payload.timings
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/ingest", response_model=IngestResponse)
-def ingest_notes(payload: IngestRequest):
+async def ingest_notes(payload: IngestRequest):
     touch_session(payload.session_id)
-    stats = ingest_docs(payload.session_id, [d.model_dump() for d in payload.docs])
+    docs = [d.model_dump() for d in payload.docs]
+    stats = await run_inference(ingest_docs, payload.session_id, docs)
     return {"ok": True, **stats}
 
 
+@router.post("/ingest/stream")
+async def ingest_notes_stream(session_id: str, request: Request):
+    """
+    Streaming ingest. Body is NDJSON, one DocIn object per line; the
+    response streams one NDJSON result per doc as it is stored, tagged
+    with the doc's input "line", then a summary line with "done": true.
+    """
+    touch_session(session_id)
+    return DuplexStreamingResponse(
+        stream_ingest(session_id, request.stream()),
+        media_type="application/x-ndjson",
+    )
+
+
 @router.post("/clear")
 def clear_notes(payload: ClearRequest):
     clear_session(payload.session_id)
@@ -2,13 +2,24 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import Any, Dict, List
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 
-from ..utils.chunker import chunk_text_rich
-from ..utils.embeddings import embed_batch
-from ..store.memory_store import get_store, StoredChunk
+from ..utils.cache import content_hash
+from ..utils.chunker import ChunkResult, iter_chunks
+from ..utils.embeddings import embed_texts
+from ..utils.metrics import REGISTRY, stage
+from ..store.memory_store import (
+    SESSION_MAX_BYTES,
+    NoteStore,
+    SessionMemoryLimitError,
+    StoredChunk,
+    get_store,
+    schedule_snapshot,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +28,10 @@ MAX_CHARS_PER_DOC = 200_000
 MAX_TOTAL_CHARS_PER_REQUEST = 500_000
 MAX_CHUNKS_PER_DOC = 2_000
 
+_INGESTED_CHUNKS = REGISTRY.counter(
+    "smartnote_ingested_chunks_total", "Chunks stored by ingest, by whether they were embedded or reused", ["kind"]
+)
+
 _CODE_EXTENSIONS = {
     ".py", ".js", ".ts", ".tsx", ".jsx", ".java", ".c", ".cpp", ".h",
     ".go", ".rs", ".rb", ".php", ".swift", ".kt", ".cs", ".sh", ".bash",
@@ -42,6 +57,147 @@ def _detect_doc_type(path: str) -> str:
     return "unknown"
 
 
+@dataclass
+class _PreparedDoc:
+    """A validated, chunked document waiting for its embeddings."""
+    path: str
+    title: str = ""
+    mtime: float = 0.0
+    doc_type: str = ""
+    chunks: List[ChunkResult] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    sections: Dict[str, str] = field(default_factory=dict)
+    existing: Dict[str, np.ndarray] = field(default_factory=dict)  # reusable vectors
+    to_embed: List[int] = field(default_factory=list)  # chunk idxs needing embedding
+    chunks_truncated: bool = False
+    status: str = "pending"  # -> "ingested" | "cleared" | "failed" | "over_quota"
+
+
+def _read_doc(d: Dict[str, Any]) -> Tuple[str, str, str, float]:
+    path_str = str(d.get("path", "") or "").strip()
+    text = str(d.get("text", "") or "")
+    title = str(d.get("title", "") or "").strip()
+    mtime = float(d.get("mtime", 0) or 0)
+    return path_str, text, title, mtime
+
+
+def _prepare_doc(
+    store: NoteStore, path_str: str, text: str, title: str, mtime: float
+) -> Optional[_PreparedDoc]:
+    """Chunk one doc and diff it against the store. None if it yields no chunks."""
+    # Chunking stops one chunk past the cap: the rest of an over-long doc
+    # is never chunked (sections past that point aren't recorded either)
+    section_texts: Dict[str, str] = {}
+    chunks = list(islice(iter_chunks(text, sections=section_texts), MAX_CHUNKS_PER_DOC + 1))
+
+    if not chunks:
+        return None
+
+    chunks_truncated = len(chunks) > MAX_CHUNKS_PER_DOC
+    if chunks_truncated:
+        chunks = chunks[:MAX_CHUNKS_PER_DOC]
+
+    # Diff against what the store already holds for this path:
+    # only new or changed chunk texts are sent to the embedder.
+    hashes = [content_hash(c.text) for c in chunks]
+    existing = store.file_vectors(path_str)
+
+    return _PreparedDoc(
+        path=path_str,
+        title=title,
+        mtime=mtime,
+        doc_type=_detect_doc_type(path_str),
+        chunks=chunks,
+        hashes=hashes,
+        # Prefix section_ids with the file path so they are globally unique
+        sections={f"{path_str}::{sid}": txt for sid, txt in section_texts.items()},
+        existing=existing,
+        to_embed=[i for i, h in enumerate(hashes) if h not in existing],
+        chunks_truncated=chunks_truncated,
+    )
+
+
+def _embed_and_upsert(store: NoteStore, prepared: List[_PreparedDoc]) -> None:
+    """
+    Embed every new/changed chunk across all prepared docs in one call,
+    then scatter vectors back and upsert each doc in order.
+    Sets each doc's status.
+    """
+    if SESSION_MAX_BYTES and store.nbytes() >= SESSION_MAX_BYTES:
+        # Session already full: don't spend inference on docs we can't store
+        for doc in prepared:
+            if doc.chunks:
+                doc.status = "over_quota"
+
+    unique_texts: Dict[str, str] = {}
+    for doc in prepared:
+        if doc.status == "over_quota":
+            continue
+        for i in doc.to_embed:
+            unique_texts.setdefault(doc.hashes[i], doc.chunks[i].text)
+
+    fresh: Dict[str, np.ndarray] = {}
+    if unique_texts:
+        with stage("ingest", "embed"):
+            vectors = embed_texts(list(unique_texts.values()))
+        if len(vectors) != len(unique_texts):
+            logger.warning("Embedding count mismatch: got %d vectors for %d chunks", len(vectors), len(unique_texts))
+        else:
+            fresh = dict(zip(unique_texts.keys(), vectors))
+
+    for doc in prepared:
+        if doc.status == "over_quota":
+            continue
+        if not doc.chunks:
+            store.upsert_file_chunks(doc.path, [])
+            doc.status = "cleared"
+            continue
+
+        if any(doc.hashes[i] not in fresh for i in doc.to_embed):
+            doc.status = "failed"
+            continue
+
+        stored: List[StoredChunk] = []
+        total_chunk_count = len(doc.chunks)
+        for idx, chunk_result in enumerate(doc.chunks):
+            h = doc.hashes[idx]
+            vec = doc.existing.get(h)
+            if vec is None:
+                vec = fresh[h]
+            if vec.size == 0:
+                continue
+            stored.append(
+                StoredChunk(
+                    chunk_id=f"{doc.path}::chunk::{idx}",
+                    file_path=doc.path,
+                    text=chunk_result.text,
+                    vector=vec,
+                    chunk_index=idx,
+                    total_chunks=total_chunk_count,
+                    heading_breadcrumb=chunk_result.heading_breadcrumb,
+                    section_id=f"{doc.path}::{chunk_result.section_id}",
+                    doc_type=doc.doc_type,
+                    title=doc.title,
+                    mtime=doc.mtime,
+                    content_hash=h,
+                )
+            )
+
+        try:
+            with stage("ingest", "store"):
+                store.upsert_file_chunks(doc.path, stored, section_texts=doc.sections)
+        except SessionMemoryLimitError as exc:
+            logger.warning("Rejected %s: %s", doc.path, exc)
+            doc.status = "over_quota"
+            continue
+        doc.status = "ingested"
+        _INGESTED_CHUNKS.inc(len(doc.to_embed), kind="embedded")
+        _INGESTED_CHUNKS.inc(len(doc.chunks) - len(doc.to_embed), kind="reused")
+
+    if any(doc.status in ("ingested", "cleared") for doc in prepared):
+        schedule_snapshot(store)
+
+
 def ingest_docs(session_id: str, docs: List[Dict[str, Any]]) -> Dict[str, int]:
     """
     Ingest docs into the session-scoped in-memory store (RAM).
@@ -49,29 +205,45 @@ def ingest_docs(session_id: str, docs: List[Dict[str, Any]]) -> Dict[str, int]:
     Each doc:
       { "path": str, "text": str, "title"?: str, "mtime"?: float }
 
-    Overwrite semantics per path.
+    Overwrite semantics per path. Re-ingesting an existing path only
+    embeds chunks whose text changed; unchanged chunks keep their vectors.
     Server restart clears everything (no persistence).
+
+    Runs in three phases so the embedder sees one large batch per request
+    instead of one small batch per document:
+      1. validate + chunk + diff every doc
+      2. embed all new/changed chunk texts together
+      3. scatter vectors back and upsert each doc
     """
     store = get_store(session_id)
 
     ingested = 0
     skipped_empty = 0
     rejected = 0
+    reused = 0
+    reembedded = 0
+    over_quota = 0
 
     if not docs:
-        return {"ingested": 0, "skipped_empty": 0, "rejected": 0}
+        return {
+            "ingested": 0,
+            "skipped_empty": 0,
+            "rejected": 0,
+            "reused": 0,
+            "reembedded": 0,
+            "over_quota": 0,
+        }
 
     if len(docs) > MAX_DOCS_PER_INGEST:
         docs = docs[:MAX_DOCS_PER_INGEST]
         rejected += 1  # indicates truncation occurred
 
     total_chars = 0
+    prepared: List[_PreparedDoc] = []
 
+    # --- Phase 1: validate, chunk and diff ---
     for d in docs:
-        path_str = str(d.get("path", "") or "").strip()
-        text = str(d.get("text", "") or "")
-        title = str(d.get("title", "") or "").strip()
-        mtime = float(d.get("mtime", 0) or 0)
+        path_str, text, title, mtime = _read_doc(d)
 
         if not path_str:
             logger.warning("Skipping doc with missing path.")
@@ -79,7 +251,8 @@ def ingest_docs(session_id: str, docs: List[Dict[str, Any]]) -> Dict[str, int]:
             continue
 
         if not text.strip():
-            store.upsert_file_chunks(path_str, [])
+            # Empty doc clears the path (applied in order in phase 3)
+            prepared.append(_PreparedDoc(path=path_str))
             skipped_empty += 1
             continue
 
@@ -92,60 +265,92 @@ def ingest_docs(session_id: str, docs: List[Dict[str, Any]]) -> Dict[str, int]:
             rejected += 1
             break
 
-        doc_type = _detect_doc_type(path_str)
+        with stage("ingest", "chunk"):
+            doc = _prepare_doc(store, path_str, text, title, mtime)
+        if doc is None:
+            skipped_empty += 1
+            continue
+        if doc.chunks_truncated:
+            rejected += 1
+        prepared.append(doc)
 
-        chunking_result = chunk_text_rich(text)
-        chunks = chunking_result.chunks
-        section_texts = chunking_result.sections
+    # --- Phases 2 + 3: embed across all docs, then upsert ---
+    _embed_and_upsert(store, prepared)
 
-        if not chunks:
+    for doc in prepared:
+        if doc.status == "ingested":
+            ingested += 1
+            reused += len(doc.chunks) - len(doc.to_embed)
+            reembedded += len(doc.to_embed)
+        elif doc.status == "failed":
             skipped_empty += 1
-            continue
+        elif doc.status == "over_quota":
+            over_quota += 1
 
-        if len(chunks) > MAX_CHUNKS_PER_DOC:
-            chunks = chunks[:MAX_CHUNKS_PER_DOC]
-            rejected += 1
+    return {
+        "ingested": ingested,
+        "skipped_empty": skipped_empty,
+        "rejected": rejected,
+        "reused": reused,
+        "reembedded": reembedded,
+        "over_quota": over_quota,
+    }
 
-        # Prefix section_ids with the file path so they are globally unique
-        prefixed_sections = {
-            f"{path_str}::{sid}": txt
-            for sid, txt in section_texts.items()
+
+def ingest_docs_detailed(session_id: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Ingest a batch of docs and report a result per doc, in input order.
+
+    Used by the streaming ingest endpoint, which enforces its own limits
+    across the whole stream; only the per-doc limits apply here.
+
+    Each result:
+      { "path", "status", "chunks", "reused", "reembedded", "truncated" }
+    where status is "ingested", "cleared" (empty text), "skipped_empty"
+    (missing path / no chunks), "failed" (embedding error) or
+    "over_quota" (session byte cap reached; nothing stored).
+    """
+    store = get_store(session_id)
+
+    results: List[Dict[str, Any]] = []
+    prepared: List[Tuple[Dict[str, Any], _PreparedDoc]] = []
+
+    for d in docs:
+        path_str, text, title, mtime = _read_doc(d)
+        result: Dict[str, Any] = {
+            "path": path_str,
+            "status": "skipped_empty",
+            "chunks": 0,
+            "reused": 0,
+            "reembedded": 0,
+            "truncated": False,
         }
+        results.append(result)
 
-        chunk_texts = [c.text for c in chunks]
-        vectors = embed_batch(chunk_texts)
-        if vectors is None or len(vectors) == 0:
-            skipped_empty += 1
+        if not path_str:
+            continue
+        if not text.strip():
+            prepared.append((result, _PreparedDoc(path=path_str)))
             continue
 
-        if len(vectors) != len(chunks):
-            logger.warning("Embedding count mismatch: got %d vectors for %d chunks", len(vectors), len(chunks))
-            skipped_empty += 1
+        if len(text) > MAX_CHARS_PER_DOC:
+            text = text[:MAX_CHARS_PER_DOC]
+            result["truncated"] = True
+
+        with stage("ingest", "chunk"):
+            doc = _prepare_doc(store, path_str, text, title, mtime)
+        if doc is None:
             continue
+        result["truncated"] = result["truncated"] or doc.chunks_truncated
+        prepared.append((result, doc))
 
-        stored: List[StoredChunk] = []
-        total_chunk_count = len(chunks)
-        for idx, (chunk_result, vec_list) in enumerate(zip(chunks, vectors)):
-            vec = np.asarray(vec_list, dtype=np.float32).ravel()
-            if vec.size == 0:
-                continue
-            stored.append(
-                StoredChunk(
-                    chunk_id=f"{path_str}::chunk::{idx}",
-                    file_path=path_str,
-                    text=chunk_result.text,
-                    vector=vec,
-                    chunk_index=idx,
-                    total_chunks=total_chunk_count,
-                    heading_breadcrumb=chunk_result.heading_breadcrumb,
-                    section_id=f"{path_str}::{chunk_result.section_id}",
-                    doc_type=doc_type,
-                    title=title,
-                    mtime=mtime,
-                )
-            )
+    _embed_and_upsert(store, [doc for _result, doc in prepared])
 
-        store.upsert_file_chunks(path_str, stored, section_texts=prefixed_sections)
-        ingested += 1
+    for result, doc in prepared:
+        result["status"] = doc.status
+        if doc.status == "ingested":
+            result["chunks"] = len(doc.chunks)
+            result["reused"] = len(doc.chunks) - len(doc.to_embed)
+            result["reembedded"] = len(doc.to_embed)
 
-    return {"ingested": ingested, "skipped_empty": skipped_empty, "rejected": rejected}
\ No newline at end of file
+    return results
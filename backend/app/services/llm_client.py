@@ -3,9 +3,7 @@ from __future__ import annotations
 import os
 import time
 from dataclasses import dataclass
-from typing import Dict, Optional, Tuple
-
-from openai import OpenAI
+from typing import Dict, Iterator, Optional, Tuple
 
 # ----------------------------
 # Config (env-driven)
@@ -18,6 +16,11 @@ MAX_ASKS_PER_SESSION_PER_DAY = int(os.getenv("SMARTNOTE_MAX_ASKS_PER_SESSION_PER
 # If you want to hard-disable hosted LLM in some environments
 LLM_ENABLED = os.getenv("SMARTNOTE_LLM_ENABLED", "true").lower() in ("1", "true", "yes")
 
+# "openai" (hosted) or "fake" (local deterministic streamer, for tests/dev)
+LLM_PROVIDER = os.getenv("SMARTNOTE_LLM_PROVIDER", "openai").strip().lower()
+FAKE_LLM_DELAY_MS = float(os.getenv("SMARTNOTE_FAKE_LLM_DELAY_MS", "0"))
+FAKE_LLM_ANSWER = "This is a fake answer streamed by the local test LLM [1]."
+
 
 @dataclass
 class Usage:
@@ -58,10 +61,19 @@ def _check_and_increment_quota(session_id: str) -> Tuple[bool, int]:
     return True, remaining
 
 
-def generate_text(prompt: str, session_id: str) -> Tuple[str, Dict[str, int]]:
+def _fake_stream(prompt: str) -> Iterator[str]:
+    """Deterministic local "LLM": streams a canned answer word by word."""
+    words = FAKE_LLM_ANSWER.split(" ")
+    for i, word in enumerate(words):
+        if FAKE_LLM_DELAY_MS > 0:
+            time.sleep(FAKE_LLM_DELAY_MS / 1000.0)
+        yield word if i == 0 else " " + word
+
+
+def _preflight(session_id: str) -> Tuple[Optional[str], Dict[str, int]]:
     """
-    Hosted LLM call (OpenAI Responses API).
-    Returns (text, meta) where meta includes remaining quota.
+    Checks that apply before any LLM call (enabled, quota, API key).
+    Returns (message, meta); message is None if the call may proceed.
     """
     if not LLM_ENABLED:
         return "LLM is disabled on this server.", {"remaining_asks_today": 0}
@@ -73,11 +85,27 @@ def generate_text(prompt: str, session_id: str) -> Tuple[str, Dict[str, int]]:
             {"remaining_asks_today": 0},
         )
 
-    api_key = os.getenv("OPENAI_API_KEY", "").strip()
-    if not api_key:
+    if LLM_PROVIDER != "fake" and not os.getenv("OPENAI_API_KEY", "").strip():
         return "Server is missing OPENAI_API_KEY.", {"remaining_asks_today": remaining}
 
-    client = OpenAI(api_key=api_key)
+    return None, {"remaining_asks_today": remaining}
+
+
+def generate_text(prompt: str, session_id: str) -> Tuple[str, Dict[str, int]]:
+    """
+    Hosted LLM call (OpenAI Responses API).
+    Returns (text, meta) where meta includes remaining quota.
+    """
+    message, meta = _preflight(session_id)
+    if message is not None:
+        return message, meta
+
+    if LLM_PROVIDER == "fake":
+        return "".join(_fake_stream(prompt)), meta
+
+    from openai import OpenAI  # deferred: the SDK adds ~0.5s to cold start
+
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", "").strip())
 
     # Responses API: cap output tokens to cap cost per request
     # max_output_tokens is the recommended knob for response length control
@@ -92,4 +120,41 @@ def generate_text(prompt: str, session_id: str) -> Tuple[str, Dict[str, int]]:
     if not text:
         text = "Model returned empty response."
 
-    return text, {"remaining_asks_today": remaining}
\ No newline at end of file
+    return text, meta
+
+
+def stream_text(prompt: str, session_id: str) -> Tuple[Iterator[str], Dict[str, int]]:
+    """
+    Streaming variant of generate_text.
+    Returns (deltas, meta): quota is checked up front, and deltas is a
+    blocking iterator of answer text fragments as the model produces them.
+    """
+    message, meta = _preflight(session_id)
+    if message is not None:
+        return iter([message]), meta
+
+    if LLM_PROVIDER == "fake":
+        return _fake_stream(prompt), meta
+
+    def _deltas() -> Iterator[str]:
+        from openai import OpenAI
+
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", "").strip())
+        stream = client.responses.create(
+            model=DEFAULT_MODEL,
+            input=prompt,
+            max_output_tokens=MAX_OUTPUT_TOKENS,
+            stream=True,
+        )
+        produced = False
+        try:
+            for event in stream:
+                if event.type == "response.output_text.delta" and event.delta:
+                    produced = True
+                    yield event.delta
+        finally:
+            stream.close()
+        if not produced:
+            yield "Model returned empty response."
+
+    return _deltas(), meta
@@ -6,8 +6,11 @@ from typing import List, Dict, Any, Set, Tuple
 
 import numpy as np
 
-from ..utils.embeddings import embed_text, rerank
-from ..store.memory_store import get_store
+from ..utils.embeddings import embed_query, rerank
+from ..utils.metrics import REGISTRY, stage
+from ..utils.minhash import NUM_PERM, SIGNATURE_DTYPE, as_array, estimate_jaccard, minhash_signature
+from ..store.base import NoteStore
+from ..store.memory_store import get_store, StoredChunk
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +18,15 @@ MIN_SIMILARITY = 0.25  # lowered slightly since RRF + re-ranking handle precisio
 RRF_K = 60  # standard constant for Reciprocal Rank Fusion
 RERANK_CANDIDATE_MULTIPLIER = 4  # fetch this many × top_k candidates for re-ranking
 DEDUP_JACCARD_THRESHOLD = 0.85  # near-duplicate detection threshold
+BM25_CANDIDATES = 1000  # top BM25 hits fused with the dense ranking (0 = all matches)
+
+_SEARCHES = REGISTRY.counter("smartnote_searches_total", "search_chunks calls on non-empty sessions")
+_CHUNKS_SCANNED = REGISTRY.counter(
+    "smartnote_search_chunks_scanned_total", "Session chunks searched (dense + BM25) per query, summed"
+)
+_CANDIDATES = REGISTRY.counter(
+    "smartnote_search_candidates_total", "Fused candidates resolved per query, summed"
+)
 
 
 # ---------------------------------------------------------------------------
@@ -39,65 +51,98 @@ def search_chunks(
       5. Near-duplicate removal
       6. File diversity
       7. Neighbor expansion
+
+    Each phase is timed as a stage of the "search" pipeline (utils/metrics).
     """
     if not (query or "").strip():
         return []
 
     store = get_store(session_id)
-    stored_chunks = store.all_chunks()
-    if not stored_chunks:
+    n_chunks = len(store)
+    if n_chunks == 0:
         return []
+    _SEARCHES.inc()
+    _CHUNKS_SCANNED.inc(n_chunks)
 
     # --- Phase 1: Dense vector retrieval ---
-    q_vec = np.asarray(embed_text(query), dtype=np.float32).ravel()
+    with stage("search", "embed_query"):
+        q_vec = embed_query(query)
     if q_vec.size == 0:
         return []
 
-    mat = np.vstack([ch.vector.ravel() for ch in stored_chunks]).astype(
-        np.float32, copy=False
-    )
-    dense_scores = mat @ q_vec
-
-    # Build dense ranking (filtered by min similarity)
-    dense_idxs = np.where(dense_scores >= MIN_SIMILARITY)[0]
-    dense_ranked = dense_idxs[np.argsort(dense_scores[dense_idxs])[::-1]]
+    # Dense ranking (filtered by min similarity), scored against the
+    # store's persistent matrix — no per-query re-stacking of vectors
+    with stage("search", "dense"):
+        dense_ranked, _dense_scores = store.dense_search(q_vec, min_score=MIN_SIMILARITY)
 
     # --- Phase 2: BM25 keyword retrieval ---
-    bm25_results = store.bm25_search(query, top_k=0)  # all matches
-    bm25_ranked = [idx for idx, _score in bm25_results]
+    with stage("search", "bm25"):
+        bm25_results = store.bm25_search(query, top_k=BM25_CANDIDATES)
+        bm25_ranked = [idx for idx, _score in bm25_results]
 
     # --- Phase 3: Reciprocal Rank Fusion ---
-    candidate_limit = top_k * RERANK_CANDIDATE_MULTIPLIER
-    fused = _reciprocal_rank_fusion(dense_ranked.tolist(), bm25_ranked)
+    with stage("search", "fusion"):
+        candidate_limit = top_k * RERANK_CANDIDATE_MULTIPLIER
+        fused = _reciprocal_rank_fusion(dense_ranked.tolist(), bm25_ranked)
+
+        # Take top candidates for re-ranking (or final selection)
+        candidate_idxs = [
+            idx for idx, _score in sorted(fused.items(), key=lambda x: x[1], reverse=True)
+        ][:candidate_limit]
 
-    # Take top candidates for re-ranking (or final selection)
-    candidate_idxs = [
-        idx for idx, _score in sorted(fused.items(), key=lambda x: x[1], reverse=True)
-    ][:candidate_limit]
+        # Resolve row ids to chunks; rows freed by a concurrent upsert drop out
+        stored_chunks = store.get_chunks(candidate_idxs)
+        candidate_idxs = [idx for idx in candidate_idxs if idx in stored_chunks]
+    _CANDIDATES.inc(len(candidate_idxs))
 
     if not candidate_idxs:
         return []
 
     # --- Phase 4: Cross-encoder re-ranking (optional) ---
     if use_reranker and len(candidate_idxs) > 1:
-        candidate_idxs = _rerank_candidates(
-            query, candidate_idxs, stored_chunks
-        )
+        with stage("search", "rerank"):
+            candidate_idxs = _rerank_candidates(
+                query, candidate_idxs, stored_chunks
+            )
 
-    # --- Phase 5: Near-duplicate removal ---
-    candidate_idxs = _deduplicate(candidate_idxs, stored_chunks)
+    # --- Phases 5 + 6: Near-duplicate removal, file diversity ---
+    with stage("search", "dedup_diversify"):
+        candidate_idxs = _deduplicate(candidate_idxs, stored_chunks)
 
-    # --- Phase 6: File diversity ---
-    if diversify and top_k > 0:
-        selected_idxs = _diversify_results(candidate_idxs, stored_chunks, top_k)
-    else:
-        selected_idxs = candidate_idxs[:top_k] if top_k > 0 else candidate_idxs
+        if diversify and top_k > 0:
+            selected_idxs = _diversify_results(candidate_idxs, stored_chunks, top_k)
+        else:
+            selected_idxs = candidate_idxs[:top_k] if top_k > 0 else candidate_idxs
 
     # --- Phase 7: Build results with optional neighbor expansion ---
+    with stage("search", "build_results"):
+        return _build_results(
+            store, q_vec, selected_idxs, stored_chunks, expand_neighbors, neighbor_window
+        )
+
+
+def search(session_id: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    return search_chunks(session_id, query, top_k=top_k, diversify=True)
+
+
+# ---------------------------------------------------------------------------
+# Internals
+# ---------------------------------------------------------------------------
+
+def _build_results(
+    store: NoteStore,
+    q_vec: np.ndarray,
+    selected_idxs: List[int],
+    stored_chunks: Dict[int, StoredChunk],
+    expand_neighbors: bool,
+    neighbor_window: int,
+) -> List[Dict[str, Any]]:
+    """Score the selected rows and shape them as response entries."""
     results: List[Dict[str, Any]] = []
     seen_chunk_ids: Set[str] = set()
+    selected_scores = store.score_rows(q_vec, selected_idxs)
 
-    for i in selected_idxs:
+    for i, score in zip(selected_idxs, selected_scores):
         ch = stored_chunks[i]
         if ch.chunk_id in seen_chunk_ids:
             continue
@@ -107,7 +152,7 @@ def search_chunks(
             "chunk_id": ch.chunk_id,
             "file_path": ch.file_path,
             "text": ch.text,
-            "score": float(dense_scores[i]) if i < len(dense_scores) else 0.0,
+            "score": float(score),
             "heading_breadcrumb": ch.heading_breadcrumb,
             "chunk_index": ch.chunk_index,
             "section_id": ch.section_id,
@@ -136,14 +181,6 @@ def search_chunks(
     return results
 
 
-def search(session_id: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-    return search_chunks(session_id, query, top_k=top_k, diversify=True)
-
-
-# ---------------------------------------------------------------------------
-# Internals
-# ---------------------------------------------------------------------------
-
 def _reciprocal_rank_fusion(
     dense_ranked: List[int], bm25_ranked: List[int]
 ) -> Dict[int, float]:
@@ -160,12 +197,13 @@ def _reciprocal_rank_fusion(
 
 
 def _rerank_candidates(
-    query: str, candidate_idxs: List[int], stored_chunks: list
+    query: str, candidate_idxs: List[int], stored_chunks: Dict[int, StoredChunk]
 ) -> List[int]:
     """Re-rank candidates using a cross-encoder for more accurate relevance."""
     texts = [stored_chunks[i].text for i in candidate_idxs]
+    hashes = [stored_chunks[i].content_hash for i in candidate_idxs]
     try:
-        scores = rerank(query, texts)
+        scores = rerank(query, texts, text_hashes=hashes)
     except Exception:
         logger.warning("Cross-encoder re-ranking failed, falling back to RRF order")
         return candidate_idxs
@@ -176,35 +214,36 @@ def _rerank_candidates(
 
 
 def _deduplicate(
-    candidate_idxs: List[int], stored_chunks: list
+    candidate_idxs: List[int], stored_chunks: Dict[int, StoredChunk]
 ) -> List[int]:
-    """Remove near-duplicate chunks using Jaccard similarity on word sets."""
+    """
+    Remove near-duplicate chunks: Jaccard similarity of word sets,
+    estimated from the MinHash signatures stored with each chunk.
+    """
     if len(candidate_idxs) <= 1:
         return candidate_idxs
 
     result: List[int] = []
-    kept_word_sets: List[set] = []
+    kept = np.empty((len(candidate_idxs), NUM_PERM), dtype=SIGNATURE_DTYPE)
 
     for idx in candidate_idxs:
-        words = set(stored_chunks[idx].text.lower().split())
-        if not words:
+        ch = stored_chunks[idx]
+        # Chunks stored before signatures existed have none yet
+        signature = ch.minhash or minhash_signature(ch.text)
+        if not signature:
+            continue  # no words
+        sig = as_array(signature)
+        n = len(result)
+        if n and estimate_jaccard(sig, kept[:n]).max() > DEDUP_JACCARD_THRESHOLD:
             continue
-        is_dup = False
-        for kept_words in kept_word_sets:
-            intersection = len(words & kept_words)
-            union = len(words | kept_words)
-            if union > 0 and intersection / union > DEDUP_JACCARD_THRESHOLD:
-                is_dup = True
-                break
-        if not is_dup:
-            result.append(idx)
-            kept_word_sets.append(words)
+        kept[n] = sig
+        result.append(idx)
 
     return result
 
 
 def _diversify_results(
-    candidate_idxs: List[int], stored_chunks: list, top_k: int
+    candidate_idxs: List[int], stored_chunks: Dict[int, StoredChunk], top_k: int
 ) -> List[int]:
     """
     Select top_k results with file diversity via round-robin.
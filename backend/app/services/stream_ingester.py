@@ -0,0 +1,186 @@
+"""
+Streaming ingest: NDJSON documents in, NDJSON per-document results out.
+
+The request body is read incrementally, one document per line.  Documents
+are grouped into small batches (bounded by doc count and characters),
+chunked and embedded on the inference executor, and each document's
+result is streamed back as soon as its batch is stored.  Memory use is
+bounded by one batch plus one line, regardless of total upload size.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .ingester import MAX_CHARS_PER_DOC, ingest_docs_detailed
+from ..utils.executors import run_inference
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_DOCS = int(os.getenv("SMARTNOTE_STREAM_BATCH_DOCS", "16"))
+STREAM_BATCH_CHARS = int(os.getenv("SMARTNOTE_STREAM_BATCH_CHARS", "262144"))
+# Total characters accepted per stream (0 = unlimited)
+MAX_CHARS_PER_STREAM = int(os.getenv("SMARTNOTE_MAX_CHARS_PER_STREAM", "20000000"))
+
+# A JSON line can be several times longer than its text (UTF-8 + escaping)
+MAX_LINE_BYTES = MAX_CHARS_PER_DOC * 6 + 64 * 1024
+
+
+class _OversizedLine:
+    """Marker yielded in place of a line that exceeded MAX_LINE_BYTES."""
+
+
+_OVERSIZED = _OversizedLine()
+
+
+async def _iter_lines(
+    body: AsyncIterator[bytes], max_line_bytes: int
+) -> AsyncIterator[bytes | _OversizedLine]:
+    """
+    Split a byte stream into lines without ever buffering more than
+    max_line_bytes. Every line is yielded exactly once, blank ones too, so
+    callers can count input lines; oversized lines are discarded and
+    reported as _OVERSIZED.
+    """
+    buf = bytearray()
+    discarding = False
+
+    async for piece in body:
+        start = 0
+        while True:
+            nl = piece.find(b"\n", start)
+            if nl < 0:
+                if not discarding:
+                    buf += piece[start:]
+                    if len(buf) > max_line_bytes:
+                        buf.clear()
+                        discarding = True
+                        yield _OVERSIZED
+                break
+
+            if discarding:
+                discarding = False
+            else:
+                buf += piece[start:nl]
+                if len(buf) > max_line_bytes:
+                    yield _OVERSIZED
+                else:
+                    yield bytes(buf)
+            buf.clear()
+            start = nl + 1
+
+    if buf and not discarding:
+        yield bytes(buf)
+
+
+def _line(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _parse_doc(raw: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        obj = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(obj, dict) or not isinstance(obj.get("path"), str):
+        return None
+    text = obj.get("text", "")
+    if not isinstance(text, str):
+        return None
+    return {
+        "path": obj["path"],
+        "text": text,
+        "title": obj.get("title"),
+        "mtime": obj.get("mtime"),
+    }
+
+
+async def stream_ingest(session_id: str, body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Consume NDJSON docs ({"path", "text", "title"?, "mtime"?} per line)
+    and yield one NDJSON result per doc, followed by a summary line.
+    Every result carries the doc's 1-based input "line": rejected lines
+    are reported at once, stored docs when their batch is, so results
+    may come back out of input order.  The summary:
+      {"done": true, "ingested": n, "skipped_empty": n, "rejected": n,
+       "failed": n, "over_quota": n, "reused": n, "reembedded": n}
+    """
+    totals = {
+        "ingested": 0,
+        "skipped_empty": 0,
+        "rejected": 0,
+        "failed": 0,
+        "over_quota": 0,
+        "reused": 0,
+        "reembedded": 0,
+    }
+    pending: List[Dict[str, Any]] = []
+    pending_lines: List[int] = []  # input line of each pending doc
+    pending_chars = 0
+    total_chars = 0
+    line_no = 0
+    limit_hit = False
+
+    async def flush() -> AsyncIterator[bytes]:
+        results = await run_inference(ingest_docs_detailed, session_id, pending)
+        for line, result in zip(pending_lines, results):
+            status = result["status"]
+            if status == "ingested":
+                totals["ingested"] += 1
+                totals["reused"] += result["reused"]
+                totals["reembedded"] += result["reembedded"]
+            elif status == "failed":
+                totals["failed"] += 1
+            elif status == "over_quota":
+                totals["over_quota"] += 1
+            else:
+                totals["skipped_empty"] += 1
+            if result["truncated"]:
+                totals["rejected"] += 1
+            yield _line({"line": line, **result})
+
+    async for raw in _iter_lines(body, MAX_LINE_BYTES):
+        line_no += 1
+        if limit_hit:
+            continue
+        if not isinstance(raw, _OversizedLine) and not raw.strip():
+            continue  # blank lines are counted but carry no doc
+
+        if isinstance(raw, _OversizedLine):
+            totals["rejected"] += 1
+            yield _line({"line": line_no, "status": "rejected", "error": "document too large"})
+            continue
+
+        doc = _parse_doc(raw)
+        if doc is None:
+            totals["rejected"] += 1
+            yield _line({"line": line_no, "status": "rejected", "error": "invalid document"})
+            continue
+
+        doc_chars = min(len(doc["text"]), MAX_CHARS_PER_DOC)
+        if MAX_CHARS_PER_STREAM and total_chars + doc_chars > MAX_CHARS_PER_STREAM:
+            # Stop accepting docs but keep draining the body
+            limit_hit = True
+            totals["rejected"] += 1
+            yield _line({"line": line_no, "status": "rejected", "error": "stream size limit reached"})
+            continue
+
+        total_chars += doc_chars
+        pending.append(doc)
+        pending_lines.append(line_no)
+        pending_chars += doc_chars
+        if len(pending) >= STREAM_BATCH_DOCS or pending_chars >= STREAM_BATCH_CHARS:
+            async for out in flush():
+                yield out
+            pending = []
+            pending_lines = []
+            pending_chars = 0
+
+    if pending:
+        async for out in flush():
+            yield out
+
+    yield _line({"done": True, **totals})
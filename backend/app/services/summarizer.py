@@ -1,11 +1,15 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from collections import OrderedDict
+import json
 import logging
+import time
 
 from .searcher import search_chunks
-from .llm_client import generate_text
+from .llm_client import generate_text, stream_text
+from ..utils.executors import iterate_in_io, run_inference, run_io
+from ..utils.metrics import collect_timings, record_stage, rounded_timings, stage
 from ..store.memory_store import get_store
 
 logger = logging.getLogger(__name__)
@@ -163,30 +167,46 @@ def make_prompt(query: str, context: str) -> str:
     )
 
 
+def _retrieve_and_prompt(
+    session_id: str, cleaned_query: str, top_k: int
+) -> Tuple[List[Dict[str, Any]], str]:
+    """Retrieval + context building: everything before the LLM call."""
+    with stage("ask", "retrieval"):
+        chunks = search_chunks(
+            session_id,
+            cleaned_query,
+            top_k=top_k,
+            expand_neighbors=True,
+            neighbor_window=1,
+            diversify=True,
+            use_reranker=True,
+        )
+    if not chunks:
+        return [], ""
+
+    with stage("ask", "context"):
+        context = build_context(chunks, session_id=session_id)
+        prompt = make_prompt(cleaned_query, context)
+    return chunks, prompt
+
+
+def _empty_query_response(query: str) -> Dict[str, Any]:
+    return {
+        "query": query,
+        "answer": "Query is empty. Please provide a question.",
+        "chunks": [],
+    }
+
+
 def answer_query(session_id: str, query: str, top_k: int = 5) -> Dict[str, Any]:
     cleaned_query = (query or "").strip()
     if not cleaned_query:
-        return {
-            "query": query,
-            "answer": "Query is empty. Please provide a question.",
-            "chunks": [],
-        }
-
-    chunks = search_chunks(
-        session_id,
-        cleaned_query,
-        top_k=top_k,
-        expand_neighbors=True,
-        neighbor_window=1,
-        diversify=True,
-        use_reranker=True,
-    )
+        return _empty_query_response(query)
+
+    chunks, prompt = _retrieve_and_prompt(session_id, cleaned_query, top_k)
     if not chunks:
         return {"query": query, "answer": IDK_PHRASE, "chunks": []}
 
-    context = build_context(chunks, session_id=session_id)
-    prompt = make_prompt(cleaned_query, context)
-
     answer, meta = generate_text(prompt, session_id=session_id)
 
     return {
@@ -194,4 +214,108 @@ def answer_query(session_id: str, query: str, top_k: int = 5) -> Dict[str, Any]:
         "answer": answer,
         "chunks": chunks,
         "meta": meta,
-    }
\ No newline at end of file
+    }
+
+
+async def answer_query_async(
+    session_id: str, query: str, top_k: int = 5, timings: bool = False
+) -> Dict[str, Any]:
+    """
+    Same as answer_query, but retrieval/reranking runs on the inference
+    executor and the blocking LLM call on the I/O executor.
+
+    With timings=True the response carries a "timings" dict: milliseconds
+    per stage (retrieval and its search stages, context, llm).
+    """
+    cleaned_query = (query or "").strip()
+    if not cleaned_query:
+        return _empty_query_response(query)
+
+    start = time.perf_counter()
+    stage_ms: Optional[Dict[str, float]] = {} if timings else None
+    with collect_timings(stage_ms):
+        chunks, prompt = await run_inference(
+            _retrieve_and_prompt, session_id, cleaned_query, top_k
+        )
+        if not chunks:
+            response = {"query": query, "answer": IDK_PHRASE, "chunks": []}
+        else:
+            with stage("ask", "llm"):
+                answer, meta = await run_io(generate_text, prompt, session_id=session_id)
+            response = {
+                "query": query,
+                "answer": answer,
+                "chunks": chunks,
+                "meta": meta,
+            }
+
+    return _with_timings(response, stage_ms, start)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def answer_query_stream(
+    session_id: str, query: str, top_k: int = 5, timings: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    Server-sent-event version of answer_query:
+      event: chunks  {"query", "chunks"}   — as soon as retrieval finishes
+      event: token   {"text"}              — one per streamed answer fragment
+      event: done    {"answer", "meta"}    — full answer + quota info
+                                             (+ "timings" when requested)
+      event: error   {"error"}             — if generation fails mid-stream
+    """
+    cleaned_query = (query or "").strip()
+    if not cleaned_query:
+        empty = _empty_query_response(query)
+        yield _sse("chunks", {"query": query, "chunks": []})
+        yield _sse("token", {"text": empty["answer"]})
+        yield _sse("done", {"answer": empty["answer"], "meta": {}})
+        return
+
+    # The contextvar is only set around awaits, never across a yield
+    request_start = time.perf_counter()
+    stage_ms: Optional[Dict[str, float]] = {} if timings else None
+    with collect_timings(stage_ms):
+        chunks, prompt = await run_inference(
+            _retrieve_and_prompt, session_id, cleaned_query, top_k
+        )
+    yield _sse("chunks", {"query": query, "chunks": chunks})
+
+    if not chunks:
+        yield _sse("token", {"text": IDK_PHRASE})
+        yield _sse("done", _with_timings({"answer": IDK_PHRASE, "meta": {}}, stage_ms, request_start))
+        return
+
+    start = time.perf_counter()
+    first_token: Optional[float] = None
+    deltas, meta = await run_io(stream_text, prompt, session_id)
+    parts: List[str] = []
+    try:
+        async for delta in iterate_in_io(lambda: deltas):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            parts.append(delta)
+            yield _sse("token", {"text": delta})
+    except Exception:
+        logger.exception("LLM streaming failed")
+        yield _sse("error", {"error": "Answer generation failed."})
+        return
+
+    with collect_timings(stage_ms):
+        if first_token is not None:
+            record_stage("ask", "llm_first_token", first_token)
+        record_stage("ask", "llm", time.perf_counter() - start)
+    yield _sse("done", _with_timings({"answer": "".join(parts).strip(), "meta": meta}, stage_ms, request_start))
+
+
+def _with_timings(
+    data: Dict[str, Any], stage_ms: Optional[Dict[str, float]], start: float
+) -> Dict[str, Any]:
+    """Attach requested stage timings (ms), plus the request's total so far."""
+    if stage_ms is not None:
+        stage_ms["total"] = (time.perf_counter() - start) * 1000
+        data["timings"] = rounded_timings(stage_ms)
+    return data
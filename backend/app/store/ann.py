@@ -0,0 +1,157 @@
+"""
+Approximate nearest-neighbor index for large sessions.
+
+IVFIndex is an inverted-file index in pure NumPy: vectors are clustered
+with spherical k-means, each row is filed under its nearest centroid, and
+a query only scores the rows in its `nprobe` closest clusters.  Rows can
+be added and removed individually, which keeps the per-path overwrite
+semantics of MemoryStore cheap.
+
+The index stores row ids only; vectors stay in the store's VectorMatrix.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_ASSIGN_BLOCK = 4096  # rows scored against centroids at a time
+_ROW_BYTES = 160  # list slot + row->(list, pos) dict entry with its tuple and ints
+
+
+class IVFIndex:
+    def __init__(
+        self,
+        nlist: int = 0,
+        nprobe: int = 16,
+        kmeans_iters: int = 8,
+        max_train_rows: int = 65_536,
+        seed: int = 0,
+    ) -> None:
+        """
+        nlist: number of clusters (0 = ~4*sqrt(N) at build time).
+        nprobe: clusters scanned per query — higher means better recall, more latency.
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.kmeans_iters = kmeans_iters
+        self.max_train_rows = max_train_rows
+        self._rng = np.random.default_rng(seed)
+        self._centroids: Optional[np.ndarray] = None  # (nlist, d)
+        self._lists: List[List[int]] = []
+        self._where: Dict[int, Tuple[int, int]] = {}  # row -> (list id, position)
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def build(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """(Re)train centroids on vectors and file every row."""
+        n = len(rows)
+        nlist = self.nlist or int(4 * math.sqrt(max(n, 1)))
+        nlist = max(1, min(nlist, n))
+
+        if n > self.max_train_rows:
+            sample = vectors[self._rng.choice(n, self.max_train_rows, replace=False)]
+        else:
+            sample = vectors
+        self._centroids = self._kmeans(sample, nlist)
+        self._lists = [[] for _ in range(nlist)]
+        self._where = {}
+        self.trained_size = n
+        self.add_many(rows, vectors)
+
+    def add_many(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        if self._centroids is None or len(rows) == 0:
+            return
+        for row, list_id in zip(np.asarray(rows).tolist(), self._assign(vectors).tolist()):
+            if row in self._where:
+                self.remove(row)
+            lst = self._lists[list_id]
+            self._where[row] = (list_id, len(lst))
+            lst.append(row)
+
+    def remove(self, row: int) -> None:
+        loc = self._where.pop(row, None)
+        if loc is None:
+            return
+        list_id, pos = loc
+        lst = self._lists[list_id]
+        last = lst.pop()
+        if last != row:
+            # Swap-remove: move the last row into the hole
+            lst[pos] = last
+            self._where[last] = (list_id, pos)
+
+    def candidates(self, q_vec: np.ndarray, nprobe: int = 0) -> np.ndarray:
+        """Row ids in the nprobe clusters closest to q_vec."""
+        if self._centroids is None:
+            return np.zeros(0, dtype=np.int64)
+        nprobe = min(nprobe or self.nprobe, len(self._lists))
+        sims = self._centroids @ q_vec
+        if nprobe < len(sims):
+            probe = np.argpartition(sims, -nprobe)[-nprobe:]
+        else:
+            probe = np.arange(len(sims))
+        parts = [self._lists[c] for c in probe.tolist() if self._lists[c]]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.fromiter(
+            (r for part in parts for r in part),
+            dtype=np.int64,
+            count=sum(len(p) for p in parts),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Estimated footprint: centroids plus per-row list slot and location entry."""
+        centroids = 0 if self._centroids is None else int(self._centroids.nbytes)
+        return centroids + len(self._where) * _ROW_BYTES
+
+    def stats(self) -> dict:
+        sizes = [len(lst) for lst in self._lists]
+        return {
+            "type": "ivf",
+            "nlist": len(self._lists),
+            "nprobe": self.nprobe,
+            "rows": len(self._where),
+            "trained_size": self.trained_size,
+            "max_list": max(sizes) if sizes else 0,
+        }
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assert self._centroids is not None
+        out = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), _ASSIGN_BLOCK):
+            block = vectors[start : start + _ASSIGN_BLOCK]
+            out[start : start + len(block)] = np.argmax(block @ self._centroids.T, axis=1)
+        return out
+
+    def _kmeans(self, x: np.ndarray, k: int) -> np.ndarray:
+        """Spherical k-means (vectors are unit-normalized, so assign by dot product)."""
+        x = np.asarray(x, dtype=np.float32)
+        columns = np.ascontiguousarray(x.T)  # one bincount per dimension below
+        centroids = x[self._rng.choice(len(x), k, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            self._centroids = centroids
+            assign = self._assign(x)
+            # Per-cluster sums: bincount per dimension is several times
+            # faster than the scatter-add of np.add.at
+            sums = np.stack(
+                [np.bincount(assign, weights=col, minlength=k) for col in columns], axis=1
+            ).astype(np.float32)
+            counts = np.bincount(assign, minlength=k)
+
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters with random points
+                sums[empty] = x[self._rng.choice(len(x), int(empty.sum()), replace=True)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+        return centroids.astype(np.float32, copy=False)
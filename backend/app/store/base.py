@@ -0,0 +1,114 @@
+"""
+Storage backend interface shared by the per-session stores.
+
+MemoryStore (store/memory_store.py) keeps everything in process memory;
+SqliteStore (store/sqlite_store.py) keeps it in a per-session SQLite file
+using sqlite-vec for dense search and FTS5 for BM25.  The backend is
+chosen with SMARTNOTE_STORE_BACKEND; services only use this interface.
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class StoredChunk:
+    chunk_id: str
+    file_path: str
+    text: str
+    vector: Optional[np.ndarray]  # shape: (d,), float32, normalized; released once stored
+    chunk_index: int = 0          # position within the file's chunks
+    total_chunks: int = 0         # total chunks for this file
+    heading_breadcrumb: str = ""  # e.g. "## Arch > ### DB"
+    section_id: str = ""          # parent section ID for expansion
+    doc_type: str = ""            # e.g. "markdown", "code", "text"
+    title: str = ""               # document title
+    mtime: float = 0.0            # last-modified timestamp
+    content_hash: str = ""        # hash of text; filled in on upsert if empty
+    minhash: bytes = b""          # word-set MinHash (utils/minhash); filled in on upsert if empty
+
+
+class SessionMemoryLimitError(RuntimeError):
+    """Raised by upsert_file_chunks when a session would exceed its byte cap."""
+
+
+class NoteStore(ABC):
+    """
+    One session's chunks, with dense and keyword search over them.
+
+    Chunks are addressed by integer row ids, stable while the chunk is
+    stored.  upsert_file_chunks has overwrite semantics per file_path.
+    Implementations are thread-safe.
+    """
+
+    session_id: str = ""
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Delete every chunk and section of the session."""
+
+    def close(self) -> None:
+        """Release the store's resources (the session is leaving this process)."""
+
+    def expire(self, ttl_seconds: int) -> None:
+        """
+        The session idled out of this process.  Release it; backends shared
+        between processes keep data another process used within ttl_seconds.
+        """
+        self.close()
+
+    def touch(self) -> None:
+        """Record an access (for backends shared between processes)."""
+
+    @abstractmethod
+    def upsert_file_chunks(
+        self,
+        file_path: str,
+        chunks: List[StoredChunk],
+        section_texts: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, int]:
+        """Replace file_path's chunks. Returns {"reused", "added", "removed"} counts."""
+
+    @abstractmethod
+    def file_vectors(self, file_path: str) -> Dict[str, np.ndarray]:
+        """content_hash -> stored vector for file_path's current chunks."""
+
+    @abstractmethod
+    def get_chunks(self, rows: List[int]) -> Dict[int, StoredChunk]:
+        """Resolve row ids to chunks, omitting rows that no longer exist."""
+
+    @abstractmethod
+    def dense_search(
+        self, q_vec: np.ndarray, min_score: float = -np.inf, exact: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(row_ids, scores) by descending inner product, scores >= min_score."""
+
+    @abstractmethod
+    def score_rows(self, q_vec: np.ndarray, rows: List[int]) -> np.ndarray:
+        """Dense scores for specific rows (0.0 for unknown rows)."""
+
+    @abstractmethod
+    def bm25_search(self, query: str, top_k: int = 0) -> List[Tuple[int, float]]:
+        """(row_id, score) pairs by descending BM25 score (top_k=0: all matches)."""
+
+    @abstractmethod
+    def get_neighbors(self, file_path: str, chunk_index: int, window: int = 1) -> List[StoredChunk]:
+        """Chunks of file_path within window of chunk_index (excluding it), in order."""
+
+    @abstractmethod
+    def get_section_text(self, section_id: str) -> Optional[str]: ...
+
+    def nbytes(self) -> int:
+        """Estimated process memory held by the store (counts toward the budget)."""
+        return 0
+
+    @abstractmethod
+    def stats(self) -> dict: ...
@@ -1,89 +1,446 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from dataclasses import fields
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import sqlite3
+import sys
 import threading
 import time
+import weakref
 
 import numpy as np
 
-from ..utils.bm25 import BM25Index
-
-
-@dataclass
-class StoredChunk:
-    chunk_id: str
-    file_path: str
-    text: str
-    vector: np.ndarray  # shape: (d,), expected float32 and normalized
-    chunk_index: int = 0          # position within the file's chunks
-    total_chunks: int = 0         # total chunks for this file
-    heading_breadcrumb: str = ""  # e.g. "## Arch > ### DB"
-    section_id: str = ""          # parent section ID for expansion
-    doc_type: str = ""            # e.g. "markdown", "code", "text"
-    title: str = ""               # document title
-    mtime: float = 0.0            # last-modified timestamp
-
-
-class MemoryStore:
+from ..utils.bm25 import BM25_ENGINES
+from ..utils.cache import content_hash
+from ..utils.minhash import minhash_signature
+from . import snapshot
+from .ann import IVFIndex
+from .base import NoteStore, SessionMemoryLimitError, StoredChunk
+from .vectors import VECTOR_DTYPES, VectorMatrix
+
+logger = logging.getLogger(__name__)
+
+# Approximate nearest-neighbor search for large sessions, off by default:
+# IVF trades recall for latency (see the README), and exact search over a
+# few tens of thousands of chunks takes only milliseconds.  With
+# ANN_INDEX=ivf, sessions of ANN_MIN_ROWS chunks and up use it.
+ANN_INDEX = os.getenv("SMARTNOTE_ANN_INDEX", "none").strip().lower()
+ANN_MIN_ROWS = int(os.getenv("SMARTNOTE_ANN_MIN_ROWS", "20000"))
+ANN_NLIST = int(os.getenv("SMARTNOTE_ANN_NLIST", "0"))  # 0 = ~4*sqrt(N)
+ANN_NPROBE = int(os.getenv("SMARTNOTE_ANN_NPROBE", "16"))
+
+# Storage type of the scanned embedding matrix: float32 | float16 | int8.
+# Quantized matrices keep full-precision vectors in a memmap under
+# VECTOR_SPILL_DIR and rescore the top VECTOR_RESCORE_K dense hits exactly.
+VECTOR_DTYPE = os.getenv("SMARTNOTE_VECTOR_DTYPE", "float32").strip().lower()
+if VECTOR_DTYPE not in VECTOR_DTYPES:
+    raise ValueError(f"SMARTNOTE_VECTOR_DTYPE must be one of {VECTOR_DTYPES}, got {VECTOR_DTYPE!r}")
+VECTOR_SPILL_DIR = os.getenv("SMARTNOTE_VECTOR_SPILL_DIR", "").strip() or None
+VECTOR_RESCORE_K = int(os.getenv("SMARTNOTE_VECTOR_RESCORE_K", "256"))
+# Approximate scores this far below min_score are still rescored
+_RESCORE_MARGIN = 0.05
+
+# Keyword index: "sparse" (SciPy CSR term-document matrix, vectorized
+# scoring) or "postings" (pure-Python inverted index). Same scores.
+BM25_ENGINE = os.getenv("SMARTNOTE_BM25_ENGINE", "sparse").strip().lower()
+if BM25_ENGINE not in BM25_ENGINES:
+    raise ValueError(f"SMARTNOTE_BM25_ENGINE must be one of {tuple(BM25_ENGINES)}, got {BM25_ENGINE!r}")
+
+# Session storage backend: "memory" (this module) or "sqlite" (store/sqlite_store.py)
+STORE_BACKEND = os.getenv("SMARTNOTE_STORE_BACKEND", "memory").strip().lower()
+if STORE_BACKEND not in ("memory", "sqlite"):
+    raise ValueError(f"SMARTNOTE_STORE_BACKEND must be 'memory' or 'sqlite', got {STORE_BACKEND!r}")
+if STORE_BACKEND == "sqlite" and not hasattr(sqlite3.Connection, "enable_load_extension"):
+    # sqlite-vec is a loadable extension; fail at startup, not on first request
+    raise RuntimeError(
+        "SMARTNOTE_STORE_BACKEND=sqlite needs a Python whose sqlite3 module can load "
+        "extensions (for sqlite-vec); this build was compiled without extension loading"
+    )
+
+# Memory limits (0 = unlimited). The process-wide budget is enforced by
+# evicting least-recently-used sessions; the per-session cap rejects
+# uploads that would grow a session past it.
+MEMORY_BUDGET_BYTES = int(os.getenv("SMARTNOTE_MEMORY_BUDGET_BYTES", "0"))
+SESSION_MAX_BYTES = int(os.getenv("SMARTNOTE_SESSION_MAX_BYTES", "0"))
+
+# Approximate CPython overhead of a StoredChunk instance (object + __dict__)
+_CHUNK_OVERHEAD_BYTES = 400
+_ROW_SLOT_BYTES = 8
+# Rough BM25 growth per character of chunk text, for the pre-upsert cap check
+_BM25_BYTES_PER_CHAR = 5
+
+
+# StoredChunk fields persisted in snapshots (vectors go to the .npy file;
+# MinHash signatures are recomputed from the text on load, like BM25)
+_SNAPSHOT_FIELDS = [f.name for f in fields(StoredChunk) if f.name not in ("vector", "minhash")]
+
+
+def _chunk_nbytes(ch: StoredChunk) -> int:
+    """Estimated footprint of a chunk's Python-side data (vector excluded)."""
+    return (
+        _CHUNK_OVERHEAD_BYTES
+        + sys.getsizeof(ch.text)
+        + sys.getsizeof(ch.chunk_id)
+        + sys.getsizeof(ch.heading_breadcrumb)
+        + sys.getsizeof(ch.section_id)
+        + sys.getsizeof(ch.title)
+        + sys.getsizeof(ch.content_hash)
+        + sys.getsizeof(ch.minhash)
+    )
+
+
+def _vector_dim(chunks: List[StoredChunk]) -> int:
+    for ch in chunks:
+        if ch.vector is not None:
+            return int(ch.vector.size)
+    return 0
+
+
+def _section_nbytes(section_id: str, text: str) -> int:
+    return sys.getsizeof(section_id) + sys.getsizeof(text) + 72
+
+
+class MemoryStore(NoteStore):
     """
     Per-session in-memory store. Thread-safe.
     Overwrite semantics per file_path via upsert_file_chunks.
     Maintains both a vector index and a BM25 keyword index.
+
+    Chunks are addressed by row id: the row of the embedding matrix
+    holding their vector.  Row ids are stable while a chunk is stored;
+    rows freed by an overwrite are recycled for later chunks.  Once a
+    chunk's vector is in the matrix, StoredChunk.vector is dropped.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, session_id: str = "") -> None:
+        self.session_id = session_id  # registry key, used to spare it from budget eviction
         self._lock = threading.Lock()
-        self._chunks: List[StoredChunk] = []
-        self._by_path: Dict[str, List[int]] = {}
-        self._bm25 = BM25Index()
-        self._bm25_dirty = True
+        self._matrix = VectorMatrix(dtype=VECTOR_DTYPE, spill_dir=VECTOR_SPILL_DIR)
+        self._rows: List[Optional[StoredChunk]] = []  # row id -> chunk (None if free)
+        self._by_path: Dict[str, List[int]] = {}      # file_path -> row ids
+        self._n_chunks = 0
+        self._bm25 = BM25_ENGINES[BM25_ENGINE]()  # keyed by row id, updated incrementally
+        self._ann: Optional[IVFIndex] = None  # built once the session is large
+        # While a new ANN index trains outside the lock, row changes are
+        # journaled here and replayed into it before it is swapped in
+        self._ann_journal: Optional[List[Tuple[List[int], List[int]]]] = None
+        self._ann_epoch = 0  # bumped by clear(): a build started before is discarded
         self._section_texts: Dict[str, str] = {}  # section_id -> full text
+        self._chunk_bytes = 0    # estimated, see _chunk_nbytes
+        self._section_bytes = 0  # estimated, see _section_nbytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._n_chunks
+
+    def nbytes(self) -> int:
+        """Estimated resident footprint of everything the store holds."""
+        with self._lock:
+            return self._nbytes_unlocked()
+
+    def _nbytes_unlocked(self) -> int:
+        return (
+            self._matrix.nbytes
+            + len(self._rows) * _ROW_SLOT_BYTES
+            + self._chunk_bytes
+            + self._section_bytes
+            + self._bm25.nbytes
+            + (self._ann.nbytes if self._ann is not None else 0)
+        )
+
+    def memory_breakdown(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "vectors": self._matrix.nbytes,
+                "chunks": self._chunk_bytes + len(self._rows) * _ROW_SLOT_BYTES,
+                "sections": self._section_bytes,
+                "bm25": self._bm25.nbytes,
+                "ann": self._ann.nbytes if self._ann is not None else 0,
+                "total": self._nbytes_unlocked(),
+            }
 
     def clear(self) -> None:
         with self._lock:
-            self._chunks = []
+            self._matrix.clear()
+            self._rows = []
             self._by_path = {}
-            self._bm25 = BM25Index()
-            self._bm25_dirty = True
+            self._n_chunks = 0
+            self._bm25 = BM25_ENGINES[BM25_ENGINE]()
+            self._ann = None
+            self._ann_epoch += 1
             self._section_texts = {}
+            self._chunk_bytes = 0
+            self._section_bytes = 0
+
+    def close(self) -> None:
+        # Nothing outlives the process: leaving it means freeing the memory
+        self.clear()
 
     def upsert_file_chunks(
         self,
         file_path: str,
         chunks: List[StoredChunk],
         section_texts: Optional[Dict[str, str]] = None,
-    ) -> None:
+    ) -> Dict[str, int]:
         """
-        Overwrite semantics: remove old chunks for file_path, then add new ones.
+        Overwrite semantics: replace the chunks stored for file_path.
         Optionally store section texts for parent expansion.
+
+        Old and new chunks are diffed by content hash: a new chunk whose
+        text matches an old one takes over its row, keeping the stored
+        vector and BM25 postings.  Only unmatched old rows are freed and
+        only unmatched new chunks are written.
+
+        Returns {"reused": n, "added": n, "removed": n}.
+        Raises SessionMemoryLimitError (storing nothing) if the result would
+        grow the session past SESSION_MAX_BYTES.
         """
+        for ch in chunks:
+            if not ch.content_hash:
+                ch.content_hash = content_hash(ch.text)
+            if not ch.minhash:
+                ch.minhash = minhash_signature(ch.text)
+        new_bytes = sum(_chunk_nbytes(ch) for ch in chunks)
+        new_section_bytes = sum(_section_nbytes(k, v) for k, v in (section_texts or {}).items())
+
         with self._lock:
-            old_idxs = set(self._by_path.get(file_path, []))
-            if old_idxs:
-                # Remove old section texts for this file
-                old_section_ids = {
-                    self._chunks[i].section_id
-                    for i in old_idxs
-                    if self._chunks[i].section_id
-                }
-                for sid in old_section_ids:
-                    self._section_texts.pop(sid, None)
+            old_rows = self._by_path.get(file_path, [])
+            old_section_ids = {
+                self._rows[r].section_id
+                for r in old_rows
+                if self._rows[r] is not None and self._rows[r].section_id
+            }
+
+            old_bytes = sum(_chunk_nbytes(self._rows[r]) for r in old_rows)
+
+            if SESSION_MAX_BYTES:
+                old_section_bytes = sum(
+                    _section_nbytes(sid, self._section_texts[sid])
+                    for sid in old_section_ids
+                    if sid in self._section_texts
+                )
+                old_text = sum(len(self._rows[r].text) for r in old_rows)
+                new_text = sum(len(ch.text) for ch in chunks)
+                projected = (
+                    self._nbytes_unlocked()
+                    + (len(chunks) - len(old_rows)) * self._matrix.row_nbytes(_vector_dim(chunks))
+                    + new_bytes - old_bytes
+                    + new_section_bytes - old_section_bytes
+                    + (new_text - old_text) * _BM25_BYTES_PER_CHAR
+                )
+                if projected > SESSION_MAX_BYTES and projected > self._nbytes_unlocked():
+                    raise SessionMemoryLimitError(
+                        f"session would use ~{projected} bytes (limit {SESSION_MAX_BYTES})"
+                    )
+
+            self._by_path.pop(file_path, None)
+
+            # Remove old section texts for this file
+            for sid in old_section_ids:
+                text = self._section_texts.pop(sid, None)
+                if text is not None:
+                    self._section_bytes -= _section_nbytes(sid, text)
+
+            reusable: Dict[str, List[int]] = {}
+            for r in old_rows:
+                reusable.setdefault(self._rows[r].content_hash, []).append(r)
+
+            # Match new chunks to old rows with identical text
+            new_rows: List[int] = []
+            unmatched: List[int] = []
+            for i, ch in enumerate(chunks):
+                candidates = reusable.get(ch.content_hash)
+                if candidates:
+                    row = candidates.pop()
+                    ch.vector = None
+                    self._rows[row] = ch
+                    new_rows.append(row)
+                else:
+                    new_rows.append(-1)
+                    unmatched.append(i)
+
+            # Free leftover old rows first so new chunks can recycle them
+            freed: List[int] = []
+            for rows in reusable.values():
+                for r in rows:
+                    self._matrix.remove(r)
+                    self._bm25.remove(r)
+                    self._rows[r] = None
+                    freed.append(r)
+
+            for i in unmatched:
+                ch = chunks[i]
+                row = self._matrix.add(ch.vector)
+                ch.vector = None  # the matrix holds it now
+                if row == len(self._rows):
+                    self._rows.append(ch)
+                else:
+                    self._rows[row] = ch
+                self._bm25.add(row, ch.text)
+                new_rows[i] = row
+            added = len(unmatched)
+
+            if new_rows:
+                self._by_path[file_path] = new_rows
+            self._n_chunks += len(new_rows) - len(old_rows)
+            self._chunk_bytes += new_bytes - old_bytes
+
+            rebuild_ann = self._update_ann_unlocked(freed, [new_rows[i] for i in unmatched])
+
+            for sid, text in (section_texts or {}).items():
+                prev = self._section_texts.get(sid)
+                if prev is not None:
+                    self._section_bytes -= _section_nbytes(sid, prev)
+                self._section_texts[sid] = text
+                self._section_bytes += _section_nbytes(sid, text)
+
+        if rebuild_ann:
+            self._build_ann()
+        if MEMORY_BUDGET_BYTES and added:
+            enforce_memory_budget(keep=self.session_id)
+
+        return {"reused": len(new_rows) - added, "added": added, "removed": len(freed)}
+
+    def file_vectors(self, file_path: str) -> Dict[str, np.ndarray]:
+        """
+        content_hash -> stored vector for the chunks currently held for
+        file_path. Lets re-ingest skip embedding unchanged chunks.
+        """
+        with self._lock:
+            result: Dict[str, np.ndarray] = {}
+            for r in self._by_path.get(file_path, []):
+                ch = self._rows[r]
+                if ch is not None and ch.content_hash not in result:
+                    result[ch.content_hash] = self._matrix.get(r)
+            return result
 
-                self._chunks = [c for i, c in enumerate(self._chunks) if i not in old_idxs]
-                self._rebuild_index_unlocked()
+    def all_chunks(self) -> List[StoredChunk]:
+        with self._lock:
+            return [ch for ch in self._rows if ch is not None]
 
-            start = len(self._chunks)
-            self._chunks.extend(chunks)
-            self._by_path[file_path] = list(range(start, start + len(chunks)))
-            self._bm25_dirty = True
+    def get_chunks(self, rows: List[int]) -> Dict[int, StoredChunk]:
+        """
+        Resolve row ids (as returned by dense_search / bm25_search) to chunks.
+        Rows that have since been freed are omitted.
+        """
+        with self._lock:
+            result: Dict[int, StoredChunk] = {}
+            for r in rows:
+                if 0 <= r < len(self._rows) and self._rows[r] is not None:
+                    result[r] = self._rows[r]
+            return result
+
+    def dense_search(
+        self, q_vec: np.ndarray, min_score: float = -np.inf, exact: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score stored chunks against q_vec. Returns (row_ids, scores) sorted
+        by descending score, keeping only scores >= min_score.
 
-            if section_texts:
-                self._section_texts.update(section_texts)
+        Small sessions (and exact=True) get a single matmul over the whole
+        matrix. Once the session has an ANN index, only the rows in the
+        query's nearest IVF clusters are scored.
+
+        With a quantized matrix the scan is approximate; the top
+        VECTOR_RESCORE_K hits are rescored at full precision and re-sorted.
+        """
+        quantized = self._matrix.quantized
+        cutoff = min_score - _RESCORE_MARGIN if quantized else min_score
+        with self._lock:
+            if self._ann is not None and not exact:
+                rows = self._ann.candidates(q_vec)
+                scores = self._matrix.scores_for(rows.tolist(), q_vec)
+            else:
+                scores = self._matrix.scores(q_vec)
+                if scores.size == 0:
+                    return np.zeros(0, dtype=np.int64), scores
+                free = self._matrix.free_rows
+                if free:
+                    scores[free] = -np.inf
+                rows = None
+
+            keep = np.where(scores >= cutoff)[0]
+            keep = keep[np.argsort(scores[keep])[::-1]]
+            rows = keep if rows is None else rows[keep]
+            scores = scores[keep]
+
+            if quantized and rows.size:
+                head = rows[:VECTOR_RESCORE_K]
+                exact_scores = self._matrix.exact_scores_for(head.tolist(), q_vec)
+                order = np.argsort(exact_scores)[::-1]
+                rows = np.concatenate([head[order], rows[VECTOR_RESCORE_K:]])
+                scores = np.concatenate([exact_scores[order], scores[VECTOR_RESCORE_K:]])
+
+        if quantized:
+            keep = scores >= min_score
+            rows, scores = rows[keep], scores[keep]
+        return rows, scores
+
+    def score_rows(self, q_vec: np.ndarray, rows: List[int]) -> np.ndarray:
+        """Full-precision dense scores for specific rows only (0.0 for unknown rows)."""
+        with self._lock:
+            return self._matrix.exact_scores_for(rows, q_vec)
+
+    def _update_ann_unlocked(self, freed: List[int], added: List[int]) -> bool:
+        """
+        Keep the ANN index in step with the matrix: update it in place,
+        drop it when the session shrinks well below ANN_MIN_ROWS.  Returns
+        True when a (re)build is due (the session crossed ANN_MIN_ROWS or
+        has doubled since training); the caller runs _build_ann once it
+        has released the lock.
+        """
+        if ANN_INDEX == "none":
+            return False
+        if self._ann_journal is not None:
+            self._ann_journal.append((freed, added))
+        if self._ann is None:
+            return self._n_chunks >= ANN_MIN_ROWS and self._ann_journal is None
+        if self._n_chunks < ANN_MIN_ROWS // 2:
+            self._ann = None
+            return False
+        # The current index keeps serving (and being updated) until its
+        # replacement is ready
+        for r in freed:
+            self._ann.remove(r)
+        if added:
+            self._ann.add_many(np.asarray(added), self._matrix.vectors(added))
+        return self._n_chunks > 2 * self._ann.trained_size and self._ann_journal is None
+
+    def _build_ann(self) -> None:
+        """
+        Train a new ANN index on a copy of the live vectors without holding
+        the lock (k-means takes seconds on large sessions), then replay the
+        changes made meanwhile and swap it in.
+        """
+        with self._lock:
+            if self._ann_journal is not None:
+                return  # another request is already building one
+            live = [r for r, ch in enumerate(self._rows) if ch is not None]
+            vectors = self._matrix.vectors(live)
+            epoch = self._ann_epoch
+            self._ann_journal = []
+
+        ann = IVFIndex(nlist=ANN_NLIST, nprobe=ANN_NPROBE)
+        try:
+            ann.build(np.asarray(live), vectors)
+        except Exception:
+            with self._lock:
+                self._ann_journal = None
+            raise
+        del vectors
 
-    def all_chunks(self) -> List[StoredChunk]:
         with self._lock:
-            return list(self._chunks)
+            journal, self._ann_journal = self._ann_journal, None
+            if epoch != self._ann_epoch or self._n_chunks < ANN_MIN_ROWS // 2:
+                return
+            for freed, added in journal:
+                for r in freed:
+                    ann.remove(r)
+                if added:
+                    ann.add_many(np.asarray(added), self._matrix.vectors(added))
+            self._ann = ann
 
     def get_neighbors(self, file_path: str, chunk_index: int, window: int = 1) -> List[StoredChunk]:
         """
@@ -91,10 +448,12 @@ class MemoryStore:
         Excludes the chunk at chunk_index itself.
         """
         with self._lock:
-            idxs = self._by_path.get(file_path, [])
+            rows = self._by_path.get(file_path, [])
             neighbors: List[StoredChunk] = []
-            for i in idxs:
-                ch = self._chunks[i]
+            for r in rows:
+                ch = self._rows[r]
+                if ch is None:
+                    continue
                 if ch.chunk_index != chunk_index and abs(ch.chunk_index - chunk_index) <= window:
                     neighbors.append(ch)
             neighbors.sort(key=lambda c: c.chunk_index)
@@ -106,25 +465,74 @@ class MemoryStore:
 
     def bm25_search(self, query: str, top_k: int = 0) -> List[Tuple[int, float]]:
         """
-        Keyword search using BM25. Returns (chunk_list_index, score) pairs.
-        Rebuilds the BM25 index lazily if chunks have changed.
+        Keyword search using BM25. Returns (row_id, score) pairs.
+        The index is maintained incrementally by upsert_file_chunks.
         """
         with self._lock:
-            if self._bm25_dirty:
-                texts = [ch.text for ch in self._chunks]
-                self._bm25.index(texts)
-                self._bm25_dirty = False
             return self._bm25.search(query, top_k=top_k)
 
-    def stats(self) -> dict:
+    def save_snapshot(self) -> None:
+        """
+        Write this store to the snapshot dir (blocking).  The lock is held
+        while the matrix streams to disk so vectors and metadata match.
+        """
         with self._lock:
-            return {"files": len(self._by_path), "chunks": len(self._chunks)}
+            meta = {
+                "fields": _SNAPSHOT_FIELDS,
+                "rows": [
+                    None if ch is None else [getattr(ch, f) for f in _SNAPSHOT_FIELDS]
+                    for ch in self._rows
+                ],
+                "by_path": self._by_path,
+                "sections": self._section_texts,
+            }
+            snapshot.write_snapshot(
+                self.session_id, self._matrix.size, self._matrix.dim, self._matrix.copy_into, meta
+            )
+
+    @classmethod
+    def from_snapshot(cls, session_id: str, vectors: np.ndarray, meta: Dict[str, Any]) -> "MemoryStore":
+        """Rebuild a store from snapshot data; vectors may be a memory map."""
+        store = cls(session_id)
+        known = set(_SNAPSHOT_FIELDS)
+        names = meta["fields"]
+        free: List[int] = []
+        for row, values in enumerate(meta["rows"]):
+            if values is None:
+                store._rows.append(None)
+                free.append(row)
+                continue
+            ch = StoredChunk(vector=None, **{k: v for k, v in zip(names, values) if k in known})
+            ch.minhash = minhash_signature(ch.text)
+            store._rows.append(ch)
+            store._bm25.add(row, ch.text)
+            store._chunk_bytes += _chunk_nbytes(ch)
+
+        store._matrix = VectorMatrix.from_array(
+            vectors, free, dtype=VECTOR_DTYPE, spill_dir=VECTOR_SPILL_DIR
+        )
+        store._by_path = {path: list(rows) for path, rows in meta["by_path"].items()}
+        store._n_chunks = sum(len(rows) for rows in store._by_path.values())
+        for sid, text in meta["sections"].items():
+            store._section_texts[sid] = text
+            store._section_bytes += _section_nbytes(sid, text)
+        if store._update_ann_unlocked([], []):
+            store._build_ann()
+        return store
 
-    def _rebuild_index_unlocked(self) -> None:
-        self._by_path = {}
-        for idx, ch in enumerate(self._chunks):
-            self._by_path.setdefault(ch.file_path, []).append(idx)
-        self._bm25_dirty = True
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "files": len(self._by_path),
+                "chunks": self._n_chunks,
+                "matrix_rows": self._matrix.size,
+                "matrix_capacity": self._matrix.capacity,
+                "vector_dtype": self._matrix.dtype,
+                "vector_bytes": self._matrix.nbytes,
+                "vector_spill_bytes": self._matrix.spill_nbytes,
+                "bytes": self._nbytes_unlocked(),
+                "ann": self._ann.stats() if self._ann is not None else None,
+            }
 
 
 # ---------------------------
@@ -132,30 +540,110 @@ class MemoryStore:
 # ---------------------------
 
 _STORES_LOCK = threading.Lock()
-STORES: Dict[str, MemoryStore] = {}
+STORES: Dict[str, NoteStore] = {}
 
 # session metadata for eviction / monitoring
 SESSION_LAST_SEEN: Dict[str, float] = {}
 SESSION_CREATED_AT: Dict[str, float] = {}
+_EVICTED_FOR_MEMORY = 0
+
+# Stores evicted for memory that requests may still be using, until they
+# are reloaded or the last reference goes: their late writes still reach
+# the session's snapshot
+_EVICTED_STORES: "weakref.WeakValueDictionary[str, NoteStore]" = weakref.WeakValueDictionary()
 
 
-def get_store(session_id: str) -> MemoryStore:
+def get_store(session_id: str) -> NoteStore:
     """
-    Get or create the MemoryStore for a given session_id.
+    Get or create the store for a given session_id, using the configured
+    backend (SMARTNOTE_STORE_BACKEND).
     """
     sid = (session_id or "").strip()
     if not sid:
         raise ValueError("session_id is required")
 
+    with _STORES_LOCK:
+        store = STORES.get(sid)
+        if store is not None:
+            SESSION_LAST_SEEN[sid] = time.time()
+    if store is not None:
+        store.touch()
+        return store
+
+    # An evicted store that requests still hold is taken back as it stands.
+    # Otherwise open outside the lock: restoring a snapshot takes time.
+    with _STORES_LOCK:
+        revived = _EVICTED_STORES.get(sid)
+    loaded = revived if revived is not None else _open_store(sid)
+
     now = time.time()
+    created = False
     with _STORES_LOCK:
         store = STORES.get(sid)
         if store is None:
-            store = MemoryStore()
+            store = loaded
             STORES[sid] = store
             SESSION_CREATED_AT[sid] = now
+            _EVICTED_STORES.pop(sid, None)
+            created = True
         SESSION_LAST_SEEN[sid] = now
-        return store
+    if not created and revived is None:
+        loaded.close()  # lost a race with another request for this session
+
+    if created and MEMORY_BUDGET_BYTES:
+        enforce_memory_budget(keep=sid)
+    return store
+
+
+def _open_store(sid: str) -> NoteStore:
+    if STORE_BACKEND == "sqlite":
+        # Imported lazily: sqlite-vec is only needed for this backend
+        from .sqlite_store import SqliteStore
+
+        return SqliteStore(sid)
+    restored = _load_snapshot(sid) if snapshot.enabled() else None
+    return restored or MemoryStore(sid)
+
+
+def _load_snapshot(sid: str) -> Optional[MemoryStore]:
+    start = time.perf_counter()
+    try:
+        data = snapshot.read_snapshot(sid)
+        if data is None:
+            return None
+        store = MemoryStore.from_snapshot(sid, *data)
+    except Exception as exc:
+        logger.warning("Could not restore session snapshot: %s", exc)
+        return None
+    logger.info(
+        "Restored session snapshot: %d chunks in %.0f ms",
+        len(store), (time.perf_counter() - start) * 1000,
+    )
+    return store
+
+
+def schedule_snapshot(store: NoteStore) -> None:
+    """Queue a background snapshot of store (no-op when snapshots are off)."""
+    if snapshot.enabled() and isinstance(store, MemoryStore) and store.session_id:
+        snapshot.snapshot_writer.schedule(store.session_id, lambda: _save_if_current(store))
+
+
+def _save_if_current(store: MemoryStore) -> None:
+    # A store deleted, expired or replaced since scheduling must not
+    # overwrite the session's snapshot; one evicted for memory still may
+    sid = store.session_id
+    with _STORES_LOCK:
+        current = STORES.get(sid) is store or (
+            sid not in STORES and _EVICTED_STORES.get(sid) is store
+        )
+    if current:
+        store.save_snapshot()
+
+
+def _drop_snapshot(sid: str) -> None:
+    if snapshot.enabled():
+        snapshot.snapshot_writer.cancel(sid)
+        snapshot.delete_snapshot(sid)
 
 
 def touch_session(session_id: str) -> None:
@@ -173,6 +661,7 @@ def clear_session(session_id: str) -> None:
     """
     store = get_store(session_id)
     store.clear()
+    _drop_snapshot(store.session_id)
     touch_session(session_id)
 
 
@@ -184,9 +673,13 @@ def delete_session(session_id: str) -> None:
     if not sid:
         return
     with _STORES_LOCK:
-        STORES.pop(sid, None)
+        store = STORES.pop(sid, None)
         SESSION_LAST_SEEN.pop(sid, None)
         SESSION_CREATED_AT.pop(sid, None)
+        _EVICTED_STORES.pop(sid, None)
+    if store is not None:
+        store.close()
+    _drop_snapshot(sid)
 
 
 def evict_expired(ttl_seconds: int) -> int:
@@ -198,6 +691,7 @@ def evict_expired(ttl_seconds: int) -> int:
 
     now = time.time()
     to_evict: List[str] = []
+    expired: List[NoteStore] = []
 
     with _STORES_LOCK:
         for sid, last in SESSION_LAST_SEEN.items():
@@ -205,16 +699,74 @@ def evict_expired(ttl_seconds: int) -> int:
                 to_evict.append(sid)
 
         for sid in to_evict:
-            STORES.pop(sid, None)
+            store = STORES.pop(sid, None)
+            if store is not None:
+                expired.append(store)
             SESSION_LAST_SEEN.pop(sid, None)
             SESSION_CREATED_AT.pop(sid, None)
+            _EVICTED_STORES.pop(sid, None)
+
+    # Expired sessions are gone for good, on disk too
+    for store in expired:
+        store.expire(ttl_seconds)
+    for sid in to_evict:
+        _drop_snapshot(sid)
 
     return len(to_evict)
 
 
+def enforce_memory_budget(keep: str = "") -> int:
+    """
+    Evict least-recently-used sessions until the estimated total footprint
+    fits MEMORY_BUDGET_BYTES. The session `keep` (the one currently being
+    written) is never evicted. Returns evicted count.
+    """
+    global _EVICTED_FOR_MEMORY
+    if MEMORY_BUDGET_BYTES <= 0:
+        return 0
+
+    evicted: List[NoteStore] = []
+    with _STORES_LOCK:
+        sizes = {sid: store.nbytes() for sid, store in STORES.items()}
+        total = sum(sizes.values())
+        if total <= MEMORY_BUDGET_BYTES:
+            return 0
+
+        for sid in sorted(STORES, key=lambda s: SESSION_LAST_SEEN.get(s, 0.0)):
+            if total <= MEMORY_BUDGET_BYTES:
+                break
+            if sid == keep:
+                continue
+            store = STORES.pop(sid)
+            evicted.append(store)
+            _EVICTED_STORES[sid] = store
+            SESSION_LAST_SEEN.pop(sid, None)
+            SESSION_CREATED_AT.pop(sid, None)
+            total -= sizes[sid]
+        _EVICTED_FOR_MEMORY += len(evicted)
+
+    # Only the registry lets go here: requests still holding a store keep
+    # using it intact, and its memory is freed when the last one finishes.
+    # With snapshots on, the session stays on disk and reloads on next access.
+    for store in evicted:
+        if isinstance(store, MemoryStore) and snapshot.snapshot_writer.cancel(store.session_id):
+            snapshot.snapshot_writer.run_now(store.session_id, store.save_snapshot)
+    if evicted:
+        logger.warning(
+            "Memory budget exceeded: evicted %d session(s), ~%d bytes in use (budget %d)",
+            len(evicted), total, MEMORY_BUDGET_BYTES,
+        )
+    return len(evicted)
+
+
 def stats_all() -> dict:
     with _STORES_LOCK:
         return {
             "sessions": len(STORES),
+            "backend": STORE_BACKEND,
             "last_seen_count": len(SESSION_LAST_SEEN),
+            "bytes": sum(store.nbytes() for store in STORES.values()),
+            "memory_budget_bytes": MEMORY_BUDGET_BYTES,
+            "session_max_bytes": SESSION_MAX_BYTES,
+            "evicted_for_memory": _EVICTED_FOR_MEMORY,
         }
\ No newline at end of file
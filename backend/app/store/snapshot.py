@@ -0,0 +1,210 @@
+"""
+On-disk session snapshots, so sessions survive instance restarts.
+
+Each session is written under SNAPSHOT_DIR/<hash of session id>/ as:
+  - vectors-<gen>.npy  float32 embedding matrix, row-aligned with the
+                       store (freed rows are zero); memory-mapped on load
+  - meta.zst           zstd-compressed JSON: chunk + section metadata and
+                       the name of the vectors file it belongs to
+
+meta.zst is replaced atomically after its vectors file is fully written,
+so a reader always sees a consistent pair.  Writes happen on a single
+background thread and are coalesced per session.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import zstandard
+
+from ..utils.cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+# Empty = snapshots disabled
+SNAPSHOT_DIR = os.getenv("SMARTNOTE_SNAPSHOT_DIR", "").strip()
+# Writes for a session are deferred this long so a burst of ingests is saved once
+SNAPSHOT_DELAY_SECONDS = float(os.getenv("SMARTNOTE_SNAPSHOT_DELAY_SECONDS", "2"))
+
+_FORMAT_VERSION = 1
+_META_NAME = "meta.zst"
+
+
+def enabled() -> bool:
+    return bool(SNAPSHOT_DIR)
+
+
+def _session_dir(session_id: str) -> str:
+    # Session ids come from clients: never use them as path components
+    return os.path.join(SNAPSHOT_DIR, content_hash(session_id))
+
+
+def write_snapshot(
+    session_id: str,
+    n_rows: int,
+    dim: int,
+    fill_vectors: Callable[[np.ndarray], None],
+    meta: Dict[str, Any],
+) -> None:
+    """
+    Write one session's snapshot (blocking).  fill_vectors receives a
+    writable (n_rows, dim) float32 array backed by the new .npy file, so
+    the matrix is streamed to disk without an in-memory copy.
+    Empty stores delete the snapshot instead.
+    """
+    if not n_rows or not meta.get("by_path"):
+        delete_snapshot(session_id)
+        return
+
+    sdir = _session_dir(session_id)
+    os.makedirs(sdir, exist_ok=True)
+
+    vec_name = f"vectors-{time.time_ns():x}.npy"
+    out = np.lib.format.open_memmap(
+        os.path.join(sdir, vec_name), mode="w+", dtype=np.float32, shape=(n_rows, dim)
+    )
+    fill_vectors(out)
+    out.flush()
+    del out
+
+    payload = {"version": _FORMAT_VERSION, "session_id": session_id, "vectors": vec_name, **meta}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    tmp = os.path.join(sdir, f"{_META_NAME}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(zstandard.ZstdCompressor(level=3).compress(raw))
+    os.replace(tmp, os.path.join(sdir, _META_NAME))
+
+    # Older vector files are unreferenced now (a live mmap keeps its pages)
+    for name in os.listdir(sdir):
+        if name.startswith("vectors-") and name != vec_name:
+            try:
+                os.remove(os.path.join(sdir, name))
+            except OSError:
+                pass
+
+
+def read_snapshot(session_id: str) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+    """(vectors, meta) for a session, or None if it has no usable snapshot."""
+    sdir = _session_dir(session_id)
+    try:
+        with open(os.path.join(sdir, _META_NAME), "rb") as f:
+            raw = zstandard.ZstdDecompressor().decompress(f.read())
+    except FileNotFoundError:
+        return None
+
+    meta = json.loads(raw)
+    if meta.get("version") != _FORMAT_VERSION or meta.get("session_id") != session_id:
+        logger.warning("Ignoring incompatible snapshot in %s", sdir)
+        return None
+    # Copy-on-write: untouched rows stay file-backed, writes stay private
+    vectors = np.load(os.path.join(sdir, meta["vectors"]), mmap_mode="c")
+    return vectors, meta
+
+
+def delete_snapshot(session_id: str) -> None:
+    sdir = _session_dir(session_id)
+    try:
+        names = os.listdir(sdir)
+    except FileNotFoundError:
+        return
+    for name in names:
+        try:
+            os.remove(os.path.join(sdir, name))
+        except OSError:
+            pass
+    try:
+        os.rmdir(sdir)
+    except OSError:
+        pass
+
+
+class SnapshotWriter:
+    """
+    Single background thread that runs snapshot jobs.  Scheduling a session
+    that already has a pending job replaces it, so only the latest state
+    is written.
+    """
+
+    def __init__(self, delay_seconds: float) -> None:
+        self.delay = max(0.0, delay_seconds)
+        self._cond = threading.Condition()
+        self._pending: Dict[str, Tuple[float, Callable[[], None]]] = {}  # key -> (due, job)
+        self._worker: Optional[threading.Thread] = None
+        self._written = 0
+        self._failed = 0
+        self._last_ms = 0.0
+
+    def schedule(self, key: str, job: Callable[[], None]) -> None:
+        with self._cond:
+            due = self._pending[key][0] if key in self._pending else time.monotonic() + self.delay
+            self._pending[key] = (due, job)
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="smartnote-snapshot", daemon=True
+                )
+                self._worker.start()
+            self._cond.notify()
+
+    def cancel(self, key: str) -> bool:
+        """Drop key's pending job. Returns whether one was pending."""
+        with self._cond:
+            return self._pending.pop(key, None) is not None
+
+    def run_now(self, key: str, job: Callable[[], None]) -> None:
+        """Run job on the calling thread, with the writer's error handling and stats."""
+        self._execute(key, job)
+
+    def flush(self) -> None:
+        """Run every pending job now, on the calling thread."""
+        with self._cond:
+            jobs = list(self._pending.items())
+            self._pending.clear()
+        for key, (_due, job) in jobs:
+            self._execute(key, job)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "enabled": enabled(),
+                "pending": len(self._pending),
+                "written": self._written,
+                "failed": self._failed,
+                "last_write_ms": round(self._last_ms, 1),
+            }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    ready = [k for k, (due, _job) in self._pending.items() if due <= now]
+                    if ready:
+                        break
+                    next_due = min((due for due, _job in self._pending.values()), default=None)
+                    self._cond.wait(None if next_due is None else next_due - now)
+                jobs = [(k, self._pending.pop(k)[1]) for k in ready]
+            for key, job in jobs:
+                self._execute(key, job)
+
+    def _execute(self, key: str, job: Callable[[], None]) -> None:
+        start = time.perf_counter()
+        try:
+            job()
+        except Exception as exc:
+            logger.warning("Snapshot of session %s failed: %s", key, exc)
+            with self._cond:
+                self._failed += 1
+            return
+        with self._cond:
+            self._written += 1
+            self._last_ms = (time.perf_counter() - start) * 1000
+
+
+snapshot_writer = SnapshotWriter(SNAPSHOT_DELAY_SECONDS)
@@ -0,0 +1,423 @@
+"""
+SQLite-backed session store (SMARTNOTE_STORE_BACKEND=sqlite).
+
+Each session lives in its own database file under SQLITE_DIR:
+  - chunks      chunk metadata and text; the INTEGER PRIMARY KEY is the row id
+  - sections    parent-section texts, keyed by section_id
+  - chunks_vec  sqlite-vec vec0 table (cosine distance) with the embeddings
+  - chunks_fts  FTS5 index over chunks.text, queried with its bm25() ranking
+
+Data lives on disk rather than in process memory, so an instance can hold
+more sessions than RAM allows, and uvicorn workers on the same host share
+a session through its file (WAL mode; writers take an IMMEDIATE lock).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import sqlite_vec
+
+from ..utils.bm25 import tokenize
+from ..utils.cache import content_hash
+from ..utils.minhash import minhash_signature
+from .base import NoteStore, StoredChunk
+
+logger = logging.getLogger(__name__)
+
+SQLITE_DIR = os.getenv("SMARTNOTE_SQLITE_DIR", "data/sessions")
+# Dense hits fetched per query (sqlite-vec caps KNN queries at k=4096)
+SQLITE_KNN_K = min(4096, int(os.getenv("SMARTNOTE_SQLITE_KNN_K", "1000")))
+
+_BUSY_TIMEOUT_SECONDS = 30.0
+_TOUCH_INTERVAL_SECONDS = 30.0
+_MAX_PARAMS = 500  # ids per "IN (...)" query
+
+_CHUNK_COLUMNS = (
+    "chunk_id",
+    "file_path",
+    "text",
+    "chunk_index",
+    "total_chunks",
+    "heading_breadcrumb",
+    "section_id",
+    "doc_type",
+    "title",
+    "mtime",
+    "content_hash",
+    "minhash",
+)
+_SELECT_CHUNK = f"SELECT row, {', '.join(_CHUNK_COLUMNS)} FROM chunks"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    text TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    total_chunks INTEGER NOT NULL,
+    heading_breadcrumb TEXT NOT NULL,
+    section_id TEXT NOT NULL,
+    doc_type TEXT NOT NULL,
+    title TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    content_hash TEXT NOT NULL,
+    minhash BLOB NOT NULL DEFAULT x''
+);
+CREATE INDEX IF NOT EXISTS chunks_by_path ON chunks (file_path, chunk_index);
+CREATE TABLE IF NOT EXISTS sections (
+    section_id TEXT PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sections_by_path ON sections (file_path);
+-- Tokenized like utils.bm25.tokenize (lowercased \w+ runs): diacritics are
+-- kept (café != cafe) and "_" is part of a word (x_y is one token)
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    text, content='chunks', content_rowid='row',
+    tokenize="unicode61 remove_diacritics 0 tokenchars '_'"
+);
+"""
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Bring a database created by an older version up to _SCHEMA."""
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(chunks)")}
+    if "minhash" not in columns:
+        # Rows keep an empty signature; search computes it from the text
+        conn.execute("ALTER TABLE chunks ADD COLUMN minhash BLOB NOT NULL DEFAULT x''")
+    fts_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'chunks_fts'").fetchone()[0]
+    if "tokenchars" not in fts_sql:
+        # Built with the default tokenizer: reindex the text with the current one
+        conn.execute("DROP TABLE chunks_fts")
+        conn.executescript(_SCHEMA)
+        conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+
+
+def _chunk_from_row(row: tuple) -> StoredChunk:
+    return StoredChunk(vector=None, **dict(zip(_CHUNK_COLUMNS, row[1:])))
+
+
+def _blob(vec: np.ndarray) -> bytes:
+    return np.asarray(vec, dtype=np.float32).ravel().tobytes()
+
+
+class SqliteStore(NoteStore):
+    """
+    Per-session store on SQLite + sqlite-vec + FTS5. Thread-safe: one
+    connection per store, serialized by a lock; other processes are
+    coordinated by SQLite's own locking.
+    """
+
+    def __init__(self, session_id: str, directory: str = "") -> None:
+        self.session_id = session_id
+        directory = directory or SQLITE_DIR
+        os.makedirs(directory, exist_ok=True)
+        # Session ids come from clients: never use them as path components
+        self.path = os.path.join(directory, f"{content_hash(session_id)}.db")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._dim = 0
+        self._last_touch = 0.0
+
+    # -- connection --------------------------------------------------------
+
+    def _db(self) -> sqlite3.Connection:
+        """The open connection (reopened if the store was closed). Call with the lock held."""
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=_BUSY_TIMEOUT_SECONDS,
+                isolation_level=None,  # explicit transactions only
+                check_same_thread=False,
+            )
+            conn.enable_load_extension(True)
+            sqlite_vec.load(conn)
+            conn.enable_load_extension(False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            self._conn = conn
+        if not self._dim:
+            # Another process may have created the vector table since we looked
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+            self._dim = int(row[0]) if row else 0
+        return self._conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            self._dim = 0  # may have been set by a rolled-back table creation; re-read
+            raise
+        conn.execute("COMMIT")
+
+    def _ensure_vec_table(self, conn: sqlite3.Connection, dim: int) -> None:
+        if self._dim:
+            if dim != self._dim:
+                raise ValueError(f"Vector dimension {dim} does not match store dimension {self._dim}")
+            return
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS chunks_vec "
+            f"USING vec0(embedding float[{dim}] distance_metric=cosine)"
+        )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(dim),))
+        self._dim = dim
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def expire(self, ttl_seconds: int) -> None:
+        self.close()
+        # Other workers touch the file on access; only delete it if none has
+        try:
+            idle = time.time() - os.path.getmtime(self.path)
+        except OSError:
+            return
+        if idle > ttl_seconds:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except OSError:
+                    pass
+
+    def touch(self) -> None:
+        now = time.time()
+        if now - self._last_touch < _TOUCH_INTERVAL_SECONDS:
+            return
+        self._last_touch = now
+        try:
+            os.utime(self.path)
+        except OSError:
+            pass
+
+    # -- NoteStore ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._db().execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
+
+    def clear(self) -> None:
+        with self._lock, self._write() as conn:
+            conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('delete-all')")
+            conn.execute("DELETE FROM chunks")
+            conn.execute("DELETE FROM sections")
+            if self._dim:
+                conn.execute("DELETE FROM chunks_vec")
+
+    def upsert_file_chunks(
+        self,
+        file_path: str,
+        chunks: List[StoredChunk],
+        section_texts: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, int]:
+        """
+        Same semantics as MemoryStore.upsert_file_chunks, in one transaction:
+        chunks whose text is unchanged keep their row, vector and FTS entry.
+        """
+        for ch in chunks:
+            if not ch.content_hash:
+                ch.content_hash = content_hash(ch.text)
+            if not ch.minhash:
+                ch.minhash = minhash_signature(ch.text)
+
+        with self._lock, self._write() as conn:
+            reusable: Dict[str, List[Tuple[int, str]]] = {}
+            for row, h, text in conn.execute(
+                "SELECT row, content_hash, text FROM chunks WHERE file_path = ?", (file_path,)
+            ):
+                reusable.setdefault(h, []).append((row, text))
+
+            conn.execute("DELETE FROM sections WHERE file_path = ?", (file_path,))
+
+            unmatched: List[StoredChunk] = []
+            reused = 0
+            for ch in chunks:
+                candidates = reusable.get(ch.content_hash)
+                if candidates:
+                    row, _text = candidates.pop()
+                    conn.execute(
+                        f"UPDATE chunks SET {', '.join(f'{c} = ?' for c in _CHUNK_COLUMNS)} WHERE row = ?",
+                        (*(getattr(ch, c) for c in _CHUNK_COLUMNS), row),
+                    )
+                    ch.vector = None
+                    reused += 1
+                else:
+                    unmatched.append(ch)
+
+            removed = 0
+            for rows in reusable.values():
+                for row, text in rows:
+                    conn.execute(
+                        "INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', ?, ?)",
+                        (row, text),
+                    )
+                    if self._dim:
+                        conn.execute("DELETE FROM chunks_vec WHERE rowid = ?", (row,))
+                    conn.execute("DELETE FROM chunks WHERE row = ?", (row,))
+                    removed += 1
+
+            for ch in unmatched:
+                assert ch.vector is not None
+                self._ensure_vec_table(conn, int(ch.vector.size))
+                cur = conn.execute(
+                    f"INSERT INTO chunks ({', '.join(_CHUNK_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_CHUNK_COLUMNS))})",
+                    tuple(getattr(ch, c) for c in _CHUNK_COLUMNS),
+                )
+                row = cur.lastrowid
+                conn.execute("INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)", (row, ch.text))
+                conn.execute(
+                    "INSERT INTO chunks_vec (rowid, embedding) VALUES (?, ?)", (row, _blob(ch.vector))
+                )
+                ch.vector = None
+
+            if section_texts:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sections (section_id, file_path, text) VALUES (?, ?, ?)",
+                    [(sid, file_path, text) for sid, text in section_texts.items()],
+                )
+
+        return {"reused": reused, "added": len(unmatched), "removed": removed}
+
+    def file_vectors(self, file_path: str) -> Dict[str, np.ndarray]:
+        with self._lock:
+            conn = self._db()
+            rows = conn.execute(
+                "SELECT row, content_hash FROM chunks WHERE file_path = ?", (file_path,)
+            ).fetchall()
+            vectors = self._vectors_unlocked(conn, [row for row, _h in rows])
+        result: Dict[str, np.ndarray] = {}
+        for row, h in rows:
+            if row in vectors and h not in result:
+                result[h] = vectors[row]
+        return result
+
+    def get_chunks(self, rows: List[int]) -> Dict[int, StoredChunk]:
+        result: Dict[int, StoredChunk] = {}
+        with self._lock:
+            conn = self._db()
+            for part in _batches(rows):
+                query = f"{_SELECT_CHUNK} WHERE row IN ({', '.join('?' * len(part))})"
+                for r in conn.execute(query, part):
+                    result[int(r[0])] = _chunk_from_row(r)
+        return result
+
+    def dense_search(
+        self, q_vec: np.ndarray, min_score: float = -np.inf, exact: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top SQLITE_KNN_K chunks by cosine similarity (sqlite-vec scans are
+        exact, so `exact` changes nothing here).
+        """
+        with self._lock:
+            conn = self._db()
+            if not self._dim:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            hits = conn.execute(
+                "SELECT rowid, distance FROM chunks_vec "
+                "WHERE embedding MATCH ? AND k = ? ORDER BY distance",
+                (_blob(q_vec), SQLITE_KNN_K),
+            ).fetchall()
+
+        rows = np.array([h[0] for h in hits], dtype=np.int64)
+        scores = 1.0 - np.array([h[1] for h in hits], dtype=np.float32)
+        keep = scores >= min_score
+        return rows[keep], scores[keep]
+
+    def score_rows(self, q_vec: np.ndarray, rows: List[int]) -> np.ndarray:
+        out = np.zeros(len(rows), dtype=np.float32)
+        with self._lock:
+            conn = self._db()
+            if not self._dim or not rows:
+                return out
+            vectors = self._vectors_unlocked(conn, rows)
+        q = np.asarray(q_vec, dtype=np.float32).ravel()
+        for i, row in enumerate(rows):
+            vec = vectors.get(row)
+            if vec is not None:
+                out[i] = float(vec @ q)
+        return out
+
+    def bm25_search(self, query: str, top_k: int = 0) -> List[Tuple[int, float]]:
+        """FTS5 bm25() ranking over the same tokens the in-memory BM25 uses."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        # Tokens are \w+ runs, so quoting each one is enough to escape it
+        match = " OR ".join(f'"{t}"' for t in terms)
+        sql = (
+            "SELECT rowid, bm25(chunks_fts) AS rank FROM chunks_fts "
+            "WHERE chunks_fts MATCH ? ORDER BY rank"
+        )
+        params: tuple = (match,)
+        if top_k > 0:
+            sql += " LIMIT ?"
+            params = (match, top_k)
+        with self._lock:
+            hits = self._db().execute(sql, params).fetchall()
+        # FTS5's bm25() is lower-is-better; flip it to match BM25Index
+        return [(int(row), -float(rank)) for row, rank in hits if rank < 0]
+
+    def get_neighbors(self, file_path: str, chunk_index: int, window: int = 1) -> List[StoredChunk]:
+        with self._lock:
+            hits = self._db().execute(
+                f"{_SELECT_CHUNK} WHERE file_path = ? AND chunk_index BETWEEN ? AND ? "
+                "AND chunk_index != ? ORDER BY chunk_index",
+                (file_path, chunk_index - window, chunk_index + window, chunk_index),
+            ).fetchall()
+        return [_chunk_from_row(r) for r in hits]
+
+    def get_section_text(self, section_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT text FROM sections WHERE section_id = ?", (section_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._db()
+            files, chunks = conn.execute(
+                "SELECT COUNT(DISTINCT file_path), COUNT(*) FROM chunks"
+            ).fetchone()
+        db_bytes = 0
+        for suffix in ("", "-wal"):
+            try:
+                db_bytes += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return {"backend": "sqlite", "files": files, "chunks": chunks, "db_bytes": db_bytes}
+
+    def _vectors_unlocked(self, conn: sqlite3.Connection, rows: List[int]) -> Dict[int, np.ndarray]:
+        result: Dict[int, np.ndarray] = {}
+        if not self._dim:
+            return result
+        for part in _batches(rows):
+            query = f"SELECT rowid, embedding FROM chunks_vec WHERE rowid IN ({', '.join('?' * len(part))})"
+            for row, blob in conn.execute(query, part):
+                result[int(row)] = np.frombuffer(blob, dtype=np.float32).copy()
+        return result
+
+
+def _batches(rows: List[int]) -> Iterator[List[int]]:
+    ids = [int(r) for r in rows]
+    for start in range(0, len(ids), _MAX_PARAMS):
+        yield ids[start : start + _MAX_PARAMS]
@@ -0,0 +1,308 @@
+"""
+Growable, preallocated embedding matrix owned by a MemoryStore.
+
+Rows are addressed by a stable integer row id for the lifetime of the
+chunk stored in them.  Freed rows are zeroed and recycled, so the
+matrix never needs to be re-stacked or compacted on the query path.
+
+The matrix can hold a compact copy of the vectors (float16, or int8 with
+a per-dimension scale) for the first-pass scan.  Full-precision vectors
+are then kept in a file-backed memmap so the few top candidates can be
+rescored exactly without holding float32 copies in RAM.
+"""
+
+from __future__ import annotations
+
+import tempfile
+from typing import IO, List, Optional
+
+import numpy as np
+
+_INITIAL_CAPACITY = 256
+_SCORE_BLOCK = 1024  # compact rows widened to float32 at a time when scoring
+_INT8_MAX = 127.0
+_SCALE_HEADROOM = 1.25  # grow int8 scales with slack so requantizing stays rare
+_INIT_RANGE_SIGMAS = 4.0  # initial int8 range, in std-devs of a unit vector's components
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+
+class VectorMatrix:
+    """
+    Contiguous matrix with amortized capacity doubling.
+
+    dtype: storage type of the scanned matrix ("float32", "float16" or "int8").
+    spill_dir: directory for the full-precision memmap used by quantized
+      matrices (None = system temp dir).  Ignored for float32.
+
+    Not thread-safe on its own — the owning store serializes access.
+    """
+
+    def __init__(
+        self,
+        initial_capacity: int = _INITIAL_CAPACITY,
+        dtype: str = "float32",
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r} (expected one of {VECTOR_DTYPES})")
+        self._initial_capacity = max(1, initial_capacity)
+        self._dtype = dtype
+        self._spill_dir = spill_dir or None
+        self._data: Optional[np.ndarray] = None  # shape: (capacity, d), compact dtype
+        self._scale: Optional[np.ndarray] = None  # int8 only: per-dimension scale, shape (d,)
+        self._full: Optional[np.memmap] = None   # quantized only: float32 (capacity, d)
+        self._full_file: Optional[IO[bytes]] = None
+        self._size = 0  # high-water mark of allocated rows
+        self._free: List[int] = []
+
+    @classmethod
+    def from_array(
+        cls,
+        data: np.ndarray,
+        free_rows: List[int],
+        dtype: str = "float32",
+        spill_dir: Optional[str] = None,
+    ) -> "VectorMatrix":
+        """
+        Matrix over existing float32 rows, e.g. a memory-mapped snapshot.
+        float32 matrices use data as-is (until they next grow); quantized
+        ones are built from it, with int8 scales calibrated on all rows.
+        """
+        m = cls(dtype=dtype, spill_dir=spill_dir)
+        n, dim = data.shape
+        if n == 0:
+            return m
+        if dtype == "float32":
+            m._data = data
+        else:
+            m._allocate(max(n, m._initial_capacity), dim)
+            assert m._data is not None and m._full is not None
+            if m._scale is not None:
+                data_max = np.zeros(dim, dtype=np.float32)
+                for start in range(0, n, _SCORE_BLOCK):
+                    block_max = np.abs(data[start : start + _SCORE_BLOCK]).max(axis=0)
+                    np.maximum(data_max, block_max, out=data_max)
+                m._scale = np.where(data_max > 0, data_max / _INT8_MAX, m._scale).astype(np.float32)
+            for start in range(0, n, _SCORE_BLOCK):
+                block = np.asarray(data[start : start + _SCORE_BLOCK], dtype=np.float32)
+                m._full[start : start + len(block)] = block
+                if m._scale is not None:
+                    block = np.clip(np.rint(block / m._scale), -_INT8_MAX, _INT8_MAX)
+                m._data[start : start + len(block)] = block
+        m._size = n
+        m._free = list(free_rows)
+        return m
+
+    @property
+    def dim(self) -> int:
+        return 0 if self._data is None else int(self._data.shape[1])
+
+    @property
+    def dtype(self) -> str:
+        return self._dtype
+
+    @property
+    def quantized(self) -> bool:
+        return self._dtype != "float32"
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._data is None else int(self._data.shape[0])
+
+    @property
+    def free_rows(self) -> List[int]:
+        return list(self._free)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes: the scanned matrix plus int8 scales."""
+        if self._data is None:
+            return 0
+        return int(self._data.nbytes) + (0 if self._scale is None else int(self._scale.nbytes))
+
+    @property
+    def spill_nbytes(self) -> int:
+        """Bytes of the file-backed full-precision copy (paged in on demand)."""
+        return 0 if self._full is None else int(self._full.nbytes)
+
+    def row_nbytes(self, dim: int = 0) -> int:
+        """Resident bytes per row; pass dim to size rows before the first add."""
+        return (self.dim or dim) * np.dtype(self._dtype).itemsize
+
+    def clear(self) -> None:
+        self._data = None
+        self._scale = None
+        self._close_full()
+        self._size = 0
+        self._free = []
+
+    def add(self, vector: np.ndarray) -> int:
+        """Store vector in a free row (reusing freed rows first). Returns the row id."""
+        vec = np.asarray(vector, dtype=np.float32).ravel()
+        if self._data is None:
+            self._allocate(self._initial_capacity, vec.size)
+        assert self._data is not None
+        if vec.size != self._data.shape[1]:
+            raise ValueError(
+                f"Vector dimension {vec.size} does not match store dimension {self._data.shape[1]}"
+            )
+
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._size == self._data.shape[0]:
+                self._grow()
+            row = self._size
+            self._size += 1
+
+        self._write(row, vec)
+        return row
+
+    def remove(self, row: int) -> None:
+        """Zero the row and mark it for reuse. Zeroed rows score 0.0 against any query."""
+        if self._data is None or row < 0 or row >= self._size:
+            return
+        self._data[row] = 0
+        if self._full is not None:
+            self._full[row] = 0.0
+        self._free.append(row)
+
+    def get(self, row: int) -> np.ndarray:
+        """Full-precision vector for row (dequantized if no full copy is kept)."""
+        assert self._data is not None
+        return self.vectors([row])[0]
+
+    def vectors(self, rows: List[int]) -> np.ndarray:
+        """Float32 copy of the given rows as a (len(rows), d) array."""
+        if self._data is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        idx = np.asarray(rows, dtype=np.int64)
+        if self._full is not None:
+            return np.array(self._full[idx], dtype=np.float32)
+        return self._widen(self._data[idx])
+
+    def copy_into(self, out: np.ndarray) -> None:
+        """Write all allocated rows, at full precision, into out[: size]."""
+        for start in range(0, self._size, _SCORE_BLOCK):
+            stop = min(start + _SCORE_BLOCK, self._size)
+            if self._full is not None:
+                out[start:stop] = self._full[start:stop]
+            else:
+                out[start:stop] = self._widen(self._data[start:stop])
+
+    def scores(self, q_vec: np.ndarray) -> np.ndarray:
+        """
+        Inner-product scores for every allocated row (freed rows score 0.0).
+        Approximate when the matrix is quantized; see exact_scores_for.
+        """
+        if self._data is None or self._size == 0:
+            return np.zeros(0, dtype=np.float32)
+        q = self._scaled_query(q_vec)
+        if not self.quantized:
+            return self._data[: self._size] @ q
+        out = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, _SCORE_BLOCK):
+            stop = min(start + _SCORE_BLOCK, self._size)
+            out[start:stop] = self._data[start:stop].astype(np.float32) @ q
+        return out
+
+    def scores_for(self, rows: List[int], q_vec: np.ndarray) -> np.ndarray:
+        """
+        Inner-product scores for the given rows; out-of-range rows score 0.0.
+        Approximate when the matrix is quantized.
+        """
+        out = np.zeros(len(rows), dtype=np.float32)
+        if self._data is None or not len(rows):
+            return out
+        idx = np.asarray(rows, dtype=np.int64)
+        valid = (idx >= 0) & (idx < self._size)
+        out[valid] = self._data[idx[valid]].astype(np.float32, copy=False) @ self._scaled_query(q_vec)
+        return out
+
+    def exact_scores_for(self, rows: List[int], q_vec: np.ndarray) -> np.ndarray:
+        """Full-precision scores for the given rows (same as scores_for for float32)."""
+        if self._full is None:
+            return self.scores_for(rows, q_vec)
+        out = np.zeros(len(rows), dtype=np.float32)
+        if not len(rows):
+            return out
+        idx = np.asarray(rows, dtype=np.int64)
+        valid = (idx >= 0) & (idx < self._size)
+        out[valid] = self._full[idx[valid]] @ np.asarray(q_vec, dtype=np.float32).ravel()
+        return out
+
+    # -- storage -----------------------------------------------------------
+
+    def _allocate(self, capacity: int, dim: int) -> None:
+        self._data = np.zeros((capacity, dim), dtype=np.dtype(self._dtype))
+        if self._dtype == "int8":
+            # Components of a unit vector have std ~1/sqrt(d); start the
+            # range there so early rows don't force constant requantizing
+            self._scale = np.full(dim, _INIT_RANGE_SIGMAS / np.sqrt(dim) / _INT8_MAX, dtype=np.float32)
+        if self.quantized:
+            self._full_file = tempfile.TemporaryFile(dir=self._spill_dir)
+            self._map_full(capacity, dim)
+
+    def _map_full(self, capacity: int, dim: int) -> None:
+        assert self._full_file is not None
+        if self._full is not None:
+            self._full.flush()
+        self._full_file.truncate(capacity * dim * 4)
+        self._full = np.memmap(self._full_file, dtype=np.float32, mode="r+", shape=(capacity, dim))
+
+    def _close_full(self) -> None:
+        self._full = None
+        if self._full_file is not None:
+            self._full_file.close()  # TemporaryFile is unlinked on close
+            self._full_file = None
+
+    def _write(self, row: int, vec: np.ndarray) -> None:
+        assert self._data is not None
+        if self._full is not None:
+            self._full[row] = vec
+        if self._dtype == "int8":
+            self._data[row] = self._quantize(vec)
+        else:
+            self._data[row] = vec
+
+    def _quantize(self, vec: np.ndarray) -> np.ndarray:
+        """Symmetric int8 with per-dimension scale; widens scales (and requantizes) as needed."""
+        assert self._scale is not None and self._data is not None
+        needed = np.abs(vec) / _INT8_MAX
+        grow = needed > self._scale
+        if grow.any():
+            old = self._scale[grow].copy()
+            self._scale[grow] = needed[grow] * _SCALE_HEADROOM
+            if self._size:
+                cols = np.where(grow)[0]
+                ratio = np.divide(old, self._scale[cols])
+                block = self._data[: self._size, cols].astype(np.float32) * ratio
+                self._data[: self._size, cols] = np.rint(block).astype(np.int8)
+        return np.clip(np.rint(vec / self._scale), -_INT8_MAX, _INT8_MAX).astype(np.int8)
+
+    def _scaled_query(self, q_vec: np.ndarray) -> np.ndarray:
+        q = np.asarray(q_vec, dtype=np.float32).ravel()
+        if self._scale is not None:
+            # Fold the per-dimension scale into the query: (x_q * s) . q == x_q . (s * q)
+            return q * self._scale
+        return q
+
+    def _widen(self, block: np.ndarray) -> np.ndarray:
+        out = block.astype(np.float32)
+        if self._scale is not None:
+            out *= self._scale
+        return out
+
+    def _grow(self) -> None:
+        assert self._data is not None
+        new_cap = max(self._data.shape[0] * 2, self._initial_capacity)
+        grown = np.zeros((new_cap, self._data.shape[1]), dtype=self._data.dtype)
+        grown[: self._size] = self._data[: self._size]
+        self._data = grown
+        if self._full is not None:
+            self._map_full(new_cap, self._data.shape[1])
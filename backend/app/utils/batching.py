@@ -0,0 +1,151 @@
+"""
+Dynamic micro-batching for model calls.
+
+Concurrent callers submit small lists of inputs; a single worker thread
+runs them through the model as one batch and hands each caller back its
+slice of the results.  A request that finds the worker idle and nothing
+else queued is dispatched at once; only when requests pile up (they
+arrived while a batch was running, or alongside others) does the worker
+keep collecting for up to max_wait_ms (or until max_batch inputs are
+queued).  Under load this turns many batch-size-1 forward passes into a
+few well-filled ones, without adding latency to uncontended calls.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Generic, List, Optional, Sequence, TypeVar
+
+logger = logging.getLogger(__name__)
+
+I = TypeVar("I")
+O = TypeVar("O")
+
+
+@dataclass
+class _Request(Generic[I]):
+    items: List[I]
+    future: Future = field(default_factory=Future)
+
+
+class MicroBatcher(Generic[I, O]):
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[List[I]], Sequence[O]],
+        max_batch: int = 32,
+        max_wait_ms: float = 3.0,
+        enabled: bool = True,
+    ) -> None:
+        self.name = name
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.enabled = enabled
+        self._fn = fn
+        self._queue: "queue.Queue[_Request[I]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._requests = 0
+
+    def submit(self, items: List[I]) -> List[O]:
+        """Run items through the model, coalesced with concurrent callers. Blocks."""
+        if not items:
+            return []
+        if not self.enabled or len(items) >= self.max_batch:
+            # Already a full batch on its own: no point queueing it
+            self._record(1, len(items), 1)
+            return list(self._fn(items))
+
+        req: _Request[I] = _Request(items=list(items))
+        self._ensure_worker()
+        self._queue.put(req)
+        return req.future.result()
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "items": self._items,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "queued": self._queue.qsize(),
+            }
+
+    def _record(self, batches: int, items: int, requests: int) -> None:
+        with self._stats_lock:
+            self._batches += batches
+            self._items += items
+            self._requests += requests
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name=f"smartnote-batch-{self.name}", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            n_items = len(first.items)
+
+            # Take whatever queued up while the last batch ran
+            while n_items < self.max_batch:
+                try:
+                    req = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(req)
+                n_items += len(req.items)
+
+            if len(batch) == 1:
+                # Uncontended: don't hold a lone request back waiting for company
+                self._execute(batch)
+                continue
+
+            deadline = time.monotonic() + self.max_wait
+            while n_items < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    req = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(req)
+                n_items += len(req.items)
+
+            self._execute(batch)
+
+    def _execute(self, batch: List[_Request[I]]) -> None:
+        flat: List[I] = [item for req in batch for item in req.items]
+        try:
+            results = list(self._fn(flat))
+            if len(results) != len(flat):
+                raise RuntimeError(
+                    f"{self.name}: model returned {len(results)} results for {len(flat)} inputs"
+                )
+        except Exception as exc:  # propagate to every waiting caller
+            logger.warning("Micro-batch %s failed: %s", self.name, exc)
+            for req in batch:
+                req.future.set_exception(exc)
+            return
+
+        self._record(1, len(flat), len(batch))
+        offset = 0
+        for req in batch:
+            n = len(req.items)
+            req.future.set_result(results[offset : offset + n])
+            offset += n
@@ -10,76 +10,412 @@ from __future__ import annotations
 
 import math
 import re
+import sys
 from collections import Counter
-from typing import List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 _TOKEN_RE = re.compile(r"\w+", re.UNICODE)
 
+# Approximate CPython costs used for memory accounting
+_DICT_ENTRY_BYTES = 40   # dict slot (small-int key and value), amortized over resizes
+_NEW_POSTING_BYTES = 232  # empty-ish per-term dict
+_NEW_TERM_BYTES = 100     # vocabulary dict slot + list slot + boxed id
+_ARRAY_BYTES = 112        # ndarray header
+
+TERM_ID_DTYPE = np.uint32
+
 
 def tokenize(text: str) -> List[str]:
     return [t.lower() for t in _TOKEN_RE.findall(text)]
 
 
+class Vocabulary:
+    """
+    Interns terms to dense integer ids, so each distinct term string is
+    held once per session and documents are stored as id arrays.
+    Ids are never reassigned: a term stays interned after the last
+    document using it is removed.
+    """
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def encode(self, text: str) -> np.ndarray:
+        """Token ids of text, in order, interning new terms."""
+        ids = self._ids
+        out = []
+        for token in tokenize(text):
+            term_id = ids.get(token)
+            if term_id is None:
+                term_id = ids[token] = len(self._terms)
+                self._terms.append(token)
+                self._nbytes += _NEW_TERM_BYTES + sys.getsizeof(token)
+            out.append(term_id)
+        return np.array(out, dtype=TERM_ID_DTYPE)
+
+    def lookup(self, tokens: Sequence[str]) -> List[int]:
+        """Ids of the known tokens, in order; unknown ones are dropped."""
+        ids = self._ids
+        return [ids[t] for t in tokens if t in ids]
+
+
 class BM25Index:
-    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+    """
+    Incremental BM25 over an inverted index.
+
+    Documents are keyed by caller-supplied integer ids and can be added or
+    removed one at a time; document frequencies, lengths and avgdl are
+    maintained incrementally.  Search only touches the postings of the
+    query terms, so cost scales with matches rather than corpus size.
+
+    Terms are interned in a Vocabulary (pass the session's to share it)
+    and each document is tokenized once, when it is added.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, vocab: Optional[Vocabulary] = None) -> None:
         self.k1 = k1
         self.b = b
-        self._docs: List[List[str]] = []
-        self._doc_lens: List[int] = []
-        self._avgdl: float = 0.0
-        self._df: Counter = Counter()
-        self._n: int = 0
+        self.vocab = vocab if vocab is not None else Vocabulary()
+        self._postings: Dict[int, Dict[int, int]] = {}  # term id -> {doc_id: tf}
+        self._doc_lens: Dict[int, int] = {}
+        self._doc_terms: Dict[int, np.ndarray] = {}  # doc_id -> unique term ids
+        self._total_len: int = 0
+        self._nbytes: int = 0  # estimated footprint, maintained incrementally
+
+    def __len__(self) -> int:
+        return len(self._doc_lens)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._doc_lens
+
+    @property
+    def nbytes(self) -> int:
+        """Estimated memory held by postings, lengths, per-doc term ids and the vocabulary."""
+        return self._nbytes + self.vocab.nbytes
+
+    @property
+    def avgdl(self) -> float:
+        return self._total_len / max(len(self._doc_lens), 1)
 
     def clear(self) -> None:
-        self._docs = []
-        self._doc_lens = []
-        self._avgdl = 0.0
-        self._df = Counter()
-        self._n = 0
+        """Drop every document (the vocabulary is kept)."""
+        self._postings = {}
+        self._doc_lens = {}
+        self._doc_terms = {}
+        self._total_len = 0
+        self._nbytes = 0
 
     def index(self, texts: List[str]) -> None:
+        """Rebuild from scratch, using list positions as doc ids."""
         self.clear()
-        self._n = len(texts)
+        for doc_id, text in enumerate(texts):
+            self.add(doc_id, text)
+
+    def add(self, doc_id: int, text: str) -> None:
+        """Index one document. Re-adding an existing doc_id replaces it."""
+        self.add_tokens(doc_id, self.vocab.encode(text))
 
-        for text in texts:
-            tokens = tokenize(text)
-            self._docs.append(tokens)
-            self._doc_lens.append(len(tokens))
-            for t in set(tokens):
-                self._df[t] += 1
+    def add_tokens(self, doc_id: int, token_ids: np.ndarray) -> None:
+        """Index one document given its token ids (from self.vocab.encode)."""
+        if doc_id in self._doc_lens:
+            self.remove(doc_id)
 
-        self._avgdl = sum(self._doc_lens) / max(self._n, 1)
+        tf = Counter(token_ids.tolist())
+        added = 0
+        for term, f in tf.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                added += _NEW_POSTING_BYTES
+            posting[doc_id] = f
+        terms = np.fromiter(tf, dtype=TERM_ID_DTYPE, count=len(tf))
+        added += _DICT_ENTRY_BYTES * (len(terms) + 2) + _ARRAY_BYTES + terms.nbytes
+
+        doc_len = int(token_ids.size)
+        self._doc_lens[doc_id] = doc_len
+        self._doc_terms[doc_id] = terms
+        self._total_len += doc_len
+        self._nbytes += added
+
+    def remove(self, doc_id: int) -> None:
+        doc_len = self._doc_lens.pop(doc_id, None)
+        if doc_len is None:
+            return
+        terms = self._doc_terms.pop(doc_id)
+        freed = _DICT_ENTRY_BYTES * (len(terms) + 2) + _ARRAY_BYTES + terms.nbytes
+        for term in terms.tolist():
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self._postings[term]
+                freed += _NEW_POSTING_BYTES
+        self._total_len -= doc_len
+        self._nbytes -= freed
 
     def search(self, query: str, top_k: int = 0) -> List[Tuple[int, float]]:
-        q_tokens = tokenize(query)
-        if not q_tokens or not self._docs:
+        q_tokens = self.vocab.lookup(tokenize(query))
+        n = len(self._doc_lens)
+        if not q_tokens or n == 0:
             return []
 
-        scores: List[Tuple[int, float]] = []
-        for idx in range(self._n):
-            s = self._score_doc(q_tokens, self._docs[idx], self._doc_lens[idx])
-            if s > 0:
-                scores.append((idx, s))
+        k1 = self.k1
+        norm = k1 * self.b / max(self.avgdl, 1)
+        base = k1 * (1 - self.b)
+        doc_lens = self._doc_lens
 
-        scores.sort(key=lambda x: x[1], reverse=True)
-        if top_k > 0:
-            scores = scores[:top_k]
-        return scores
-
-    def _score_doc(
-        self, q_tokens: List[str], doc_tokens: List[str], doc_len: int
-    ) -> float:
-        tf = Counter(doc_tokens)
-        score = 0.0
+        scores: Dict[int, float] = {}
         for qt in q_tokens:
-            f = tf.get(qt, 0)
-            if f == 0:
+            posting = self._postings.get(qt)
+            if not posting:
                 continue
-            df = self._df.get(qt, 0)
-            idf = math.log((self._n - df + 0.5) / (df + 0.5) + 1.0)
-            numerator = f * (self.k1 + 1)
-            denominator = f + self.k1 * (
-                1 - self.b + self.b * doc_len / max(self._avgdl, 1)
-            )
-            score += idf * numerator / denominator
-        return score
+            df = len(posting)
+            idf = math.log((n - df + 0.5) / (df + 0.5) + 1.0)
+            for doc_id, f in posting.items():
+                s = idf * f * (k1 + 1) / (f + base + norm * doc_lens[doc_id])
+                scores[doc_id] = scores.get(doc_id, 0.0) + s
+
+        ranked = sorted(
+            ((doc_id, s) for doc_id, s in scores.items() if s > 0),
+            key=lambda x: x[1],
+            reverse=True,
+        )
+        if top_k > 0:
+            ranked = ranked[:top_k]
+        return ranked
+
+
+class SparseBM25Index:
+    """
+    BM25 over a SciPy CSR term-document matrix; a drop-in alternative to
+    BM25Index (SMARTNOTE_BM25_ENGINE=sparse) with the same scores.
+
+    Rows are term ids, columns doc ids, entries term frequencies.  A query
+    slices its terms' rows and scores every matching document in a few
+    vectorized operations: idf comes from maintained document frequencies
+    and the length normalization k1 * (1 - b + b * dl / avgdl) is kept per
+    document, recomputed (O(docs)) only when avgdl has moved.  Top-k uses
+    argpartition.
+
+    Added documents go to a pending segment, scored alongside the matrix,
+    and removed ones are masked out of it.  The matrix is rebuilt from the
+    per-document term arrays once pending or removed entries outgrow a
+    fraction of it, so bulk ingest costs one O(nnz) build.
+    """
+
+    # Rebuild the matrix when pending + dead entries exceed this share of it
+    MERGE_FRACTION = 0.25
+    # ... or this many entries, whichever is larger
+    MERGE_MIN_NNZ = 65_536
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, vocab: Optional[Vocabulary] = None) -> None:
+        self.k1 = k1
+        self.b = b
+        self.vocab = vocab if vocab is not None else Vocabulary()
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._doc_lens)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._doc_lens
+
+    @property
+    def nbytes(self) -> int:
+        """Estimated memory held by the matrix, per-doc term arrays and the vocabulary."""
+        matrix = 0
+        if self._matrix is not None:
+            m = self._matrix
+            matrix = m.data.nbytes + m.indices.nbytes + m.indptr.nbytes + self._live.nbytes
+        return (
+            self._nbytes
+            + matrix
+            + self._df.nbytes
+            + self._norm.nbytes
+            + self.vocab.nbytes
+        )
+
+    @property
+    def avgdl(self) -> float:
+        return self._total_len / max(len(self._doc_lens), 1)
+
+    def clear(self) -> None:
+        """Drop every document (the vocabulary is kept)."""
+        self._doc_terms: Dict[int, np.ndarray] = {}  # doc_id -> unique term ids
+        self._doc_tfs: Dict[int, np.ndarray] = {}    # doc_id -> their frequencies
+        self._doc_lens: Dict[int, int] = {}
+        self._total_len = 0
+        self._nbytes = 0
+        self._df = np.zeros(0, dtype=np.int64)  # term id -> live docs containing it
+        self._n_cols = 0  # > every doc id seen since the last rebuild
+
+        self._matrix = None                      # terms x docs CSR, tf entries
+        self._live = np.zeros(0, dtype=bool)     # doc id -> its matrix column is current
+        self._dead_nnz = 0                       # matrix entries of removed docs
+        self._pending: Dict[int, None] = {}      # docs added since the matrix was built
+        self._pending_nnz = 0
+        self._pending_matrix = None              # cached CSR of the pending docs
+
+        self._norm = np.zeros(0, dtype=np.float64)  # doc id -> length normalization
+        self._norm_avgdl = -1.0
+
+    def index(self, texts: List[str]) -> None:
+        """Rebuild from scratch, using list positions as doc ids."""
+        self.clear()
+        for doc_id, text in enumerate(texts):
+            self.add(doc_id, text)
+        self._rebuild()
+
+    def add(self, doc_id: int, text: str) -> None:
+        """Index one document. Re-adding an existing doc_id replaces it."""
+        self.add_tokens(doc_id, self.vocab.encode(text))
+
+    def add_tokens(self, doc_id: int, token_ids: np.ndarray) -> None:
+        """Index one document given its token ids (from self.vocab.encode)."""
+        if doc_id in self._doc_lens:
+            self.remove(doc_id)
+
+        tf = Counter(token_ids.tolist())
+        terms = np.fromiter(tf, dtype=TERM_ID_DTYPE, count=len(tf))
+        tfs = np.fromiter(tf.values(), dtype=np.float32, count=len(tf))
+
+        if len(self._df) < len(self.vocab):
+            grown = np.zeros(max(len(self.vocab), 2 * len(self._df)), dtype=np.int64)
+            grown[: len(self._df)] = self._df
+            self._df = grown
+        self._df[terms] += 1
+
+        doc_len = int(token_ids.size)
+        self._doc_terms[doc_id] = terms
+        self._doc_tfs[doc_id] = tfs
+        self._doc_lens[doc_id] = doc_len
+        self._total_len += doc_len
+        self._n_cols = max(self._n_cols, doc_id + 1)
+        self._nbytes += _DICT_ENTRY_BYTES * 4 + 2 * _ARRAY_BYTES + terms.nbytes + tfs.nbytes
+
+        self._pending[doc_id] = None
+        self._pending_nnz += len(terms)
+        self._pending_matrix = None
+
+    def remove(self, doc_id: int) -> None:
+        doc_len = self._doc_lens.pop(doc_id, None)
+        if doc_len is None:
+            return
+        terms = self._doc_terms.pop(doc_id)
+        tfs = self._doc_tfs.pop(doc_id)
+        self._df[terms] -= 1
+        self._total_len -= doc_len
+        self._nbytes -= _DICT_ENTRY_BYTES * 4 + 2 * _ARRAY_BYTES + terms.nbytes + tfs.nbytes
+
+        if doc_id in self._pending:
+            del self._pending[doc_id]
+            self._pending_nnz -= len(terms)
+            self._pending_matrix = None
+        else:
+            self._live[doc_id] = False
+            self._dead_nnz += len(terms)
+
+    def search(self, query: str, top_k: int = 0) -> List[Tuple[int, float]]:
+        q_tokens = self.vocab.lookup(tokenize(query))
+        n = len(self._doc_lens)
+        if not q_tokens or n == 0:
+            return []
+
+        terms, counts = np.unique(np.asarray(q_tokens, dtype=np.int64), return_counts=True)
+        df = self._df[terms]
+        present = df > 0
+        if not present.any():
+            return []
+        terms, counts, df = terms[present], counts[present], df[present]
+        # A term repeated in the query counts once per occurrence
+        q_weights = counts * np.log((n - df + 0.5) / (df + 0.5) + 1.0)
+
+        self._maybe_rebuild()
+        norm = self._doc_norms()
+        scores = np.zeros(len(norm), dtype=np.float64)
+        if self._matrix is not None:
+            self._accumulate(scores, self._matrix, terms, q_weights, norm)
+            scores[: len(self._live)] *= self._live
+        if self._pending:
+            if self._pending_matrix is None:
+                self._pending_matrix = self._build(list(self._pending))
+            self._accumulate(scores, self._pending_matrix, terms, q_weights, norm)
+
+        hits = np.flatnonzero(scores > 0)
+        if top_k > 0 and len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        # Highest score first; ties by doc id
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return list(zip(hits.tolist(), scores[hits].tolist()))
+
+    # -- internals ---------------------------------------------------------
+
+    def _accumulate(self, scores, matrix, terms, q_weights, norm) -> None:
+        """scores[doc] += q_weight * tf * (k1 + 1) / (tf + norm[doc]) for each query term."""
+        indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+        k1 = self.k1
+        for term, weight in zip(terms.tolist(), q_weights.tolist()):
+            if term >= matrix.shape[0]:
+                continue  # interned after this matrix was built
+            start, end = indptr[term], indptr[term + 1]
+            if start == end:
+                continue
+            docs = indices[start:end]  # unique within a row
+            tf = data[start:end]
+            scores[docs] += weight * tf * (k1 + 1) / (tf + norm[docs])
+
+    def _doc_norms(self) -> np.ndarray:
+        """k1 * (1 - b + b * dl / avgdl) per doc id, for the current avgdl."""
+        avgdl = max(self.avgdl, 1)
+        if avgdl != self._norm_avgdl or len(self._norm) != self._n_cols:
+            lens = np.zeros(self._n_cols, dtype=np.float64)
+            ids = np.fromiter(self._doc_lens.keys(), dtype=np.int64, count=len(self._doc_lens))
+            lens[ids] = np.fromiter(self._doc_lens.values(), dtype=np.float64, count=len(ids))
+            self._norm = self.k1 * (1 - self.b) + (self.k1 * self.b / avgdl) * lens
+            self._norm_avgdl = avgdl
+        return self._norm
+
+    def _maybe_rebuild(self) -> None:
+        nnz = self._matrix.nnz if self._matrix is not None else 0
+        stale = self._pending_nnz + self._dead_nnz
+        if stale > max(self.MERGE_MIN_NNZ, self.MERGE_FRACTION * nnz):
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        """Fold pending docs in and drop removed ones: one CSR over every live doc."""
+        doc_ids = list(self._doc_lens)
+        self._n_cols = max(doc_ids) + 1 if doc_ids else 0
+        self._matrix = self._build(doc_ids) if doc_ids else None
+        self._live = np.zeros(self._n_cols, dtype=bool)
+        self._live[doc_ids] = True
+        self._dead_nnz = 0
+        self._pending = {}
+        self._pending_nnz = 0
+        self._pending_matrix = None
+
+    def _build(self, doc_ids: List[int]):
+        from scipy.sparse import csr_matrix
+
+        terms = [self._doc_terms[d] for d in doc_ids]
+        lengths = np.fromiter((len(t) for t in terms), dtype=np.int64, count=len(terms))
+        rows = np.concatenate(terms)
+        cols = np.repeat(np.asarray(doc_ids, dtype=np.int64), lengths)
+        data = np.concatenate([self._doc_tfs[d] for d in doc_ids])
+        shape = (len(self.vocab), self._n_cols)
+        return csr_matrix((data, (rows, cols)), shape=shape)
+
+
+# SMARTNOTE_BM25_ENGINE values (see store/memory_store)
+BM25_ENGINES = {"postings": BM25Index, "sparse": SparseBM25Index}
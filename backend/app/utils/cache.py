@@ -0,0 +1,133 @@
+"""
+Small thread-safe LRU cache used by the embedding and reranking caches,
+plus the content hash those caches (and the store's re-ingest diff) key on.
+
+The LRU is bounded by entry count, by total bytes (via a caller-supplied
+sizeof), or both, with an optional per-entry TTL.  Hit/miss/eviction
+counters are kept for monitoring.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+import xxhash
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def content_hash(text: str) -> str:
+    """Stable, model-independent hash of a text, used for content addressing."""
+    return xxhash.xxh3_128_hexdigest(text.encode("utf-8"))
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(
+        self,
+        max_entries: int = 0,
+        max_bytes: int = 0,
+        sizeof: Optional[Callable[[V], int]] = None,
+        ttl_seconds: float = 0.0,
+    ) -> None:
+        """
+        max_entries / max_bytes of 0 mean "unbounded" on that axis.
+        sizeof is required for byte bounding; it defaults to 1 per entry.
+        ttl_seconds > 0 expires entries that long after they were stored.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sizeof = sizeof or (lambda _v: 1)
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[K, V]" = OrderedDict()
+        self._sizes: Dict[K, int] = {}
+        self._expires: Dict[K, float] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.max_bytes > 0
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            if self.ttl_seconds > 0 and time.monotonic() >= self._expires[key]:
+                self._remove_unlocked(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        if not self.enabled:
+            return
+        size = self._sizeof(value)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._sizes[key]
+                self._data.move_to_end(key)
+            self._data[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            if self.ttl_seconds > 0:
+                self._expires[key] = time.monotonic() + self.ttl_seconds
+            self._evict_unlocked()
+
+    def pop(self, key: K) -> Optional[V]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._remove_unlocked(key)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._expires.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _evict_unlocked(self) -> None:
+        while self._data and (
+            (self.max_entries and len(self._data) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            self._remove_unlocked(next(iter(self._data)))
+            self.evictions += 1
+
+    def _remove_unlocked(self, key: K) -> None:
+        del self._data[key]
+        self._bytes -= self._sizes.pop(key)
+        self._expires.pop(key, None)
@@ -1,19 +1,19 @@
 import re
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Matches markdown headers: #, ##, ###, etc.
 _HEADER_RE = re.compile(r"^(#{1,6})\s+(.+)$", re.MULTILINE)
 
-# Fenced code blocks: opening ``` (with optional language) through closing ```
-_CODE_BLOCK_RE = re.compile(r"^```[^\n]*\n.*?^```", re.MULTILINE | re.DOTALL)
-
 # Table separator row (e.g. |---|---|)
 _TABLE_SEP_RE = re.compile(r"\|[\s:]*-{2,}[\s:]*\|")
 
 # Splits on sentence-ending punctuation followed by whitespace
 _SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
 
+# A sentence end inside a run of text: where long paragraphs are split
+_SENTENCE_END_RE = re.compile(r"[.!?]\s")
+
 
 @dataclass
 class ChunkResult:
@@ -45,31 +45,42 @@ def _looks_like_table(text: str) -> bool:
     return has_sep and pipe_lines >= len(lines) * 0.5
 
 
-def _split_by_headers(text: str) -> List[Tuple[str, int, str]]:
+def _strip_bounds(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Bounds of text[start:end].strip(), without copying the slice."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _iter_sections(text: str) -> Iterator[Tuple[str, int, int, int]]:
     """
-    Split markdown text into (heading_line, heading_level, content) sections.
-    heading_line is e.g. "## Goals", heading_level is 2.
-    Non-header content before the first header gets heading_level 0.
+    Yield (heading_line, heading_level, content_start, content_end) per
+    markdown section, lazily.  heading_line is e.g. "## Goals", heading_level
+    is 2; content bounds are stripped.  Non-header content before the first
+    header gets heading_level 0.
     """
-    sections: List[Tuple[str, int, str]] = []
     last_end = 0
     last_heading = ""
     last_level = 0
+    found = False
 
     for match in _HEADER_RE.finditer(text):
         if match.start() > last_end:
-            content = text[last_end:match.start()].strip()
-            if content:
-                sections.append((last_heading, last_level, content))
+            start, end = _strip_bounds(text, last_end, match.start())
+            if start < end:
+                found = True
+                yield last_heading, last_level, start, end
         last_heading = match.group(0)
         last_level = len(match.group(1))  # number of # chars
         last_end = match.end()
 
-    remaining = text[last_end:].strip()
-    if remaining:
-        sections.append((last_heading, last_level, remaining))
-
-    return sections if sections else [("", 0, text.strip())]
+    start, end = _strip_bounds(text, last_end, len(text))
+    if start < end:
+        yield last_heading, last_level, start, end
+    elif not found:
+        yield ("", 0, *_strip_bounds(text, 0, len(text)))
 
 
 def _build_breadcrumb(header_stack: List[str]) -> str:
@@ -81,49 +92,128 @@ def _build_breadcrumb(header_stack: List[str]) -> str:
 # Structure-aware block splitting
 # ---------------------------------------------------------------------------
 
-def _split_into_blocks(text: str) -> List[str]:
-    """
-    Split text into semantic blocks, keeping code fences and tables atomic.
+def _iter_lines(text: str, start: int, end: int) -> Iterator[str]:
+    pos = start
+    while True:
+        nl = text.find("\n", pos, end)
+        if nl < 0:
+            yield text[pos:end]
+            return
+        yield text[pos:nl]
+        pos = nl + 1
 
-    Code blocks (``` ... ```) are never split internally — even if they
-    contain blank lines.  Tables (detected by separator rows) are kept
-    as single units too.
+
+def _split_long(text: str, limit: int) -> List[str]:
+    """
+    Split text into pieces of at most limit chars, breaking after the last
+    sentence end, else newline, else space in the second half of each window.
+    """
+    pieces: List[str] = []
+    start = 0
+    while len(text) - start > limit:
+        floor = start + limit // 2
+        stop = start + limit
+        cut = -1
+        for m in _SENTENCE_END_RE.finditer(text, floor, stop + 1):
+            cut = m.start() + 1
+        if cut < 0:
+            cut = text.rfind("\n", floor, stop + 1)
+        if cut < 0:
+            cut = text.rfind(" ", floor, stop + 1)
+        if cut <= start:
+            cut = stop
+        piece = text[start:cut].strip()
+        if piece:
+            pieces.append(piece)
+        start = cut
+    tail = text[start:].strip()
+    if tail:
+        pieces.append(tail)
+    return pieces
+
+
+class _ParagraphBuffer:
+    """
+    Collects plain-text lines into paragraph blocks (split on blank lines),
+    keeping tables as atomic units.  Paragraphs longer than limit are split;
+    one with no table separator row is split as it grows, so a header-less,
+    blank-line-free log never accumulates more than ~2 * limit chars here.
     """
-    blocks: List[str] = []
-    pos = 0
 
-    for m in _CODE_BLOCK_RE.finditer(text):
-        # Plain text before this code block
-        before = text[pos:m.start()]
-        blocks.extend(_split_plain_text(before))
-        # The code block itself — atomic
-        code = m.group().strip()
-        if code:
-            blocks.append(code)
-        pos = m.end()
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.lines: List[str] = []
+        self.size = 0
+        self.maybe_table = False
+
+    def add(self, line: str) -> List[str]:
+        if not line:
+            return self.flush()
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if not self.maybe_table and _TABLE_SEP_RE.search(line):
+            self.maybe_table = True
+        if self.size <= 2 * self.limit or self.maybe_table:
+            return []
+        pieces = _split_long(self._cleaned_lines(), self.limit)
+        rest = pieces.pop() if pieces else ""
+        self.lines = [rest] if rest else []
+        self.size = len(rest) + 1 if rest else 0
+        return pieces
+
+    def flush(self) -> List[str]:
+        if not self.lines:
+            return []
+        cleaned = "\n".join(self.lines).strip()
+        is_table = self.maybe_table and _looks_like_table(cleaned)
+        body = cleaned if is_table else self._cleaned_lines()
+        self.lines = []
+        self.size = 0
+        self.maybe_table = False
+        if not body:
+            return []
+        if is_table:
+            # Keep the table exactly as-is
+            return [body]
+        return _split_long(body, self.limit)
 
-    # Remaining text after the last code block
-    if pos < len(text):
-        blocks.extend(_split_plain_text(text[pos:]))
+    def _cleaned_lines(self) -> str:
+        lines = "\n".join(self.lines).strip().splitlines()
+        return "\n".join(line.strip() for line in lines if line.strip())
 
-    return blocks
 
+def _iter_blocks(text: str, start: int, end: int, limit: int) -> Iterator[str]:
+    """
+    Yield the semantic blocks of text[start:end] in one pass over its lines,
+    keeping code fences and tables atomic.
 
-def _split_plain_text(text: str) -> List[str]:
-    """Split non-code text by \\n\\n, keeping tables as atomic units."""
-    result: List[str] = []
-    for para in text.split("\n\n"):
-        cleaned = para.strip()
-        if not cleaned:
+    Code blocks (``` ... ```) are never split internally — even if they
+    contain blank lines.  Tables (detected by separator rows) are kept
+    as single units too.  A fence that is never closed is plain text.
+    """
+    paragraphs = _ParagraphBuffer(limit)
+    fence: List[str] = []  # lines of the currently open code fence
+
+    for line in _iter_lines(text, start, end):
+        if fence:
+            if not line.startswith("```"):
+                fence.append(line)
+                continue
+            # Closing fence: the paragraph before it ends, the code block
+            # follows, and the rest of this line starts the next text
+            fence.append("```")
+            yield from paragraphs.flush()
+            yield "\n".join(fence)
+            fence = []
+            line = line[3:]
+        elif line.startswith("```"):
+            fence.append(line)
             continue
-        if _looks_like_table(cleaned):
-            # Keep the table exactly as-is
-            result.append(cleaned)
-        else:
-            lines = [line.strip() for line in cleaned.splitlines() if line.strip()]
-            if lines:
-                result.append("\n".join(lines))
-    return result
+        yield from paragraphs.add(line)
+
+    for line in fence:  # unclosed fence
+        yield from paragraphs.add(line)
+    yield from paragraphs.flush()
 
 
 # ---------------------------------------------------------------------------
@@ -139,20 +229,32 @@ def _sentence_overlap(text: str, overlap_chars: int) -> str:
     """
     Return the last complete sentence(s) from text that fit within overlap_chars.
     Falls back to the last sentence if none fit cleanly.
+
+    Only the last 2 * overlap_chars of text are looked at, so the cost and
+    the size of the overlap don't grow with the chunk.  A last sentence
+    longer than that window falls back to a word-aligned tail instead.
     """
     if not text or overlap_chars <= 0:
         return ""
 
-    sentences = _split_sentences(text)
+    window_start = max(0, len(text) - 2 * overlap_chars)
+    sentences = _split_sentences(text[window_start:])
+    if window_start > 0 and sentences:
+        # The first piece may have started before the window
+        sentences = sentences[1:]
     if not sentences:
-        return text[-overlap_chars:]
+        tail = text[-overlap_chars:]
+        space = tail.find(" ")
+        if 0 <= space < len(tail) - 1:
+            tail = tail[space + 1:]
+        return tail.strip()
 
     result: List[str] = []
     total = 0
     for sentence in reversed(sentences):
         needed = len(sentence) + (1 if result else 0)
         if total + needed <= overlap_chars:
-            result.insert(0, sentence)
+            result.append(sentence)
             total += needed
         else:
             break
@@ -161,9 +263,41 @@ def _sentence_overlap(text: str, overlap_chars: int) -> str:
     if not result:
         result = [sentences[-1]]
 
+    result.reverse()
     return " ".join(result)
 
 
+def _pack_blocks(
+    blocks: Iterable[str], prefix: str, max_chars: int, overlap: int
+) -> Iterator[str]:
+    """Greedily pack blocks into chunk texts of about max_chars, with overlap."""
+    current: List[str] = []
+    current_len = len(prefix)
+
+    for block in blocks:
+        block_len = len(block)
+
+        if current and current_len + block_len + 2 > max_chars:
+            body = "\n\n".join(current)
+            yield prefix + body
+
+            # Sentence-level overlap from flushed content
+            overlap_text = _sentence_overlap(body, overlap)
+
+            if overlap_text:
+                current = [overlap_text, block]
+                current_len = len(prefix) + len(overlap_text) + 2 + block_len
+            else:
+                current = [block]
+                current_len = len(prefix) + block_len
+        else:
+            current.append(block)
+            current_len += block_len + 2
+
+    if current:
+        yield prefix + "\n\n".join(current)
+
+
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
@@ -174,31 +308,34 @@ def chunk_text(text: str, max_chars: int = 800, overlap: int = 200) -> List[str]
     return [c.text for c in result.chunks]
 
 
-def chunk_text_rich(
-    text: str, max_chars: int = 800, overlap: int = 200
-) -> ChunkingResult:
+def iter_chunks(
+    text: str,
+    max_chars: int = 800,
+    overlap: int = 200,
+    sections: Optional[Dict[str, str]] = None,
+) -> Iterator[ChunkResult]:
     """
-    Chunk text into pieces with hierarchical header context and
-    parent-section tracking.
-
-    Each chunk carries:
-    - heading_breadcrumb: full section path (e.g. "## Arch > ### DB")
-    - section_id: key into ``sections`` dict for parent expansion
-
-    Returns a ChunkingResult with both the chunks and a mapping of
-    section_id -> full section text.
+    Yield chunks one at a time, in a single pass over text.
+
+    Cost is linear in the length of text and the working set is a few
+    chunks' worth of characters, however large the document: plain-text
+    paragraphs longer than a chunk are split at sentence, line or word
+    boundaries, and overlap is taken from a bounded tail of each chunk.
+    Code fences and tables stay atomic.
+
+    chunk_index is set as chunks are produced; total_chunks is left at 0
+    since the count isn't known until the end (see chunk_text_rich).
+    If sections is given, it is filled with section_id -> full section
+    text as each section is reached.
     """
     if not text:
-        return ChunkingResult(chunks=[], sections={})
-
-    sections = _split_by_headers(text)
-    all_chunks: List[ChunkResult] = []
-    sections_map: Dict[str, str] = {}
+        return
 
     # Track header hierarchy: stack of (level, heading_line) pairs
     header_stack: List[Tuple[int, str]] = []
+    chunk_index = 0
 
-    for sect_idx, (heading, level, content) in enumerate(sections):
+    for sect_idx, (heading, level, start, end) in enumerate(_iter_sections(text)):
         # Update header stack: pop any headers at the same or deeper level
         if heading:
             while header_stack and header_stack[-1][0] >= level:
@@ -209,51 +346,45 @@ def chunk_text_rich(
         section_id = f"section::{sect_idx}"
 
         # Store full section text for parent expansion
-        full_section = f"{heading}\n\n{content}" if heading else content
-        sections_map[section_id] = full_section
+        if sections is not None:
+            content = text[start:end]
+            sections[section_id] = f"{heading}\n\n{content}" if heading else content
 
         # The immediate heading is prefixed to chunk text for embedding quality
         prefix = f"{heading}\n\n" if heading else ""
-        blocks = _split_into_blocks(content)
-
-        current: List[str] = []
-        current_len = len(prefix)
-
-        for block in blocks:
-            block_len = len(block)
-
-            if current and current_len + block_len + 2 > max_chars:
-                # Flush
-                all_chunks.append(ChunkResult(
-                    text=prefix + "\n\n".join(current),
-                    heading_breadcrumb=breadcrumb,
-                    section_id=section_id,
-                ))
-
-                # Sentence-level overlap from flushed content
-                overlap_text = _sentence_overlap("\n\n".join(current), overlap)
-
-                if overlap_text:
-                    current = [overlap_text, block]
-                    current_len = len(prefix) + len(overlap_text) + 2 + block_len
-                else:
-                    current = [block]
-                    current_len = len(prefix) + block_len
-            else:
-                current.append(block)
-                current_len += block_len + 2
+        block_limit = max(max_chars - len(prefix) - 2, max_chars // 2, 1)
+        blocks = _iter_blocks(text, start, end, block_limit)
 
-        if current:
-            all_chunks.append(ChunkResult(
-                text=prefix + "\n\n".join(current),
+        for chunk in _pack_blocks(blocks, prefix, max_chars, overlap):
+            yield ChunkResult(
+                text=chunk,
                 heading_breadcrumb=breadcrumb,
+                chunk_index=chunk_index,
                 section_id=section_id,
-            ))
+            )
+            chunk_index += 1
+
+
+def chunk_text_rich(
+    text: str, max_chars: int = 800, overlap: int = 200
+) -> ChunkingResult:
+    """
+    Chunk text into pieces with hierarchical header context and
+    parent-section tracking.
+
+    Each chunk carries:
+    - heading_breadcrumb: full section path (e.g. "## Arch > ### DB")
+    - section_id: key into ``sections`` dict for parent expansion
+
+    Returns a ChunkingResult with both the chunks and a mapping of
+    section_id -> full section text.  See iter_chunks to consume
+    chunks incrementally.
+    """
+    sections_map: Dict[str, str] = {}
+    all_chunks = list(iter_chunks(text, max_chars, overlap, sections=sections_map))
 
-    # Assign indices
     total = len(all_chunks)
-    for i, chunk in enumerate(all_chunks):
-        chunk.chunk_index = i
+    for chunk in all_chunks:
         chunk.total_chunks = total
 
     return ChunkingResult(chunks=all_chunks, sections=sections_map)
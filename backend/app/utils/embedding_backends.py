@@ -0,0 +1,214 @@
+"""
+Model backends behind utils/embeddings.
+
+An Embedder turns texts into normalized float32 vectors; a Reranker
+scores (query, text) pairs.  utils/embeddings caches, batches and
+micro-batches around whichever pair is configured, so the searcher and
+ingester never see the backend:
+
+  - sentence-transformers  the PyTorch models (default)
+  - onnx                   the same models exported to ONNX (optionally
+                           int8-quantized), run with onnxruntime on CPU
+  - hashing                deterministic feature hashing; no model files,
+                           for benchmarks and tests
+
+Each backend's `name` namespaces its cache entries, so switching backends
+never serves vectors produced by another one.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import xxhash
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class Embedder(ABC):
+    name: str
+    dim: int = 0
+
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """(len(texts), d) float32 array of L2-normalized embeddings."""
+
+
+class Reranker(ABC):
+    name: str
+
+    @abstractmethod
+    def predict(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        """Relevance score per (query, text) pair; higher is more relevant."""
+
+
+def _l2_normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return (x / np.maximum(norms, 1e-12)).astype(np.float32, copy=False)
+
+
+# ---------------------------------------------------------------------------
+# sentence-transformers (PyTorch)
+# ---------------------------------------------------------------------------
+
+class SentenceTransformerEmbedder(Embedder):
+    def __init__(self, model_name: str) -> None:
+        # Imported here: torch + transformers take seconds to import
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self._model = SentenceTransformer(model_name)
+        self.dim = int(self._model.get_sentence_embedding_dimension() or 0)
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        vectors = self._model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=False,
+            normalize_embeddings=True,
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class CrossEncoderReranker(Reranker):
+    def __init__(self, model_name: str) -> None:
+        from sentence_transformers import CrossEncoder
+
+        self.name = model_name
+        self._model = CrossEncoder(model_name)
+
+    def predict(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        scores = self._model.predict([list(p) for p in pairs], show_progress_bar=False)
+        return np.asarray(scores, dtype=np.float32)
+
+
+# ---------------------------------------------------------------------------
+# ONNX Runtime
+# ---------------------------------------------------------------------------
+
+_ONNX_MODEL_FILES = ("model_quantized.onnx", "model.onnx")
+
+
+class _OnnxModel:
+    """
+    An exported Hugging Face encoder: <dir>/model_quantized.onnx (preferred)
+    or <dir>/model.onnx, plus the fast tokenizer's <dir>/tokenizer.json.
+    """
+
+    def __init__(self, model_dir: str, max_length: int, threads: int) -> None:
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = next(
+            (os.path.join(model_dir, f) for f in _ONNX_MODEL_FILES
+             if os.path.exists(os.path.join(model_dir, f))),
+            None,
+        )
+        if path is None:
+            raise FileNotFoundError(f"No {' or '.join(_ONNX_MODEL_FILES)} in {model_dir!r}")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.path = path
+        logger.info("Loaded ONNX model %s", path)
+
+    def run(self, inputs: list) -> Tuple[np.ndarray, np.ndarray]:
+        """(first output, attention mask) for a batch of texts or text pairs."""
+        encodings = self.tokenizer.encode_batch(inputs)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        output = self.session.run(None, feed)[0]
+        return output, feed["attention_mask"]
+
+
+class OnnxEmbedder(Embedder):
+    """Mean-pooled, normalized embeddings (the pooling all-MiniLM-L6-v2 uses)."""
+
+    def __init__(self, model_dir: str, threads: int, max_length: int = 256) -> None:
+        self._model = _OnnxModel(model_dir, max_length, threads)
+        self.name = f"onnx:{os.path.basename(os.path.normpath(model_dir))}"
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        parts = []
+        for start in range(0, len(texts), max(1, batch_size)):
+            hidden, mask = self._model.run(texts[start : start + batch_size])
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            parts.append(_l2_normalize(pooled))
+        out = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        self.dim = int(out.shape[1]) if out.size else self.dim
+        return out
+
+
+class OnnxReranker(Reranker):
+    """Single-logit cross-encoder; sigmoid matches CrossEncoder.predict's default."""
+
+    def __init__(self, model_dir: str, threads: int, max_length: int = 512) -> None:
+        self._model = _OnnxModel(model_dir, max_length, threads)
+        self.name = f"onnx:{os.path.basename(os.path.normpath(model_dir))}"
+
+    def predict(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        logits, _mask = self._model.run([tuple(p) for p in pairs])
+        logits = logits.reshape(len(pairs), -1)[:, 0]
+        return (1.0 / (1.0 + np.exp(-logits))).astype(np.float32)
+
+
+# ---------------------------------------------------------------------------
+# Deterministic hashing (no model)
+# ---------------------------------------------------------------------------
+
+class HashingEmbedder(Embedder):
+    """
+    Signed feature hashing of lowercased unigrams and bigrams with
+    log-scaled counts.  Deterministic across processes and platforms;
+    similar texts get similar vectors, which is enough to exercise
+    retrieval end to end without downloading a model.
+    """
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = [t.lower() for t in _TOKEN_RE.findall(text)]
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feat in features:
+                h = xxhash.xxh64_intdigest(feat.encode("utf-8"))
+                out[i, h % self.dim] += 1.0 if (h >> 63) else -1.0
+        out = np.sign(out) * np.log1p(np.abs(out))
+        return _l2_normalize(out)
+
+
+class HashingReranker(Reranker):
+    """Cosine similarity of hashed query and text vectors."""
+
+    def __init__(self, embedder: HashingEmbedder) -> None:
+        self._embedder = embedder
+        self.name = f"hashing-rerank:{embedder.dim}"
+
+    def predict(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        queries = self._embedder.encode([q for q, _t in pairs])
+        texts = self._embedder.encode([t for _q, t in pairs])
+        return (queries * texts).sum(axis=1).astype(np.float32)
@@ -1,60 +1,417 @@
-from  sentence_transformers import SentenceTransformer, CrossEncoder
-from typing import List
+from __future__ import annotations
 
-_model: SentenceTransformer | None = None
-_reranker: CrossEncoder | None = None
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
 
-# Loads model if not already loaded
-def get_embedding_model() -> SentenceTransformer:
+import numpy as np
+import xxhash
+
+from .batching import MicroBatcher
+from .cache import LRUCache, content_hash
+from .executors import default_torch_threads
+
+# Backend modules import their heavy dependencies (torch, onnxruntime)
+# on first model load, not when this module is imported
+if TYPE_CHECKING:
+    from .embedding_backends import Embedder, HashingEmbedder, Reranker
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Model backend: "sentence-transformers" (PyTorch), "onnx" (onnxruntime on
+# CPU, from exported models), or "hashing" (deterministic, no model)
+EMBED_BACKEND = os.getenv("SMARTNOTE_EMBED_BACKEND", "sentence-transformers").strip().lower()
+# Directories with model[_quantized].onnx + tokenizer.json (onnx backend)
+ONNX_EMBED_DIR = os.getenv("SMARTNOTE_ONNX_EMBED_DIR", "models/all-MiniLM-L6-v2-onnx")
+ONNX_RERANK_DIR = os.getenv("SMARTNOTE_ONNX_RERANK_DIR", "models/ms-marco-MiniLM-L-6-v2-onnx")
+# Vector size of the hashing backend
+HASH_EMBED_DIM = int(os.getenv("SMARTNOTE_HASH_EMBED_DIM", "384"))
+
+# Content-addressed embedding cache, shared by every session in the process.
+# Byte-bounded in memory; optionally backed by a directory on disk.
+EMBED_CACHE_BYTES = int(os.getenv("SMARTNOTE_EMBED_CACHE_BYTES", str(64 * 1024 * 1024)))
+EMBED_CACHE_DIR = os.getenv("SMARTNOTE_EMBED_CACHE_DIR", "").strip()
+
+# LRU cache for query embeddings (repeated searches, retries, tab switches)
+QUERY_CACHE_SIZE = int(os.getenv("SMARTNOTE_QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("SMARTNOTE_QUERY_CACHE_TTL_SECONDS", "600"))
+
+# LRU cache for cross-encoder scores, keyed on (query hash, chunk content hash)
+RERANK_CACHE_SIZE = int(os.getenv("SMARTNOTE_RERANK_CACHE_SIZE", "8192"))
+
+# Texts per forward pass when embedding ingest batches
+EMBED_BATCH_SIZE = int(os.getenv("SMARTNOTE_EMBED_BATCH_SIZE", "64"))
+
+# Micro-batching of concurrent query embeddings and rerank calls
+MICROBATCH_ENABLED = os.getenv("SMARTNOTE_MICROBATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("SMARTNOTE_MICROBATCH_MAX_WAIT_MS", "3"))
+MICROBATCH_MAX_BATCH = int(os.getenv("SMARTNOTE_MICROBATCH_MAX_BATCH", "64"))
+
+# Intra-op threads per model call (torch or onnxruntime);
+# 0 = split cores evenly across inference workers
+TORCH_THREADS = int(os.getenv("SMARTNOTE_TORCH_THREADS", "0"))
+
+_model: Embedder | None = None
+_reranker: Reranker | None = None
+_hashing_embedder: HashingEmbedder | None = None  # shared by the hashing embedder and reranker
+_torch_configured = False
+_load_lock = threading.Lock()  # concurrent first requests load each model once
+
+# Startup warmup progress, reported by /ready
+_warmup: Dict[str, Any] = {"state": "idle", "timings_ms": {}}
+
+# Matches torch's thread pool to the inference executor so concurrent
+# model calls don't oversubscribe the CPU
+def _configure_torch_threads() -> None:
+    global _torch_configured
+    if _torch_configured:
+        return
+    import torch
+
+    threads = _model_threads()
+    torch.set_num_threads(threads)
+    logger.info("torch intra-op threads set to %d", threads)
+    _torch_configured = True
+
+
+def _model_threads() -> int:
+    return TORCH_THREADS or default_torch_threads()
+
+
+def _get_hashing_embedder() -> HashingEmbedder:
+    global _hashing_embedder
+    if _hashing_embedder is None:
+        from .embedding_backends import HashingEmbedder
+
+        _hashing_embedder = HashingEmbedder(HASH_EMBED_DIM)
+    return _hashing_embedder
+
+
+def _load_embedder() -> Embedder:
+    from . import embedding_backends as backends
+
+    if EMBED_BACKEND == "onnx":
+        return backends.OnnxEmbedder(ONNX_EMBED_DIR, threads=_model_threads())
+    if EMBED_BACKEND == "hashing":
+        return _get_hashing_embedder()
+    if EMBED_BACKEND != "sentence-transformers":
+        raise ValueError(f"Unknown SMARTNOTE_EMBED_BACKEND: {EMBED_BACKEND!r}")
+    _configure_torch_threads()
+    return backends.SentenceTransformerEmbedder(EMBEDDING_MODEL_NAME)
+
+
+def _load_reranker() -> Reranker:
+    from . import embedding_backends as backends
+
+    if EMBED_BACKEND == "onnx":
+        return backends.OnnxReranker(ONNX_RERANK_DIR, threads=_model_threads())
+    if EMBED_BACKEND == "hashing":
+        return backends.HashingReranker(_get_hashing_embedder())
+    if EMBED_BACKEND != "sentence-transformers":
+        raise ValueError(f"Unknown SMARTNOTE_EMBED_BACKEND: {EMBED_BACKEND!r}")
+    _configure_torch_threads()
+    return backends.CrossEncoderReranker(RERANKER_MODEL_NAME)
+
+# Loads the configured embedding backend if not already loaded
+def get_embedding_model() -> Embedder:
     global _model
     if _model is None:
-        model_name = "sentence-transformers/all-MiniLM-L6-v2"
-        _model = SentenceTransformer(model_name)
+        with _load_lock:
+            if _model is None:
+                _model = _load_embedder()
+                logger.info("Embedding backend: %s", _model.name)
     return _model
 
-def get_reranker() -> CrossEncoder:
+def get_reranker() -> Reranker:
     global _reranker
     if _reranker is None:
-        _reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+        with _load_lock:
+            if _reranker is None:
+                _reranker = _load_reranker()
+                logger.info("Reranker backend: %s", _reranker.name)
     return _reranker
 
+
+def warmup() -> Dict[str, float]:
+    """
+    Load both models and run one dummy forward pass through each, so the
+    first real request doesn't pay for imports, weight loading or lazy
+    kernel initialization.  Blocking; main.py runs it in the background
+    at startup.  Returns per-step timings in ms.
+    """
+    timings: Dict[str, float] = {}
+    _warmup["state"] = "running"
+
+    def step(name: str, fn) -> None:
+        start = time.perf_counter()
+        fn()
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    try:
+        step("embedder_load", get_embedding_model)
+        step("embedder_forward", lambda: _encode_texts(["warmup"]))
+        step("reranker_load", get_reranker)
+        step("reranker_forward", lambda: _predict_pairs([("warmup", "warmup")]))
+    except Exception as exc:
+        _warmup.update(state="failed", error=str(exc), timings_ms=timings)
+        raise
+    _warmup.update(state="done", timings_ms=timings)
+    return timings
+
+
+def models_ready() -> bool:
+    return _model is not None and _reranker is not None
+
+
+def warmup_status() -> Dict[str, Any]:
+    return {
+        **_warmup,
+        "embedder_loaded": _model is not None,
+        "reranker_loaded": _reranker is not None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Embedding cache
+# ---------------------------------------------------------------------------
+
+class EmbeddingCache:
+    """
+    Maps (model, text) -> normalized float32 vector.
+
+    Memory tier is an LRU bounded by total vector bytes.  When disk_dir is
+    set, vectors are also written there as raw float32 files and memory
+    misses fall through to disk before reaching the model.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: str = "") -> None:
+        self._memory: LRUCache[str, np.ndarray] = LRUCache(
+            max_bytes=max_bytes, sizeof=lambda v: int(v.nbytes)
+        )
+        self.disk_dir = disk_dir
+        self.disk_hits = 0
+        self.disk_errors = 0
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return xxhash.xxh3_128_hexdigest(f"{model_name}\0{text}".encode("utf-8"))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        vec = self._memory.get(key)
+        if vec is None and self.disk_dir:
+            vec = self._read_disk(key)
+            if vec is not None:
+                self.disk_hits += 1
+                self._memory.put(key, vec)
+        return vec
+
+    def put(self, key: str, vec: np.ndarray) -> None:
+        vec = np.asarray(vec, dtype=np.float32).ravel()
+        vec.setflags(write=False)
+        self._memory.put(key, vec)
+        if self.disk_dir:
+            self._write_disk(key, vec)
+
+    def clear(self) -> None:
+        self._memory.clear()
+
+    def stats(self) -> dict:
+        stats = self._memory.stats()
+        stats["disk_enabled"] = bool(self.disk_dir)
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_errors"] = self.disk_errors
+        return stats
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.f32")
+
+    def _read_disk(self, key: str) -> Optional[np.ndarray]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError:
+            self.disk_errors += 1
+            logger.warning("Embedding cache read failed: %s", path)
+            return None
+        if not data or len(data) % 4:
+            return None
+        return np.frombuffer(data, dtype=np.float32)
+
+    def _write_disk(self, key: str, vec: np.ndarray) -> None:
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(vec.tobytes())
+            os.replace(tmp, path)
+        except OSError:
+            self.disk_errors += 1
+            logger.warning("Embedding cache write failed: %s", path)
+
+
+_embed_cache = EmbeddingCache(EMBED_CACHE_BYTES, EMBED_CACHE_DIR)
+
+_query_cache: LRUCache[Tuple[str, str], np.ndarray] = LRUCache(
+    max_entries=QUERY_CACHE_SIZE, ttl_seconds=QUERY_CACHE_TTL_SECONDS
+)
+
+_rerank_cache: LRUCache[Tuple[str, str], float] = LRUCache(max_entries=RERANK_CACHE_SIZE)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a search query for cache keys: whitespace collapsed
+    and case-folded (the MiniLM models are uncased, so case never changes
+    the embedding).
+    """
+    return " ".join(query.split()).casefold()
+
+
+# ---------------------------------------------------------------------------
+# Micro-batching
+# ---------------------------------------------------------------------------
+
+def _encode_texts(texts: List[str]) -> List[np.ndarray]:
+    return list(get_embedding_model().encode(texts, batch_size=len(texts)))
+
+
+def _predict_pairs(pairs: List[Tuple[str, str]]) -> List[float]:
+    return get_reranker().predict(pairs).tolist()
+
+
+_embed_batcher: MicroBatcher[str, np.ndarray] = MicroBatcher(
+    "embed", _encode_texts,
+    max_batch=MICROBATCH_MAX_BATCH, max_wait_ms=MICROBATCH_MAX_WAIT_MS, enabled=MICROBATCH_ENABLED,
+)
+_rerank_batcher: MicroBatcher[Tuple[str, str], float] = MicroBatcher(
+    "rerank", _predict_pairs,
+    max_batch=MICROBATCH_MAX_BATCH, max_wait_ms=MICROBATCH_MAX_WAIT_MS, enabled=MICROBATCH_ENABLED,
+)
+
+
+def batcher_stats() -> dict:
+    return {"embed": _embed_batcher.stats(), "rerank": _rerank_batcher.stats()}
+
+
+def embedding_cache_stats() -> dict:
+    return _embed_cache.stats()
+
+
+def query_cache_stats() -> dict:
+    return _query_cache.stats()
+
+
+def rerank_cache_stats() -> dict:
+    return _rerank_cache.stats()
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
 # Gets embedding for a single block of text
+# (coalesced with concurrent callers by the micro-batcher)
 def embed_text(text: str) -> List[float]:
     if not text:
         return []
 
-    # Get the model
-    model = get_embedding_model()
-
-    # Convert text to vector
-    vector = model.encode(text, show_progress_bar = False, normalize_embeddings = True)
+    vector = _embed_batcher.submit([text])[0]
     return vector.tolist()
 
-# Gets embeddings for a batch of texts
-def embed_batch(texts: List[str]) -> List[List[float]]:
+# Gets embedding for a search query, served from the query LRU when possible
+def embed_query(query: str) -> np.ndarray:
+    normalized = normalize_query(query or "")
+    if not normalized:
+        return np.zeros(0, dtype=np.float32)
+
+    key = (get_embedding_model().name, normalized)
+    vec = _query_cache.get(key)
+    if vec is None:
+        vec = np.asarray(embed_text(normalized), dtype=np.float32).ravel()
+        vec.setflags(write=False)
+        _query_cache.put(key, vec)
+    return vec
+
+# Gets embeddings for a batch of texts as a (n, d) float32 array.
+# Cache misses are encoded in length-sorted batches so each forward pass
+# pads to similar lengths.
+def embed_texts(texts: List[str]) -> np.ndarray:
     if not texts:
-        return []
+        return np.zeros((0, 0), dtype=np.float32)
 
-    # Get the model
+    # Look up every text in the content-addressed cache first
     model = get_embedding_model()
+    keys = [EmbeddingCache.key(model.name, t) for t in texts]
+    cached: List[Optional[np.ndarray]] = [_embed_cache.get(k) for k in keys]
 
-    # Convert texts to vectors 
-    vectors = model.encode(texts, show_progress_bar = False, normalize_embeddings = True)
+    # Only cache misses reach the model (identical texts are encoded once)
+    misses: Dict[str, str] = {}
+    for key, text, vec in zip(keys, texts, cached):
+        if vec is None:
+            misses.setdefault(key, text)
 
-    return [vec.tolist() for vec in vectors]
+    fresh: Dict[str, np.ndarray] = {}
+    if misses:
+        miss_keys = sorted(misses, key=lambda k: len(misses[k]))
+        for start in range(0, len(miss_keys), EMBED_BATCH_SIZE):
+            batch_keys = miss_keys[start : start + EMBED_BATCH_SIZE]
 
+            # Convert texts to vectors
+            encoded = model.encode([misses[k] for k in batch_keys], batch_size=len(batch_keys))
+            for key, vec in zip(batch_keys, encoded):
+                fresh[key] = vec
+                _embed_cache.put(key, vec)
 
-def rerank(query: str, texts: List[str]) -> List[float]:
+    return np.stack([
+        vec if vec is not None else fresh[key]
+        for key, vec in zip(keys, cached)
+    ]).astype(np.float32, copy=False)
+
+# Gets embeddings for a batch of texts
+def embed_batch(texts: List[str]) -> List[List[float]]:
+    return [vec.tolist() for vec in embed_texts(texts)]
+
+
+def rerank(
+    query: str, texts: List[str], text_hashes: Optional[List[str]] = None
+) -> List[float]:
     """
     Score query-text pairs using a cross-encoder.
 
     Unlike embeddings (which encode query and text independently),
     the cross-encoder sees both together and produces a more accurate
     relevance score. Use this to re-rank an initial candidate set.
+
+    Scores are cached per (normalized query, text content) pair, so only
+    pairs not seen before reach the model.  Pass text_hashes (content_hash
+    of each text) when the caller already has them.
     """
     if not texts:
         return []
-    model = get_reranker()
-    pairs = [[query, t] for t in texts]
-    scores = model.predict(pairs, show_progress_bar=False)
-    return scores.tolist()
\ No newline at end of file
+
+    normalized = normalize_query(query)
+    q_hash = content_hash(f"{get_reranker().name}\0{normalized}")
+    if text_hashes is None:
+        text_hashes = [content_hash(t) for t in texts]
+    keys = [(q_hash, h) for h in text_hashes]
+
+    scores: List[Optional[float]] = [_rerank_cache.get(k) for k in keys]
+    missing = [i for i, s in enumerate(scores) if s is None]
+    if missing:
+        pairs = [(normalized, texts[i]) for i in missing]
+        fresh = _rerank_batcher.submit(pairs)
+        for i, score in zip(missing, fresh):
+            scores[i] = score
+            _rerank_cache.put(keys[i], score)
+    return scores
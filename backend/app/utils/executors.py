@@ -0,0 +1,151 @@
+"""
+Dedicated thread pools for blocking work done by async route handlers.
+
+- inference: CPU-bound model work (embedding, reranking, chunking, search).
+  Kept small so concurrent requests can't oversubscribe the CPU; torch's
+  intra-op thread count is sized to match (see utils/embeddings).
+- io: blocking network calls (the hosted LLM).
+
+Keeping these apart from AnyIO's shared threadpool means one large ingest
+can't starve every concurrent search on the instance.
+
+Jobs run in a copy of the submitting context (so per-request contextvars
+such as metrics timings follow the work), through utils/profiling's hook.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, TypeVar
+
+from .profiling import run_profiled
+
+T = TypeVar("T")
+
+_CPU_COUNT = os.cpu_count() or 1
+
+INFERENCE_WORKERS = max(1, int(os.getenv("SMARTNOTE_INFERENCE_WORKERS", str(min(4, _CPU_COUNT)))))
+IO_WORKERS = max(1, int(os.getenv("SMARTNOTE_IO_WORKERS", "16")))
+
+
+def default_torch_threads() -> int:
+    """Split the machine's cores evenly across inference workers."""
+    return max(1, _CPU_COUNT // INFERENCE_WORKERS)
+
+
+class TrackedExecutor:
+    """ThreadPoolExecutor wrapper that tracks queue depth and activity."""
+
+    def __init__(self, name: str, max_workers: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"smartnote-{name}"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._max_queued = 0
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run fn(*args, **kwargs) on this pool, preserving contextvars."""
+        ctx = contextvars.copy_context()
+
+        def _call() -> T:
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            try:
+                return ctx.run(run_profiled, fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+
+        fut: Future = self._pool.submit(_call)
+        fut.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(fut)
+
+    def _on_done(self, fut: Future) -> None:
+        # A job cancelled before it started never ran _call
+        if fut.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "active": self._active,
+                "completed": self._completed,
+                "max_queued": self._max_queued,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+inference_executor = TrackedExecutor("inference", INFERENCE_WORKERS)
+io_executor = TrackedExecutor("io", IO_WORKERS)
+
+
+async def run_inference(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await inference_executor.run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await io_executor.run(fn, *args, **kwargs)
+
+
+async def iterate_in_io(make_iter: Callable[[], Iterable[T]]) -> AsyncIterator[T]:
+    """
+    Drive a blocking iterator (e.g. a streaming HTTP response) on the I/O
+    executor and yield its items on the event loop as they arrive.
+    Closing the async generator stops the producer at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def _pump() -> None:
+        try:
+            for item in make_iter():
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+        except BaseException as exc:
+            loop.call_soon_threadsafe(queue.put_nowait, (done, exc))
+            return
+        loop.call_soon_threadsafe(queue.put_nowait, (done, None))
+
+    producer = asyncio.ensure_future(io_executor.run(_pump))
+    try:
+        while True:
+            item, exc = await queue.get()
+            if item is done:
+                if exc is not None:
+                    raise exc
+                break
+            yield item
+    finally:
+        stop.set()
+        if producer.done():
+            producer.result()
+
+
+def executor_stats() -> Dict[str, Dict[str, int]]:
+    return {
+        inference_executor.name: inference_executor.stats(),
+        io_executor.name: io_executor.stats(),
+    }
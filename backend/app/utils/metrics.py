@@ -0,0 +1,267 @@
+"""
+In-process metrics, exported in the Prometheus text format at /metrics.
+
+Hot paths record into counters and histograms directly (a dict lookup and
+a lock per observation).  Values that already live elsewhere — session
+counts, store bytes, cache and executor stats — are read at scrape time
+by collectors registered with `register_collector`, so they cost nothing
+between scrapes.
+
+`stage()` times one pipeline stage into smartnote_stage_seconds and, when
+the caller opted in with `collect_timings(d)`, into a per-request dict that
+the routes return as a `timings` field.  The dict lives in a contextvar;
+utils/executors copies the context into its workers, so stages that run
+on the inference executor still report to the request that started them.
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("SMARTNOTE_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Seconds; spans sub-millisecond BM25 lookups up to multi-second LLM calls
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelValues = Tuple[str, ...]
+# (labels, value) pairs of one metric family, as produced by collectors
+Samples = List[Tuple[Dict[str, str], float]]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: LabelValues, **extra: str) -> Dict[str, str]:
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._series.items()]
+        lines: List[str] = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = self._labels(key, le=_format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self._labels(key))} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self._labels(key))} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Samples]]]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+    def register_collector(
+        self, collect: Callable[[], Iterable[Tuple[str, str, str, Samples]]]
+    ) -> None:
+        """
+        collect() is called on every scrape and yields
+        (name, type, help, [(labels, value), ...]) per metric family.
+        """
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for collect in collectors:
+            try:
+                families = list(collect())
+            except Exception as exc:
+                logger.warning("Metrics collector failed: %s", exc)
+                continue
+            for name, mtype, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {mtype}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(v)}" for labels, v in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "smartnote_stage_seconds",
+    "Latency of each request pipeline stage",
+    ["pipeline", "stage"],
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "smartnote_request_seconds",
+    "End-to-end latency of search/ask/ingest requests",
+    ["endpoint"],
+)
+
+
+def register_collector(collect: Callable[[], Iterable[Tuple[str, str, str, Samples]]]) -> None:
+    REGISTRY.register_collector(collect)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ---------------------------------------------------------------------------
+# Stage timing
+# ---------------------------------------------------------------------------
+
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "smartnote_timings", default=None
+)
+
+
+@contextmanager
+def stage(pipeline: str, name: str) -> Iterator[None]:
+    """Time the enclosed block as one stage of pipeline."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(pipeline, name, time.perf_counter() - start)
+
+
+def record_stage(pipeline: str, name: str, seconds: float) -> None:
+    """Record an already-measured stage (for stages that span a generator)."""
+    STAGE_SECONDS.observe(seconds, pipeline=pipeline, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds * 1000
+
+
+@contextmanager
+def collect_timings(timings: Optional[Dict[str, float]]) -> Iterator[None]:
+    """
+    Add the milliseconds of every stage run inside the block (including
+    on executor threads it dispatches to) to timings.  No-op for None.
+    """
+    if timings is None:
+        yield
+        return
+    token = _timings.set(timings)
+    try:
+        yield
+    finally:
+        _timings.reset(token)
+
+
+def rounded_timings(timings: Dict[str, float]) -> Dict[str, float]:
+    return {k: round(v, 3) for k, v in timings.items()}
@@ -0,0 +1,53 @@
+"""
+MinHash signatures for near-duplicate detection.
+
+A chunk's signature is computed once, when it is stored, from its set of
+lowercased whitespace-separated words.  The fraction of slots on which two
+signatures agree estimates the Jaccard similarity of the two word sets
+(standard error sqrt(J * (1 - J) / NUM_PERM), about 0.03 around 0.85), so
+search can drop near-duplicates without rebuilding word sets per query.
+
+Each slot keeps 16 bits of its minimum hash (b-bit MinHash): signatures
+are NUM_PERM * 2 bytes, and two different minima agree by chance with
+probability 2**-16, which doesn't move the estimate.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import xxhash
+
+NUM_PERM = 128
+SIGNATURE_DTYPE = np.dtype("<u2")
+
+# Hash family h_i(x) = A_i * x + B_i (mod 2**64), A_i odd.  Bits 16-31 of
+# the minimum are taken: the low bits of a product are weakly mixed, and
+# the high bits of a minimum are mostly zero.
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+_SHIFT = np.uint64(16)
+_MASK = np.uint64(0xFFFF)
+
+
+def minhash_signature(text: str) -> bytes:
+    """Signature of text's word set; b"" if it has no words."""
+    words = set(text.lower().split())
+    if not words:
+        return b""
+    hashes = np.fromiter(
+        (xxhash.xxh3_64_intdigest(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words)
+    )
+    with np.errstate(over="ignore"):
+        mins = (np.outer(_A, hashes) + _B[:, None]).min(axis=1)
+    return ((mins >> _SHIFT) & _MASK).astype(SIGNATURE_DTYPE).tobytes()
+
+
+def as_array(signature: bytes) -> np.ndarray:
+    """View of a signature as a (NUM_PERM,) array."""
+    return np.frombuffer(signature, dtype=SIGNATURE_DTYPE)
+
+
+def estimate_jaccard(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity of one signature to each row of others."""
+    return (others == signature).mean(axis=1)
@@ -0,0 +1,383 @@
+"""
+On-demand profiling of live requests.
+
+A request is profiled when it carries `X-SmartNote-Profile: cprofile|sample`,
+when an admin armed profiling for the next N matching requests, or by
+random sampling (SMARTNOTE_PROFILE_SAMPLE_RATE).  Finished profiles go into
+a bounded ring buffer served by routes/admin:
+
+  - cprofile  deterministic cProfile of the request's executor work;
+              downloadable as a .pstats file (snakeviz, `python -m pstats`)
+  - sample    wall-clock stack sampling of the same threads; served as
+              folded stacks (flamegraph.pl, speedscope)
+
+The request's Capture lives in a contextvar.  utils/executors copies the
+context into its workers and runs each job through `run_profiled`, so the
+CPU-heavy part of a request (search, chunking, embedding) is what gets
+profiled, on whichever inference thread it lands.  Model calls coalesced
+by the micro-batcher run on its own thread and show up as waiting.
+
+Off by default: enable with SMARTNOTE_PROFILING_ENABLED.  Triggering
+profiles by header and every /admin endpoint require SMARTNOTE_ADMIN_TOKEN;
+without one they are refused, so only SMARTNOTE_PROFILE_SAMPLE_RATE
+captures are taken and nobody can read them.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import copy
+import cProfile
+import hmac
+import io
+import logging
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PROFILING_ENABLED = os.getenv("SMARTNOTE_PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Shared secret for the profile header and /admin endpoints (empty = deny all)
+ADMIN_TOKEN = os.getenv("SMARTNOTE_ADMIN_TOKEN", "").strip()
+# Fraction of /notes requests profiled without being asked (cProfile mode)
+PROFILE_SAMPLE_RATE = float(os.getenv("SMARTNOTE_PROFILE_SAMPLE_RATE", "0"))
+# Finished profiles kept in memory; the oldest is dropped first
+PROFILE_BUFFER_SIZE = max(1, int(os.getenv("SMARTNOTE_PROFILE_BUFFER_SIZE", "20")))
+# Stack sampling period of the "sample" mode
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("SMARTNOTE_PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
+MODES = ("cprofile", "sample")
+
+
+@dataclass
+class Capture:
+    """Profiling data of one in-flight request, filled in by executor threads."""
+
+    mode: str
+    trigger: str  # "header", "armed" or "sampled"
+    method: str
+    path: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    started_at: float = field(default_factory=time.time)
+    stats: Optional[pstats.Stats] = None
+    stacks: "Counter[str]" = field(default_factory=Counter)
+    samples: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_profile(self, prof: cProfile.Profile) -> None:
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(prof)
+            else:
+                self.stats.add(prof)
+
+    def add_stack(self, folded: str) -> None:
+        with self._lock:
+            self.stacks[folded] += 1
+            self.samples += 1
+
+
+@dataclass
+class Profile:
+    """A finished capture, as kept in the ring buffer."""
+
+    capture: Capture
+    status: int
+    duration_ms: float
+
+    def summary(self) -> Dict[str, Any]:
+        c = self.capture
+        return {
+            "id": c.id,
+            "mode": c.mode,
+            "trigger": c.trigger,
+            "method": c.method,
+            "path": c.path,
+            "status": self.status,
+            "started_at": c.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "samples": c.samples if c.mode == "sample" else None,
+        }
+
+
+_capture: contextvars.ContextVar[Optional[Capture]] = contextvars.ContextVar(
+    "smartnote_profile", default=None
+)
+
+
+# ---------------------------------------------------------------------------
+# Deciding which requests to profile
+# ---------------------------------------------------------------------------
+
+class _Arming:
+    """Profile the next `remaining` requests whose path starts with prefix."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.remaining = 0
+        self.prefix = "/notes/"
+        self.mode = "cprofile"
+
+    def arm(self, count: int, prefix: str, mode: str) -> None:
+        with self._lock:
+            self.remaining, self.prefix, self.mode = max(0, count), prefix, mode
+
+    def take(self, path: str) -> Optional[str]:
+        with self._lock:
+            if self.remaining > 0 and path.startswith(self.prefix):
+                self.remaining -= 1
+                return self.mode
+        return None
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"remaining": self.remaining, "path_prefix": self.prefix, "mode": self.mode}
+
+
+_arming = _Arming()
+
+
+def arm(count: int, path_prefix: str = "/notes/", mode: str = "cprofile") -> Dict[str, Any]:
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    _arming.arm(count, path_prefix, mode)
+    return _arming.state()
+
+
+def check_token(token: Optional[str]) -> bool:
+    """True if token matches ADMIN_TOKEN; always False when none is configured."""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token or "", ADMIN_TOKEN)
+
+
+def start_capture(method: str, path: str, header: Optional[str], token: Optional[str]) -> Optional[Capture]:
+    """The Capture to record this request into, or None to not profile it."""
+    if not PROFILING_ENABLED:
+        return None
+
+    if header:
+        mode = "cprofile" if header.strip().lower() in ("1", "true", "yes") else header.strip().lower()
+        if mode in MODES and check_token(token):
+            return Capture(mode=mode, trigger="header", method=method, path=path)
+
+    if not path.startswith("/notes/"):
+        return None
+    mode = _arming.take(path)
+    if mode is not None:
+        return Capture(mode=mode, trigger="armed", method=method, path=path)
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return Capture(mode="cprofile", trigger="sampled", method=method, path=path)
+    return None
+
+
+def activate(capture: Capture) -> contextvars.Token:
+    return _capture.set(capture)
+
+
+def deactivate(token: contextvars.Token) -> None:
+    _capture.reset(token)
+
+
+# ---------------------------------------------------------------------------
+# Running executor jobs under the profiler
+# ---------------------------------------------------------------------------
+
+def run_profiled(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Call fn, profiling it if the current context has an active Capture."""
+    capture = _capture.get()
+    if capture is None:
+        return fn(*args, **kwargs)
+
+    if capture.mode == "sample":
+        ident = threading.get_ident()
+        _sampler.register(ident, capture)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _sampler.unregister(ident, capture)
+
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError:
+        # Another profiler is active on this thread (e.g. a debugger)
+        return fn(*args, **kwargs)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        prof.disable()
+        capture.add_profile(prof)
+
+
+def _fold(frame: Any) -> str:
+    """Folded stack (root first, ';'-separated) below run_profiled."""
+    names: List[str] = []
+    while frame is not None and frame.f_code is not _RUN_PROFILED_CODE:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class _StackSampler:
+    """One thread that samples the stacks of every registered thread."""
+
+    def __init__(self, interval_s: float) -> None:
+        self.interval = max(0.001, interval_s)
+        self._cond = threading.Condition()
+        self._targets: Dict[int, List[Capture]] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, ident: int, capture: Capture) -> None:
+        with self._cond:
+            self._targets.setdefault(ident, []).append(capture)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="smartnote-profiler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def unregister(self, ident: int, capture: Capture) -> None:
+        with self._cond:
+            captures = self._targets.get(ident, [])
+            if capture in captures:
+                captures.remove(capture)
+            if not captures:
+                self._targets.pop(ident, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._targets:
+                    self._cond.wait()
+                targets = {ident: list(caps) for ident, caps in self._targets.items()}
+            frames = sys._current_frames()
+            for ident, captures in targets.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                folded = _fold(frame)
+                if folded:
+                    for capture in captures:
+                        capture.add_stack(folded)
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler = _StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000)
+_RUN_PROFILED_CODE = run_profiled.__code__
+
+
+# ---------------------------------------------------------------------------
+# Ring buffer + output formats
+# ---------------------------------------------------------------------------
+
+_profiles: Deque[Profile] = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profiles_lock = threading.Lock()
+
+
+def finish_capture(capture: Capture, status: int, duration_s: float) -> None:
+    with _profiles_lock:
+        _profiles.append(Profile(capture, status, duration_s * 1000))
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    with _profiles_lock:
+        return [p.summary() for p in reversed(_profiles)]
+
+
+def get_profile(profile_id: str) -> Optional[Profile]:
+    with _profiles_lock:
+        return next((p for p in _profiles if p.capture.id == profile_id), None)
+
+
+def clear_profiles() -> int:
+    with _profiles_lock:
+        n = len(_profiles)
+        _profiles.clear()
+        return n
+
+
+def status() -> Dict[str, Any]:
+    with _profiles_lock:
+        stored = len(_profiles)
+    return {
+        "enabled": PROFILING_ENABLED,
+        "sample_rate": PROFILE_SAMPLE_RATE,
+        "buffer_size": PROFILE_BUFFER_SIZE,
+        "stored": stored,
+        "armed": _arming.state(),
+    }
+
+
+def render_text(profile: Profile, limit: int = 60, sort: str = "cumulative") -> str:
+    """Human-readable report: pstats table, or the heaviest sampled stacks."""
+    capture = profile.capture
+    header = f"{capture.method} {capture.path} — {profile.duration_ms:.1f} ms ({capture.mode}, {capture.trigger})\n\n"
+    if capture.mode == "sample":
+        total = capture.samples or 1
+        lines = [
+            f"{count:6d} {count / total:6.1%}  {stack}"
+            for stack, count in capture.stacks.most_common(limit)
+        ]
+        return header + f"{capture.samples} samples\n" + "\n".join(lines) + "\n"
+
+    if capture.stats is None:
+        return header + "No executor work was profiled for this request.\n"
+    buf = io.StringIO()
+    stats = copy.copy(capture.stats)
+    stats.stream = buf
+    stats.sort_stats(sort).print_stats(limit)
+    return header + buf.getvalue()
+
+
+def render_pstats(profile: Profile) -> bytes:
+    """The same bytes cProfile's dump_stats writes (a .pstats / .prof file)."""
+    stats = profile.capture.stats
+    return marshal.dumps(stats.stats if stats is not None else {})
+
+
+def render_collapsed(profile: Profile) -> str:
+    """
+    Folded stacks ("root;child;leaf count" per line) for flamegraph.pl or
+    speedscope.  cProfile captures have no full stacks, so their lines are
+    caller;callee pairs weighted by inline time in microseconds.
+    """
+    capture = profile.capture
+    if capture.mode == "sample":
+        return "".join(f"{stack} {count}\n" for stack, count in capture.stacks.most_common())
+
+    stats = capture.stats
+    if stats is None:
+        return ""
+    lines = []
+    for func, (_cc, _nc, tottime, _ct, callers) in stats.stats.items():  # type: ignore[attr-defined]
+        name = _func_name(func)
+        weight = int(tottime * 1e6)
+        if weight <= 0:
+            continue
+        if not callers:
+            lines.append(f"{name} {weight}")
+            continue
+        # Split the function's own time across its callers by call count
+        calls = sum(c[0] if isinstance(c, tuple) else c for c in callers.values()) or 1
+        for caller, c in callers.items():
+            n = c[0] if isinstance(c, tuple) else c
+            lines.append(f"{_func_name(caller)};{name} {max(1, weight * n // calls)}")
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def _func_name(func: tuple) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name  # builtins
+    return f"{name} ({os.path.basename(filename)}:{line})"
@@ -0,0 +1 @@
+"""Offline benchmarks for the ingest and search hot paths (see run.py)."""
@@ -0,0 +1,71 @@
+"""
+Compare two benchmark JSON files from benchmarks.run.
+
+    python -m benchmarks.compare before.json after.json [--threshold 0.10]
+
+Prints the headline metric of every (scale, benchmark) pair present in
+both runs — p50 latency for per-query benchmarks, total seconds for
+throughput ones — and exits 1 if any got slower by more than threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+Key = Tuple[str, str]
+
+
+def _load(path: str) -> Dict[Key, Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return {(r["scale"], r["benchmark"]): r for r in report["results"]}
+
+
+def _metric(row: Dict[str, Any]) -> Tuple[str, Optional[float]]:
+    for name in ("p50_ms", "seconds"):
+        if name in row:
+            return name, float(row[name])
+    return "", None
+
+
+def compare(before: str, after: str, threshold: float) -> int:
+    old, new = _load(before), _load(after)
+    rows: List[Tuple[str, str, str, float, float, float]] = []
+    for key in old:
+        if key not in new:
+            continue
+        name, a = _metric(old[key])
+        _name, b = _metric(new[key])
+        if a is None or b is None:
+            continue
+        rows.append((*key, name, a, b, (b - a) / a if a else 0.0))
+
+    regressions = 0
+    print(f"{'scale':>6}  {'benchmark':<14} {'metric':<8} {'before':>12} {'after':>12} {'change':>8}")
+    for scale, bench, name, a, b, change in rows:
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{scale:>6}  {bench:<14} {name:<8} {a:>12.4f} {b:>12.4f} {change:>+7.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown reported as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+    return compare(args.before, args.after, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Seeded synthetic markdown corpus for the benchmarks.
+
+Docs look like real notes: nested headers, prose paragraphs of varying
+length (some far longer than a chunk), fenced code blocks and tables.
+Words are drawn from a fixed vocabulary with a Zipf-like distribution, so
+BM25 sees realistic document frequencies (a few very common terms, a long
+tail of rare ones).  The same seed always produces the same corpus.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List
+
+import numpy as np
+
+# Named scales -> approximate chunk counts (at the default 800-char chunks)
+SCALES: Dict[str, int] = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "50k": 50_000,
+    "200k": 200_000,
+}
+
+# Average characters per chunk the chunker produces on this corpus
+# (800-char chunks with sentence overlap); used to size docs per scale
+_CHARS_PER_CHUNK = 690
+_DOC_TARGET_CHARS = 12_000  # keeps every doc well under the ingest limits
+
+_SYLLABLES = [
+    "ka", "to", "ri", "an", "el", "mo", "su", "ve", "lin", "dor", "pra", "quel",
+    "ston", "bri", "cha", "dex", "fu", "gral", "hi", "jon", "ne", "or", "pi", "tus",
+]
+_CODE_LINES = [
+    "def {a}({b}):",
+    "    return {b}.{c}()",
+    "for {a} in {b}:",
+    "    {c} = {a} + 1",
+    "if {a} is None:",
+    "    raise ValueError(\"{b}\")",
+    "{a} = load_{b}(\"{c}.json\")",
+    "print({a}, {b})",
+]
+
+
+def parse_scale(scale: str) -> int:
+    """Target chunk count for a named scale ("10k") or a plain integer."""
+    if scale in SCALES:
+        return SCALES[scale]
+    match = re.fullmatch(r"(\d+)([km]?)", scale.strip().lower())
+    if not match:
+        raise ValueError(f"Unknown scale: {scale!r}")
+    return int(match.group(1)) * {"": 1, "k": 1_000, "m": 1_000_000}[match.group(2)]
+
+
+class CorpusGenerator:
+    def __init__(self, seed: int = 0, vocab_size: int = 20_000) -> None:
+        self._rng = np.random.default_rng(seed)
+        self.vocab = self._make_vocab(vocab_size)
+        ranks = np.arange(1, vocab_size + 1, dtype=np.float64)
+        weights = 1.0 / ranks**1.07
+        self._cdf = np.cumsum(weights / weights.sum())
+
+    def _make_vocab(self, size: int) -> List[str]:
+        words: List[str] = []
+        seen = set()
+        while len(words) < size:
+            n = int(self._rng.integers(1, 5))
+            word = "".join(self._rng.choice(_SYLLABLES, size=n))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        return words
+
+    def words(self, n: int) -> List[str]:
+        idx = np.searchsorted(self._cdf, self._rng.random(n))
+        return [self.vocab[min(i, len(self.vocab) - 1)] for i in idx]
+
+    def sentence(self) -> str:
+        words = self.words(int(self._rng.integers(6, 22)))
+        return " ".join(words).capitalize() + str(self._rng.choice([".", ".", ".", "?", "!"]))
+
+    def paragraph(self, long: bool = False) -> str:
+        n = int(self._rng.integers(12, 30)) if long else int(self._rng.integers(2, 7))
+        return " ".join(self.sentence() for _ in range(n))
+
+    def code_block(self) -> str:
+        lines = []
+        for _ in range(int(self._rng.integers(4, 14))):
+            a, b, c = self.words(3)
+            lines.append(str(self._rng.choice(_CODE_LINES)).format(a=a, b=b, c=c))
+        lang = self._rng.choice(["python", "bash", ""])
+        return f"```{lang}\n" + "\n".join(lines) + "\n```"
+
+    def table(self) -> str:
+        cols = int(self._rng.integers(2, 5))
+        header = "| " + " | ".join(w.capitalize() for w in self.words(cols)) + " |"
+        sep = "|" + "|".join("---" for _ in range(cols)) + "|"
+        rows = [
+            "| " + " | ".join(self.words(cols)) + " |"
+            for _ in range(int(self._rng.integers(2, 8)))
+        ]
+        return "\n".join([header, sep, *rows])
+
+    def block(self) -> str:
+        kind = self._rng.random()
+        if kind < 0.10:
+            return self.code_block()
+        if kind < 0.16:
+            return self.table()
+        return self.paragraph(long=kind > 0.92)
+
+    def document(self, target_chars: int = _DOC_TARGET_CHARS) -> str:
+        parts = [f"# {' '.join(self.words(3)).title()}"]
+        size = len(parts[0])
+        level = 1
+        while size < target_chars:
+            if self._rng.random() < 0.25:
+                level = int(np.clip(level + self._rng.integers(-1, 2), 2, 4))
+                parts.append(f"{'#' * level} {' '.join(self.words(int(self._rng.integers(1, 5)))).title()}")
+            parts.append(self.block())
+            size += len(parts[-1]) + 2
+        return "\n\n".join(parts)
+
+    def corpus(self, n_chunks: int) -> List[Dict[str, object]]:
+        """Docs in the ingest request shape, totalling roughly n_chunks chunks."""
+        docs: List[Dict[str, object]] = []
+        remaining = n_chunks * _CHARS_PER_CHUNK
+        while remaining > 0:
+            text = self.document(min(_DOC_TARGET_CHARS, max(remaining, 400)))
+            i = len(docs)
+            docs.append({
+                "path": f"notes/{i // 100:03d}/note-{i:05d}.md",
+                "text": text,
+                "title": f"note-{i:05d}.md",
+                "mtime": 1_700_000_000.0 + i,
+            })
+            remaining -= len(text)
+        return docs
+
+    def queries(self, n: int) -> List[str]:
+        """Search queries: 1-5 corpus words, biased toward mid-frequency terms."""
+        out = []
+        for _ in range(n):
+            k = int(self._rng.integers(1, 6))
+            ranks = self._rng.integers(20, len(self.vocab) // 4, size=k)
+            out.append(" ".join(self.vocab[r] for r in ranks))
+        return out
+
+
+def generate_corpus(n_chunks: int, seed: int = 0) -> List[Dict[str, object]]:
+    return CorpusGenerator(seed).corpus(n_chunks)
@@ -0,0 +1,282 @@
+"""
+Run the hot-path benchmarks and emit the results as JSON.
+
+    cd backend
+    python -m benchmarks.run --scales 1k,10k --out bench.json
+    python -m benchmarks.compare before.json bench.json
+
+Embeddings come from the deterministic hashing backend, so runs are
+offline and repeatable.  Any SMARTNOTE_* variable set in the environment
+still applies (e.g. SMARTNOTE_VECTOR_DTYPE=int8 to benchmark quantized
+search), and is recorded in the output.
+
+Per scale:
+  - chunking        chunk_text_rich over the whole corpus
+  - ingest          ingest_docs in request-sized batches (chunk + embed + store)
+  - bm25_index      BM25 index build over every chunk text (SMARTNOTE_BM25_ENGINE)
+  - bm25_search     BM25 search per query
+  - dense_search    store.dense_search per (pre-embedded) query
+  - hybrid_search   search_chunks per query
+  - hybrid_rerank   search_chunks(use_reranker=True) per query
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Offline, repeatable defaults; must be set before the app modules load
+os.environ.setdefault("SMARTNOTE_EMBED_BACKEND", "hashing")
+os.environ.setdefault("SMARTNOTE_EMBED_CACHE_BYTES", "0")  # every ingest really embeds
+os.environ.setdefault("SMARTNOTE_EMBED_CACHE_DIR", "")
+os.environ.setdefault("SMARTNOTE_SNAPSHOT_DIR", "")
+os.environ.setdefault("SMARTNOTE_STORE_BACKEND", "memory")
+# Calls are sequential here; the micro-batch wait would only add latency
+os.environ.setdefault("SMARTNOTE_MICROBATCH_ENABLED", "false")
+
+import numpy as np  # noqa: E402
+
+from app.services.ingester import (  # noqa: E402
+    MAX_DOCS_PER_INGEST,
+    MAX_TOTAL_CHARS_PER_REQUEST,
+    ingest_docs,
+)
+from app.services.searcher import MIN_SIMILARITY, search_chunks  # noqa: E402
+from app.store.memory_store import BM25_ENGINE, delete_session, get_store  # noqa: E402
+from app.utils.bm25 import BM25_ENGINES  # noqa: E402
+from app.utils.chunker import chunk_text_rich  # noqa: E402
+from app.utils.embeddings import embed_query  # noqa: E402
+
+from .corpus import CorpusGenerator, SCALES, parse_scale  # noqa: E402
+
+BENCHMARKS = (
+    "chunking",
+    "ingest",
+    "bm25_index",
+    "bm25_search",
+    "dense_search",
+    "hybrid_search",
+    "hybrid_rerank",
+)
+_SEARCH_BENCHMARKS = ("bm25_search", "dense_search", "hybrid_search", "hybrid_rerank")
+_WARMUP_QUERIES = 5  # untimed calls before each per-query benchmark
+FORMAT_VERSION = 1
+
+
+def _latency_stats(samples_s: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000
+    return {
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def _time_each(fn: Callable[[Any], Any], inputs: List[Any], warmup: int) -> Dict[str, Any]:
+    """Per-call latency of fn; the first `warmup` inputs are run untimed."""
+    for item in inputs[:warmup]:
+        fn(item)
+    samples = []
+    for item in inputs[warmup:]:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return {"n": len(samples), **_latency_stats(samples)}
+
+
+def _ingest_batches(docs: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Split docs into batches that fit the /notes/ingest request limits."""
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    chars = 0
+    for doc in docs:
+        size = len(doc["text"])
+        if current and (len(current) >= MAX_DOCS_PER_INGEST or chars + size > MAX_TOTAL_CHARS_PER_REQUEST):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(doc)
+        chars += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def run_scale(
+    scale: str, seed: int, n_queries: int, only: Optional[set] = None
+) -> List[Dict[str, Any]]:
+    def wanted(name: str) -> bool:
+        return only is None or name in only
+
+    gen = CorpusGenerator(seed)
+    start = time.perf_counter()
+    docs = gen.corpus(parse_scale(scale))
+    # A separate query set per search benchmark: each one starts with cold
+    # query-embedding and rerank caches, whichever subset is run
+    queries = {name: gen.queries(n_queries + _WARMUP_QUERIES) for name in _SEARCH_BENCHMARKS}
+    corpus_chars = sum(len(d["text"]) for d in docs)
+    _log(f"[{scale}] corpus: {len(docs)} docs, {corpus_chars / 1e6:.1f}M chars "
+         f"({time.perf_counter() - start:.1f}s to generate)")
+
+    results: List[Dict[str, Any]] = []
+
+    def record(name: str, **fields: Any) -> None:
+        row = {"scale": scale, "benchmark": name, **fields}
+        results.append(row)
+        _log(f"[{scale}] {name}: " + ", ".join(f"{k}={v}" for k, v in fields.items()))
+
+    # Chunking (also yields the chunk texts the BM25 benchmarks use)
+    start = time.perf_counter()
+    texts = [c.text for d in docs for c in chunk_text_rich(d["text"]).chunks]
+    elapsed = time.perf_counter() - start
+    if wanted("chunking"):
+        record(
+            "chunking",
+            docs=len(docs), chunks=len(texts), seconds=round(elapsed, 4),
+            chunks_per_s=round(len(texts) / elapsed, 1),
+            mb_per_s=round(corpus_chars / 1e6 / elapsed, 2),
+        )
+
+    if wanted("bm25_index") or wanted("bm25_search"):
+        index = BM25_ENGINES[BM25_ENGINE]()
+        start = time.perf_counter()
+        index.index(texts)
+        elapsed = time.perf_counter() - start
+        if wanted("bm25_index"):
+            record(
+                "bm25_index",
+                chunks=len(texts), seconds=round(elapsed, 4),
+                chunks_per_s=round(len(texts) / elapsed, 1),
+                bytes=index.nbytes,
+            )
+        if wanted("bm25_search"):
+            record("bm25_search", **_time_each(index.search, queries["bm25_search"], _WARMUP_QUERIES))
+        del index
+
+    session_id = f"bench-{scale}-{seed}"
+    delete_session(session_id)
+    search_wanted = any(wanted(n) for n in _SEARCH_BENCHMARKS[1:])
+    if wanted("ingest") or search_wanted:
+        batches = _ingest_batches(docs)
+        start = time.perf_counter()
+        for batch in batches:
+            ingest_docs(session_id, batch)
+        elapsed = time.perf_counter() - start
+        store = get_store(session_id)
+        if wanted("ingest"):
+            record(
+                "ingest",
+                docs=len(docs), requests=len(batches), chunks=len(store),
+                seconds=round(elapsed, 4),
+                chunks_per_s=round(len(store) / elapsed, 1),
+                store_bytes=store.nbytes(),
+            )
+
+        if wanted("dense_search"):
+            q_vecs = [embed_query(q) for q in queries["dense_search"]]
+            record(
+                "dense_search",
+                **_time_each(
+                    lambda v: store.dense_search(v, min_score=MIN_SIMILARITY),
+                    q_vecs, _WARMUP_QUERIES,
+                ),
+            )
+        if wanted("hybrid_search"):
+            record(
+                "hybrid_search",
+                **_time_each(
+                    lambda q: search_chunks(session_id, q, top_k=5),
+                    queries["hybrid_search"], _WARMUP_QUERIES,
+                ),
+            )
+        if wanted("hybrid_rerank"):
+            record(
+                "hybrid_rerank",
+                **_time_each(
+                    lambda q: search_chunks(session_id, q, top_k=5, use_reranker=True),
+                    queries["hybrid_rerank"], _WARMUP_QUERIES,
+                ),
+            )
+        delete_session(session_id)
+
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def _environment() -> Dict[str, Any]:
+    return {
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in sorted(os.environ.items()) if k.startswith("SMARTNOTE_")},
+    }
+
+
+def _log(msg: str) -> None:
+    print(msg, file=sys.stderr, flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1k,10k",
+                        help=f"comma-separated chunk counts ({', '.join(SCALES)} or e.g. 25k)")
+    parser.add_argument("--queries", type=int, default=200, help="queries per search benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", default="",
+                        help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--out", default="", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    only = {b.strip() for b in args.only.split(",") if b.strip()} or None
+    unknown = (only or set()) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    for scale in scales:
+        parse_scale(scale)  # fail fast on typos
+
+    report: Dict[str, Any] = {
+        "version": FORMAT_VERSION,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "seed": args.seed,
+        "queries": args.queries,
+        "environment": _environment(),
+        "results": [],
+    }
+    for scale in scales:
+        report["results"].extend(run_scale(scale, args.seed, args.queries, only))
+
+    payload = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+        _log(f"Wrote {args.out}")
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())